@@ -1,4 +1,13 @@
-import io, csv
+import io, csv, json, secrets, os, hmac, threading, time, sqlite3, gzip, hashlib, socket, tempfile, tracemalloc, re
+import smtplib, urllib.request, urllib.error
+from email.message import EmailMessage
+from collections import OrderedDict, namedtuple
+from contextvars import ContextVar, copy_context
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+import click
 from flask import make_response
 from flask import (
     Flask,
@@ -8,21 +17,315 @@ from flask import (
     session,
     url_for,
     flash,
+    g,
+    has_request_context,
+    Response,
+    stream_with_context,
 )
-from sqlalchemy import create_engine, Column, Integer, String, Date, ForeignKey, Text, Boolean
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy import create_engine, Column, Integer, Float, String, Date, DateTime, ForeignKey, Text, Boolean, LargeBinary
+from sqlalchemy import func, inspect, text, update, insert, delete, select, case, event, true, literal, union_all, Index
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship, Session
+from sqlalchemy.pool import NullPool
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import date, datetime, timedelta
 from calendar import monthrange
+import asyncio
+
+try:
+    import brotli  # opsional: kompresim "br" kur është i instaluar
+except ImportError:
+    brotli = None
+
+try:
+    # opsional: leximet asinkrone (ASYNC_READS) kërkojnë aiosqlite + asgiref (flask[async])
+    from sqlalchemy.ext.asyncio import create_async_engine
+    import aiosqlite  # noqa: F401
+    import asgiref  # noqa: F401
+except ImportError:
+    create_async_engine = None
+_async_engine_lock = threading.Lock()
+
+try:
+    import fcntl  # POSIX: vetëm një proces ekzekuton planifikuesin e backup-eve
+except ImportError:
+    fcntl = None
 
 app = Flask(__name__)
 MONTHLY_RATE = 1.8334
+# kohëzgjatja ruhet në njësi fikse: 1 njësi = 1 orë e një dite pune 8-orëshe.
+# Me 8 njësi për ditë, çdo sasi (units / 8) është thyesë diadike dhe shumat në Float janë të sakta.
+UNITS_PER_DAY = 8
+WORKDAY_HOURS = 8
+PORTIONS = ("full", "am", "pm", "hours")  # ditë të plota / paradite / pasdite / orë
 app.config["SECRET_KEY"] = "dev-secret-change"
+# kosto e hash-it të PIN-it (p.sh. "pbkdf2:sha256:600000" ose "scrypt:32768:8:1")
+app.config["PIN_HASH_METHOD"] = os.environ.get("PIN_HASH_METHOD", "pbkdf2:sha256:260000")
+# sa hash-e PIN-i llogariten njëkohësisht (kufi CPU-je; kërkesa pret gjithsesi rezultatin)
+app.config["PIN_HASH_WORKERS"] = int(os.environ.get("PIN_HASH_WORKERS", os.cpu_count() or 2))
+app.config["PIN_CACHE_SIZE"] = 1024
+app.config["PIN_CACHE_TTL"] = 600  # sekonda
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+app.config["JOB_RETENTION_DAYS"] = 7
+# kufizimi i përpjekjeve: N përpjekje të dështuara për dritare (sekonda)
+app.config["LOGIN_LIMIT_PER_EMAIL"] = 5
+app.config["LOGIN_LIMIT_PER_IP"] = 30
+app.config["PIN_CHANGE_LIMIT"] = 10
+app.config["LOGIN_LIMIT_WINDOW"] = 900
+# skedar SQLite i përbashkët për disa workers; bosh = vetëm në memorie të procesit
+app.config["RATELIMIT_STORAGE"] = os.environ.get("RATELIMIT_STORAGE", "")
+# dashboard-i si view asinkron: query-t e tij ekzekutohen njëkohësisht mbi aiosqlite
+app.config["ASYNC_READS"] = os.environ.get("ASYNC_READS") == "1"
+if app.config["ASYNC_READS"] and create_async_engine is None:
+    raise RuntimeError("ASYNC_READS=1 kërkon aiosqlite dhe asgiref: pip install aiosqlite 'flask[async]'")
+# kopje vetëm-lexim e bazës për raportet (bosh = raportet lexojnë bazën primare)
+app.config["REPORT_DB"] = os.environ.get("REPORT_DB", "")
+# mosha maksimale e kopjes (sekonda) para se të rifreskohet; 0 = vetëm me `flask snapshot-reports`
+app.config["REPORT_SNAPSHOT_MAX_AGE"] = int(os.environ.get("REPORT_SNAPSHOT_MAX_AGE", 60))
+# backup-e online: dosja, sa mbahen, faqe për hap dhe intervali (sekonda, 0 = pa planifikues)
+app.config["BACKUP_DIR"] = os.environ.get("VACATION_BACKUP_DIR", "backups")
+app.config["BACKUP_KEEP"] = int(os.environ.get("VACATION_BACKUP_KEEP", 7))
+app.config["BACKUP_PAGES"] = 256
+app.config["BACKUP_SLEEP"] = 0.05
+app.config["BACKUP_INTERVAL"] = int(os.environ.get("VACATION_BACKUP_INTERVAL", 0))
+# raportet lexojnë nga backup-i i fundit në vend të REPORT_DB
+app.config["REPORT_FROM_BACKUPS"] = os.environ.get("REPORT_FROM_BACKUPS") == "1"
+# auditi: ngjarjet më të vjetra se kaq ditë arkivohen në skedarë vjetorë .jsonl.gz
+app.config["AUDIT_RETENTION_DAYS"] = 365
+app.config["AUDIT_ARCHIVE_DIR"] = os.environ.get("AUDIT_ARCHIVE_DIR", "audit-archive")
+# fundi i vitit: sa ditë kalojnë në vitin e ri (pa vendosur = 5, bosh = pa kufi) dhe pas sa muajsh
+# skadojnë (0 = kurrë); skadimi kryhet vetë me akumulimin mujor, ose me `flask expire-carryover`
+_carryover_cap = os.environ.get("CARRYOVER_CAP", "5").strip()
+app.config["CARRYOVER_CAP"] = float(_carryover_cap) if _carryover_cap else None
+app.config["CARRYOVER_EXPIRY_MONTHS"] = int(os.environ.get("CARRYOVER_EXPIRY_MONTHS", 3))
+# numri i query-ve SQL për kërkesë në header-in X-Query-Count (diagnostikë)
+app.config["QUERY_COUNT_HEADER"] = os.environ.get("QUERY_COUNT_HEADER") == "1"
+# token për integrimet që lexojnë /api/out (header X-API-Token); bosh = vetëm adminët
+app.config["API_TOKEN"] = os.environ.get("VACATION_API_TOKEN", "")
+# multi-tenant: një skedar SQLite për kompani në këtë dosje; bosh = një bazë e vetme (DATABASE_URL)
+app.config["TENANTS_DIR"] = os.environ.get("VACATION_TENANTS_DIR", "")
+# domeni bazë: acme.vacation.example.com -> tenant "acme"; bosh = kompania zgjidhet në login (sesion)
+app.config["TENANT_DOMAIN"] = os.environ.get("VACATION_TENANT_DOMAIN", "").lower()
+# sa baza tenant-ësh mbahen hapur njëherësh (LRU); të tjerat mbyllen dhe rihapen sipas nevojës
+app.config["TENANT_ENGINES"] = int(os.environ.get("VACATION_TENANT_ENGINES", 64))
+# SSE (/admin/events) me workers me thread-e: ping-u kur s'ka ngjarje dhe jetëgjatësia e një
+# lidhjeje (sekonda); çdo tab i hapur zë një thread për aq kohë, pastaj shfletuesi rilidhet
+app.config["LIVE_HEARTBEAT"] = int(os.environ.get("LIVE_HEARTBEAT", 15))
+app.config["LIVE_MAX_SECONDS"] = int(os.environ.get("LIVE_MAX_SECONDS", 300))
+# me workers sync (gunicorn pa --threads/--worker-class gevent) nuk mbahet lidhje e hapur:
+# shfletuesi pyet për ndryshime çdo kaq sekonda
+app.config["LIVE_POLL"] = int(os.environ.get("LIVE_POLL", 5))
+# njoftimet: SMTP (parazgjedhja është serveri lokal i testimit: python -m aiosmtpd -n -l localhost:1025)
+app.config["SMTP_HOST"] = os.environ.get("SMTP_HOST", "localhost")
+app.config["SMTP_PORT"] = int(os.environ.get("SMTP_PORT", 1025))
+app.config["SMTP_USER"] = os.environ.get("SMTP_USER", "")
+app.config["SMTP_PASSWORD"] = os.environ.get("SMTP_PASSWORD", "")
+app.config["SMTP_STARTTLS"] = os.environ.get("SMTP_STARTTLS") == "1"
+app.config["MAIL_FROM"] = os.environ.get("MAIL_FROM", "vacation-planner@localhost")
+app.config["NOTIFY_EMAIL"] = os.environ.get("NOTIFY_EMAIL", "1") == "1"
+# webhook që merr çdo njoftim si JSON (bosh = pa webhook); i nënshkruar me HMAC kur ka sekret
+app.config["WEBHOOK_URL"] = os.environ.get("WEBHOOK_URL", "")
+app.config["WEBHOOK_SECRET"] = os.environ.get("WEBHOOK_SECRET", "")
+# llojet e njoftimeve që shkojnë në përmbledhjen ditore (p.sh. "vacation_requested") dhe ora UTC e saj
+app.config["NOTIFY_DIGEST_KINDS"] = {k for k in os.environ.get("NOTIFY_DIGEST_KINDS", "").split(",") if k}
+app.config["DIGEST_HOUR"] = int(os.environ.get("DIGEST_HOUR", 7))
+# dispatcher-i i outbox-it: kontroll periodik (sekonda, 0 = vetëm `flask outbox-dispatch`),
+# mesazhe për grup, tentativa dhe vonesa bazë e ripërpjekjes (dyfishohet çdo herë)
+app.config["OUTBOX_INTERVAL"] = int(os.environ.get("OUTBOX_INTERVAL", 60))
+app.config["OUTBOX_BATCH"] = 200
+app.config["OUTBOX_MAX_ATTEMPTS"] = 8
+app.config["OUTBOX_BACKOFF"] = 30
+app.config["OUTBOX_RETENTION_DAYS"] = 30
+app.config["OUTBOX_TIMEOUT"] = 10  # sekonda për lidhje SMTP / kërkesë webhook
+# pas një reverse proxy (nginx), IP-ja e klientit vjen nga X-Forwarded-For
+if os.environ.get("TRUST_PROXY"):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
 # -------------------- DATABASE --------------------
-engine = create_engine("sqlite:///vacation.db", echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine)
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///vacation.db")
+engine = create_engine(DATABASE_URL, echo=False, future=True)
 Base = declarative_base()
 
+# -------------------- TENANTS --------------------
+# Me TENANTS_DIR, çdo kompani ka skedarin e vet <dosja>/<emri>.db. Motorët hapen sipas
+# nevojës dhe mbahen në një LRU; sesionet lidhen me bazën e tenant-it në çdo query.
+# Jashtë kërkesave (CLI, thread-e) tenant-i vjen nga VACATION_TENANT; bosh = baza e paracaktuar.
+TENANT_NAME = re.compile(r"^[a-z0-9][a-z0-9-]{0,62}$")
+_current_tenant = ContextVar("tenant", default=os.environ.get("VACATION_TENANT") or None)
+_tenant_engines = OrderedDict()  # emri -> motori, më i përdoruri së fundi në fund
+_tenant_caches = {}  # tenant -> {emri: cache i procesit}; hiqet bashkë me motorin
+_tenant_lock = threading.Lock()  # vetëm për LRU-në; hapja e një tenant-i ka kyçin e vet
+_tenant_init_locks = {}  # tenant -> RLock gjatë hapjes (migrimet e thërrasin përsëri tenant_engine)
+_tenant_pending = {}  # tenant -> motori që po inicializohet nga thread-i që mban kyçin
+_tenant_opened = set()  # tenant-ët e hapur të paktën një herë nga ky proces
+_database_setup = []  # migrimet/inicializimet që ekzekutohen për çdo bazë kur skema ndryshon
+_database_open = []  # kontrollet që çdo proces i bën një herë për çdo bazë (p.sh. punët jetime)
+# rrite kur ndryshon një migrim pa ndryshuar modelet apo listën e migrimeve
+SCHEMA_REVISION = 1
+
+def current_tenant():
+    return _current_tenant.get()
+
+def tenant_db_path(tenant: str) -> str:
+    return os.path.join(app.config["TENANTS_DIR"], f"{tenant}.db")
+
+def database_path() -> str:
+    """Skedari SQLite i tenant-it aktual."""
+    tenant = current_tenant()
+    return tenant_db_path(tenant) if tenant else engine.url.database
+
+def tenant_folder(base: str) -> str:
+    """Nëndosja e tenant-it aktual për backup-e, arkiva etj."""
+    tenant = current_tenant()
+    return os.path.join(base, tenant) if tenant else base
+
+def tenant_exists(tenant: str) -> bool:
+    return (
+        bool(app.config["TENANTS_DIR"])
+        and bool(TENANT_NAME.match(tenant or ""))
+        and os.path.exists(tenant_db_path(tenant))
+    )
+
+def list_tenants():
+    folder = app.config["TENANTS_DIR"]
+    if not folder or not os.path.isdir(folder):
+        return []
+    return sorted(n[:-3] for n in os.listdir(folder) if n.endswith(".db") and TENANT_NAME.match(n[:-3]))
+
+_CURRENT = object()
+
+def tenant_cache(name: str, factory=dict, tenant=_CURRENT):
+    """Cache-i i procesit për një tenant (parazgjedhje: tenant-i aktual)."""
+    caches = _tenant_caches.setdefault(current_tenant() if tenant is _CURRENT else tenant, {})
+    cache = caches.get(name)
+    if cache is None:
+        cache = caches.setdefault(name, factory())
+    return cache
+
+def schema_fingerprint() -> int:
+    """Gjurma e skemës dhe e migrimeve; ruhet në PRAGMA user_version të çdo skedari tenant-i."""
+    parts = [str(SCHEMA_REVISION)] + [fn.__name__ for fn in _database_setup]
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts += sorted(c.name for c in table.columns)
+        parts += sorted(i.name for i in table.indexes)
+    return int(hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:7], 16)
+
+def tenant_engine(tenant: str = None):
+    """Motori i tenant-it (None = baza e paracaktuar); herën e parë krijohet skema dhe migrimet.
+
+    Thirret nga çdo get_bind: motori i hapur lexohet pa kyç. Hapja e një tenant-i mban vetëm
+    kyçin e tij, kështu që migrimet e gjata nuk ndalin query-t e kompanive të tjera."""
+    if tenant is None:
+        return engine
+    eng = _tenant_engines.get(tenant)
+    if eng is not None:
+        try:
+            _tenant_engines.move_to_end(tenant)
+        except KeyError:
+            pass  # u nxor nga LRU-ja ndërkohë; motori vlen ende për këtë query
+        return eng
+
+    with _tenant_lock:
+        init_lock = _tenant_init_locks.setdefault(tenant, threading.RLock())
+    with init_lock:
+        eng = _tenant_engines.get(tenant) or _tenant_pending.get(tenant)
+        if eng is not None:
+            return eng
+        eng = create_engine(f"sqlite:///{os.path.abspath(tenant_db_path(tenant))}", future=True)
+        event.listen(eng, "before_cursor_execute", _count_query)
+        # sesionet e migrimeve (në këtë thread) e gjejnë motorin këtu para se të publikohet
+        _tenant_pending[tenant] = eng
+        token = _current_tenant.set(tenant)
+        try:
+            fingerprint = schema_fingerprint()
+            with eng.connect() as conn:
+                current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+            if current != fingerprint:
+                init_schema(eng)
+                for setup in _database_setup:
+                    setup()
+                with eng.begin() as conn:
+                    conn.exec_driver_sql(f"PRAGMA user_version = {fingerprint}")
+            if tenant not in _tenant_opened:
+                for check in _database_open:
+                    check()
+                _tenant_opened.add(tenant)
+        except Exception:
+            eng.dispose()
+            raise
+        finally:
+            _tenant_pending.pop(tenant, None)
+            _current_tenant.reset(token)
+
+        with _tenant_lock:
+            _tenant_engines[tenant] = eng
+            while len(_tenant_engines) > app.config["TENANT_ENGINES"]:
+                old, old_engine = _tenant_engines.popitem(last=False)
+                _tenant_caches.pop(old, None)
+                old_engine.dispose()
+        return eng
+
+class TenantSession(Session):
+    """Sesion i lidhur me tenant-in që ishte aktiv kur u krijua."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.tenant = current_tenant()
+
+    def get_bind(self, mapper=None, **kw):
+        return tenant_engine(self.tenant)
+
+SessionLocal = sessionmaker(class_=TenantSession)
+
+def on_database_setup(fn):
+    """Ekzekuton `fn` tani për bazën e paracaktuar dhe për çdo tenant, kur skema e tij nuk është e fundit."""
+    _database_setup.append(fn)
+    fn()
+    return fn
+
+def on_database_open(fn):
+    """Ekzekuton `fn` tani për bazën e paracaktuar dhe një herë për proces për çdo tenant që hapet."""
+    _database_open.append(fn)
+    fn()
+    return fn
+
+@app.before_request
+def resolve_tenant():
+    """Tenant-i i kërkesës: nga nën-domeni, nga sesioni, ose (para login-it) nga fusha "tenant"."""
+    if not app.config["TENANTS_DIR"]:
+        return None
+    domain = app.config["TENANT_DOMAIN"]
+    host = request.host.split(":")[0].lower()
+    if domain and host.endswith("." + domain):
+        tenant = host[: -len(domain) - 1]
+    elif domain:
+        tenant = None
+    elif "tenant" in session:
+        tenant = session["tenant"]
+    else:
+        # feed-et .ics dhe API-të pa sesion e mbajnë kompaninë në URL
+        tenant = (request.values.get("tenant") or "").strip().lower() or None
+
+    # thread-et e serverit ripërdoren: tenant-i vendoset në çdo kërkesë, edhe kur është None
+    _current_tenant.set(tenant)
+    if session.get("uid") is not None and session.get("tenant") != tenant:
+        session.clear()  # sesioni i një kompanie tjetër nuk vlen këtu
+    if tenant is not None and not tenant_exists(tenant):
+        _current_tenant.set(None)
+        if request.endpoint == "login":
+            flash("Kompani e panjohur.", "danger")
+            return redirect(url_for("login"))
+        return "Kompania nuk u gjet.", 404
+    return None
+
+@app.url_defaults
+def _tenant_in_feed_urls(endpoint, values):
+    # pa domene për tenant, klientët e kalendarit s'kanë sesion: kompania shkon në URL
+    if endpoint == "calendar_feed" and app.config["TENANTS_DIR"] and not app.config["TENANT_DOMAIN"]:
+        if current_tenant():
+            values.setdefault("tenant", current_tenant())
+
 
 class User(Base):
     __tablename__ = "users"
@@ -33,8 +336,12 @@ class User(Base):
     pin = Column(String, nullable=False)
     role = Column(String, default="member")
     annual_allowance = Column(Integer, default=0)  # do ta vendosësh ti vetë
-    carryover = Column(Integer, default=0)
+    # ditë të pjesshme (p.sh. 2.5); bazat e vjetra e kanë kolonën INTEGER, që në SQLite i ruan njësoj
+    carryover = Column(Float, default=0)
     first_login = Column(Boolean, default=True)
+    calendar_token = Column(String, unique=True, index=True)  # për feed-in .ics
+    country = Column(String)  # kalendari i festave; bosh = shteti i paracaktuar
+    team_id = Column(Integer, ForeignKey("teams.id"), index=True)
 
     vacations = relationship("Vacation", back_populates="user")
     adjustments = relationship("Adjustment", back_populates="user")
@@ -45,20 +352,26 @@ class User(Base):
 
     def taken_days(self, year: int):
         return sum(
-            v.days
+            p.days
             for v in self.vacations
-            if v.status == "approved" and v.start.year == year
+            if v.status == "approved" and v.leave_type == ANNUAL_LEAVE
+            for p in v.parts
+            if p.year == year
         )
 
     def pending_days(self, year: int):
         return sum(
-            v.days
+            p.days
             for v in self.vacations
-            if v.status == "pending" and v.start.year == year
+            if v.status == "pending" and v.leave_type == ANNUAL_LEAVE
+            for p in v.parts
+            if p.year == year
         )
 
     def adjustments_sum(self, year: int):
-        return sum(a.amount for a in self.adjustments if a.when.year == year)
+        return sum(
+            a.amount for a in self.adjustments if a.when.year == year and a.leave_type == ANNUAL_LEAVE
+        )
 
     def remaining(self, year: int):
         return self.allowance_total() + self.adjustments_sum(year) - self.taken_days(
@@ -66,18 +379,69 @@ class User(Base):
         )
 
 
+class Team(Base):
+    """Ekip / departament; menaxheri (roli "manager") aprovon kërkesat e anëtarëve."""
+    __tablename__ = "teams"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    # use_alter: users <-> teams janë cikël çelësash të huaj
+    manager_id = Column(Integer, ForeignKey("users.id", use_alter=True), index=True)
+
+
 class Vacation(Base):
     __tablename__ = "vacations"
+    # radha e aprovimit të një menaxheri: team_id IN (...) AND status = 'pending' ORDER BY start
+    __table_args__ = (Index("ix_vacations_team_status_start", "team_id", "status", "start"),)
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    team_id = Column(Integer, ForeignKey("teams.id"))  # kopje e User.team_id, për indeksin më sipër
     start = Column(Date, nullable=False)
     end = Column(Date, nullable=False)
-    days = Column(Integer, nullable=False)
+    days = Column(Float, nullable=False)  # = units / UNITS_PER_DAY
+    units = Column(Integer)  # kohëzgjatja në njësi fikse (shih UNITS_PER_DAY)
+    portion = Column(String, default="full")  # full / am / pm / hours (këto të fundit për një ditë)
     note = Column(Text)
     status = Column(String, default="pending")  # pending / approved / denied
+    leave_type = Column(String, default="annual")  # LeaveType.code
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     user = relationship("User", back_populates="vacations")
+    parts = relationship("VacationPart", lazy="selectin", viewonly=True)  # shkruhen nga write_vacation_parts
+
+
+class VacationPart(Base):
+    """Ditët e një pushimi të ndara sipas muajve (dhe viteve) që prek."""
+    __tablename__ = "vacation_parts"
+    __table_args__ = (Index("ix_vacation_parts_year_month", "year", "month"),)
+
+    vacation_id = Column(Integer, ForeignKey("vacations.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    days = Column(Float, nullable=False)
+
+
+class LeaveType(Base):
+    """Llojet e lejes; "annual" përdor lejen vjetore të përdoruesit, të tjerat `allowance`."""
+    __tablename__ = "leave_types"
+
+    code = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    allowance = Column(Float)  # ditë në vit për përdorues; None = pa kufi
+    sort = Column(Integer, default=0)
+
+
+class DailyOccupancy(Base):
+    """Sa kërkesa (approved / pending) prekin secilën ditë; mbahet nga vacation_changed."""
+    __tablename__ = "daily_occupancy"
+
+    day = Column(Date, primary_key=True)
+    approved = Column(Integer, nullable=False, default=0)
+    pending = Column(Integer, nullable=False, default=0)
+    # njësi fikse mungese (gjysmë dite = UNITS_PER_DAY / 2), për ngarkesën në ditë-njeri
+    approved_units = Column(Integer, nullable=False, default=0)
+    pending_units = Column(Integer, nullable=False, default=0)
 
 
 class Adjustment(Base):
@@ -88,6 +452,7 @@ class Adjustment(Base):
     amount = Column(Integer, nullable=False)  # + ose -
     reason = Column(Text)
     when = Column(Date, default=date.today)
+    leave_type = Column(String, default="annual")
 
     user = relationship("User", back_populates="adjustments")
 
@@ -97,10 +462,512 @@ class Setting(Base):
     key = Column(String, primary_key=True)
     value = Column(String)
 
-Base.metadata.create_all(engine)
+class ReportAggregate(Base):
+    __tablename__ = "report_aggregates"
+
+    year = Column(Integer, primary_key=True)
+    data = Column(Text, nullable=False)  # JSON: muaj / përdorues / status
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+class CalendarEvent(Base):
+    __tablename__ = "calendar_events"
+
+    vacation_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    ics = Column(Text, nullable=False)  # blloku VEVENT i gatshëm
+
+class WorkCalendar(Base):
+    __tablename__ = "work_calendars"
+
+    country = Column(String, primary_key=True)  # p.sh. "AL", "XK"
+    weekend_mask = Column(String, default="0000011")  # E hënë..E diel, 1 = pushim
+
+class Holiday(Base):
+    __tablename__ = "holidays"
+    __table_args__ = (Index("ix_holidays_country_day", "country", "day", unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    country = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    name = Column(String)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    params = Column(Text)  # JSON
+    status = Column(String, default="queued", index=True)  # queued / running / done / failed
+    progress = Column(Integer, default=0)  # 0-100
+    message = Column(Text)
+    worker = Column(String)  # host:pid që e ekzekuton
+    created_by = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    result = Column(LargeBinary)
+    result_name = Column(String)
+    result_type = Column(String)
+
+class AuditEvent(Base):
+    """Ngjarje auditi vetëm-shtim; `data` mban vetëm fushat e ndryshuara si JSON kompakt."""
+    __tablename__ = "audit_events"
+    __table_args__ = (Index("ix_audit_entity_ts", "entity", "entity_id", "ts"),)
+
+    id = Column(Integer, primary_key=True)
+    ts = Column(DateTime, default=datetime.utcnow, nullable=False)
+    actor_id = Column(Integer)  # None = sistemi (CLI, punë në sfond)
+    entity = Column(String, nullable=False)  # vacation / user
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    data = Column(Text)
+
+class OutboxMessage(Base):
+    """Një njoftim për t'u dërguar, i shkruar në të njëjtin transaksion me ndryshimin."""
+    __tablename__ = "outbox"
+    __table_args__ = (Index("ix_outbox_status_next", "status", "next_attempt_at"),)
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    kind = Column(String, nullable=False)  # vacation_requested / vacation_approved / vacation_denied
+    sink = Column(String, nullable=False)  # email / digest / webhook
+    recipient = Column(String)  # email-i ose URL-ja e webhook-ut
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String, default="pending", nullable=False)  # pending / sent / failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=False)
+    claim = Column(String)  # dispatcher-i që e ka marrë në dorë
+    sent_at = Column(DateTime)
+    last_error = Column(Text)
+
+class BalanceEvent(Base):
+    """Një lëvizje në bilancin e një përdoruesi; bilanci i çdo date rindërtohet prej tyre."""
+    __tablename__ = "balance_events"
+    __table_args__ = (Index("ix_balance_events_user_ts", "user_id", "ts"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    ts = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # allowance_set / carryover_set / accrual / adjustment / approval / denial / reversal / recompute
+    kind = Column(String, nullable=False)
+    amount = Column(Float, default=0)  # për *_set është vlera e re, për të tjerat ndryshimi
+    year = Column(Integer)  # viti i bilancit që prek (None për leje/carryover)
+    vacation_id = Column(Integer)
+
+class BalanceCheckpoint(Base):
+    """Gjendja e bilancit të një përdoruesi deri te ngjarja `last_event_id` (JSON)."""
+    __tablename__ = "balance_checkpoints"
+    __table_args__ = (Index("ix_balance_checkpoints_user_ts", "user_id", "ts"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    ts = Column(DateTime, nullable=False)
+    last_event_id = Column(Integer, nullable=False)
+    state = Column(Text, nullable=False)
+
+def ensure_columns(engine):
+    """Shton kolonat/indekset e reja në tabelat ekzistuese (create_all nuk i prek ato)."""
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in existing:
+                    ddl = col.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {ddl}'))
+            for idx in table.indexes:
+                idx.create(conn, checkfirst=True)
+
+def init_schema(bind):
+    """Tabelat, kolonat e reja dhe migrimet SQL për një bazë (të paracaktuarën ose të një tenant-i)."""
+    Base.metadata.create_all(bind)
+    ensure_columns(bind)
+    with bind.begin() as conn:
+        # auditi nuk ndryshohet kurrë; fshirja lejohet vetëm për arkivimin
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS audit_events_no_update BEFORE UPDATE ON audit_events "
+            "BEGIN SELECT RAISE(ABORT, 'audit_events is append-only'); END"
+        ))
+        # rreshtat para llojeve të lejes janë të gjithë leje vjetore
+        conn.execute(text("UPDATE vacations SET leave_type = 'annual' WHERE leave_type IS NULL"))
+        conn.execute(text("UPDATE adjustments SET leave_type = 'annual' WHERE leave_type IS NULL"))
+        # kërkesat para njësive fikse janë ditë të plota
+        conn.execute(text(
+            f"UPDATE vacations SET units = CAST(ROUND(days * {UNITS_PER_DAY}) AS INTEGER), portion = 'full' "
+            "WHERE units IS NULL"
+        ))
+        if not conn.execute(select(func.count()).select_from(LeaveType.__table__)).scalar():
+            conn.execute(insert(LeaveType), [
+                dict(code="annual", name="Pushim vjetor", allowance=None, sort=0),
+                dict(code="sick", name="Pushim mjekësor", allowance=20, sort=1),
+                dict(code="unpaid", name="Pa pagesë", allowance=None, sort=2),
+            ])
+
+init_schema(engine)
+
+
+# -------------------- BACKUP --------------------
+# Backup "online" me API-n e sqlite: kopjohen BACKUP_PAGES faqe për hap dhe ndërmjet
+# hapave shkrimtarët e tjerë e marrin bazën (nëse ndryshon, sqlite e rifillon kopjen).
+_backup_lock = threading.Lock()
+
+def online_copy(dst_path: str, pages: int = -1, sleep: float = 0.0):
+    """Kopjon bazën primare (të tenant-it aktual) te dst_path me backup API-n e sqlite."""
+    src = sqlite3.connect(database_path())
+    dst = sqlite3.connect(dst_path)
+    try:
+        # pauza pas çdo hapi i lë shkrimtarët të marrin bazën ndërmjet hapave
+        pause = (lambda status, remaining, total: time.sleep(sleep)) if sleep and pages > 0 else None
+        src.backup(dst, pages=pages, progress=pause)
+        # immutable=1 nuk lexon WAL-in; kopja mbahet gjithmonë në modalitetin klasik
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+def verify_backup(path: str) -> str:
+    """Rezultati i PRAGMA integrity_check ("ok" kur skedari është i shëndoshë)."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        return "\n".join(row[0] for row in conn.execute("PRAGMA integrity_check"))
+    except sqlite3.DatabaseError as exc:
+        return str(exc)
+    finally:
+        conn.close()
+
+def list_backups():
+    """Backup-et ekzistuese, nga më i vjetri te më i riu."""
+    folder = tenant_folder(app.config["BACKUP_DIR"])
+    if not os.path.isdir(folder):
+        return []
+    names = sorted(n for n in os.listdir(folder) if n.startswith("vacation-") and n.endswith(".db"))
+    return [os.path.join(folder, n) for n in names]
+
+def latest_backup():
+    backups = list_backups()
+    return backups[-1] if backups else None
+
+def create_backup(pages: int = None, keep: int = None) -> str:
+    """Krijon një backup të verifikuar në BACKUP_DIR dhe fshin më të vjetrit përtej `keep`."""
+    pages = app.config["BACKUP_PAGES"] if pages is None else pages
+    keep = app.config["BACKUP_KEEP"] if keep is None else keep
+    folder = tenant_folder(app.config["BACKUP_DIR"])
+    os.makedirs(folder, exist_ok=True)
+
+    with _backup_lock:
+        path = os.path.join(folder, f"vacation-{datetime.utcnow():%Y%m%d-%H%M%S}.db")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            online_copy(tmp, pages=pages, sleep=app.config["BACKUP_SLEEP"])
+            result = verify_backup(tmp)
+            if result != "ok":
+                raise RuntimeError(f"integrity_check dështoi: {result}")
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        for old in list_backups()[:-keep] if keep > 0 else []:
+            os.remove(old)
+    return path
+
+def _backup_scheduler():
+    interval = app.config["BACKUP_INTERVAL"]
+    while True:
+        wait = interval
+        for tenant in [None] + list_tenants():
+            token = _current_tenant.set(tenant)
+            try:
+                latest = latest_backup()
+                age = time.time() - os.path.getmtime(latest) if latest else interval
+                # me disa workers, secili e sheh backup-in e tjetrit dhe nuk e përsërit
+                if age >= interval:
+                    try:
+                        create_backup()
+                    except Exception as exc:
+                        app.logger.error("Backup-i dështoi (%s): %s", tenant or "default", exc)
+                    age = 0
+                wait = min(wait, interval - age)
+            finally:
+                _current_tenant.reset(token)
+        time.sleep(max(wait, 1))
+
+def _backup_leader():
+    """Pret kyçin e skedarit BACKUP_DIR/.scheduler.lock dhe pastaj ekzekuton planifikuesin.
+
+    Vetëm procesi që e mban kyçin bën backup; kur ai ndalet, kyçi lirohet dhe e merr një tjetër."""
+    if fcntl is not None:
+        os.makedirs(app.config["BACKUP_DIR"], exist_ok=True)
+        lock = open(os.path.join(app.config["BACKUP_DIR"], ".scheduler.lock"), "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)  # mbahet hapur deri në fund të procesit
+    _backup_scheduler()
+
+_backup_thread_pid = None
+_backup_start_lock = threading.Lock()
+
+@app.before_request
+def _start_backup_scheduler():
+    # si dispatcher-i i outbox-it: nis me kërkesën e parë të procesit, jo në import (CLI-ja s'e nis)
+    global _backup_thread_pid
+    if app.config["BACKUP_INTERVAL"] <= 0 or _backup_thread_pid == os.getpid():
+        return
+    with _backup_start_lock:
+        if _backup_thread_pid != os.getpid():
+            _backup_thread_pid = os.getpid()
+            threading.Thread(target=_backup_leader, name="backup", daemon=True).start()
+
+
+# -------------------- REPLIKA E RAPORTEVE --------------------
+# Raportet (eksporti, grafikët) lexojnë nga një kopje e bazës e hapur me
+# mode=ro&immutable=1: pa kyçje, kështu që një raport i gjatë nuk bllokon miratimet.
+# Kopja është REPORT_DB (rifreskohet këtu) ose backup-i i fundit (REPORT_FROM_BACKUPS).
+_snapshot_lock = threading.Lock()
+_report_engine = (None, None, None)  # (rruga, mtime, engine) i kopjes ku hapen sesionet e reja
+_ReportSessionLocal = sessionmaker(info={"readonly": True})
+
+def _report_engine_for(path: str):
+    """Engine vetëm-lexim për kopjen `path`; None kur skedari s'ekziston më (p.sh. e fshiu rotacioni).
+
+    Një engine për çdo kopje: një sesion i hapur mbetet mbi skedarin e vet edhe pasi kopja
+    rifreskohet. NullPool sepse "sqlite://" jep SingletonThreadPool, ku lidhja i përket thread-it
+    dhe dispose() mbyllte lidhje që thread-e të tjera po përdornin ende; këtu asgjë nuk mbyllet
+    nga jashtë, lidhja mbyllet kur sesioni mbaron.
+    """
+    global _report_engine
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+    cached_path, cached_mtime, eng = _report_engine
+    if (cached_path, cached_mtime) != (path, mtime):
+        uri = f"file:{os.path.abspath(path)}?mode=ro&immutable=1"
+        eng = create_engine("sqlite://", poolclass=NullPool, future=True,
+                            creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False))
+        _report_engine = (path, mtime, eng)
+    return eng
+
+def refresh_report_snapshot():
+    """Kopjon bazën primare te REPORT_DB dhe e zëvendëson kopjen e vjetër në një hap."""
+    target = app.config["REPORT_DB"]
+    tmp = f"{target}.{os.getpid()}.tmp"
+    online_copy(tmp)
+    os.replace(tmp, target)
+
+def _ensure_fresh_snapshot():
+    target = app.config["REPORT_DB"]
+    max_age = app.config["REPORT_SNAPSHOT_MAX_AGE"]
+    mtime = os.path.getmtime(target) if os.path.exists(target) else None
+    if mtime is None or (max_age > 0 and time.time() - mtime > max_age):
+        with _snapshot_lock:
+            # një thread tjetër mund ta ketë rifreskuar ndërkohë
+            mtime = os.path.getmtime(target) if os.path.exists(target) else None
+            if mtime is None or (max_age > 0 and time.time() - mtime > max_age):
+                refresh_report_snapshot()
+    return target
+
+def ReportSession():
+    """Sesion për lexime raportesh: kopja vetëm-lexim kur ka një të tillë, përndryshe baza primare."""
+    if current_tenant() is not None:
+        # kopja e raporteve mbahet vetëm për bazën e paracaktuar
+        return SessionLocal()
+    if app.config["REPORT_FROM_BACKUPS"]:
+        path = latest_backup()
+    elif app.config["REPORT_DB"]:
+        path = _ensure_fresh_snapshot()
+    else:
+        path = None
+    eng = _report_engine_for(path) if path else None
+    if eng is None:
+        return SessionLocal()
+    return _ReportSessionLocal(bind=eng)
+
+
+# -------------------- PIN --------------------
+# _pin_pool vetëm e kufizon CPU-në: sado login të vijnë njëherësh, jo më shumë se
+# PIN_HASH_WORKERS hash-e llogariten njëkohësisht. Nuk e çliron worker-in: hash_pin dhe
+# verify_pin presin te .result(), kështu që thread-i i kërkesës mbetet i zënë gjatë gjithë
+# hash-it, plus pritjes në radhë kur pool-i është plot.
+_pin_pool = ThreadPoolExecutor(
+    max_workers=app.config["PIN_HASH_WORKERS"], thread_name_prefix="pin-hash"
+)
+_pin_cache = OrderedDict()  # hmac(hash, pin) -> skadimi; vetëm verifikime të sukseshme
+_pin_cache_lock = threading.Lock()
+_pin_method_prefix = None
+
+def hash_pin(pin: str) -> str:
+    """Hash-on PIN-in në _pin_pool; thirrësi pret deri sa të mbarojë."""
+    return _pin_pool.submit(
+        generate_password_hash, pin, method=app.config["PIN_HASH_METHOD"]
+    ).result()
+
+def is_hashed_pin(stored: str) -> bool:
+    return (stored or "").count("$") == 2
+
+def pin_needs_rehash(stored: str) -> bool:
+    """PIN në tekst të thjeshtë ose i hash-uar me kosto tjetër nga ajo e konfiguruar."""
+    global _pin_method_prefix
+    if not is_hashed_pin(stored):
+        return True
+    if _pin_method_prefix is None:
+        _pin_method_prefix = hash_pin("").split("$", 1)[0]
+    return stored.split("$", 1)[0] != _pin_method_prefix
+
+def _pin_cache_key(stored: str, pin: str) -> bytes:
+    msg = f"{stored}\0{pin}".encode("utf-8")
+    return hmac.new(app.config["SECRET_KEY"].encode("utf-8"), msg, "sha256").digest()
+
+def verify_pin(stored: str, pin: str) -> bool:
+    """Krahason PIN-in me vlerën e ruajtur (hash ose tekst i vjetër)."""
+    if not stored or not pin:
+        return False
+    if not is_hashed_pin(stored):
+        return hmac.compare_digest(stored.encode("utf-8"), pin.encode("utf-8"))
+
+    key = _pin_cache_key(stored, pin)
+    now = time.monotonic()
+    with _pin_cache_lock:
+        expires = _pin_cache.get(key)
+        if expires and expires > now:
+            _pin_cache.move_to_end(key)
+            return True
+
+    ok = _pin_pool.submit(check_password_hash, stored, pin).result()
+    if ok:
+        with _pin_cache_lock:
+            _pin_cache[key] = now + app.config["PIN_CACHE_TTL"]
+            _pin_cache.move_to_end(key)
+            while len(_pin_cache) > app.config["PIN_CACHE_SIZE"]:
+                _pin_cache.popitem(last=False)
+    return ok
+
+
+# -------------------- RATE LIMIT --------------------
+# Dritare rrëshqitëse e përafruar: për çdo çelës mbahen vetëm (dritarja, numri i dritares
+# së kaluar, numri i dritares aktuale); vlerësimi = prev * (1 - pjesa e kaluar) + cur.
+def _roll_window(state, idx):
+    if not state:
+        return (idx, 0, 0)
+    w, prev, cur = state
+    if w == idx:
+        return state
+    if w == idx - 1:
+        return (idx, cur, 0)
+    return (idx, 0, 0)
+
+class MemoryWindowStore:
+    """Numëruesit në memorie të procesit."""
+
+    def __init__(self, max_keys=100_000):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def get(self, key, idx):
+        with self._lock:
+            return _roll_window(self._data.get(key), idx)
+
+    def incr(self, key, idx):
+        with self._lock:
+            w, prev, cur = _roll_window(self._data.get(key), idx)
+            self._data[key] = (w, prev, cur + 1)
+            if len(self._data) > self._max_keys:
+                # hiq çelësat që nuk ndikojnë më në asnjë vlerësim
+                for k in [k for k, st in self._data.items() if st[0] < idx - 1]:
+                    del self._data[k]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+class SqliteWindowStore:
+    """Numëruesit në një skedar SQLite të veçantë, i përbashkët për të gjithë workers."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hits ("
+                "key TEXT PRIMARY KEY, w INTEGER, prev INTEGER, cur INTEGER)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, idx):
+        row = self._conn().execute(
+            "SELECT w, prev, cur FROM hits WHERE key = ?", (key,)
+        ).fetchone()
+        return _roll_window(row, idx)
+
+    def incr(self, key, idx):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT w, prev, cur FROM hits WHERE key = ?", (key,)).fetchone()
+            w, prev, cur = _roll_window(row, idx)
+            conn.execute(
+                "INSERT OR REPLACE INTO hits (key, w, prev, cur) VALUES (?, ?, ?, ?)",
+                (key, w, prev, cur + 1),
+            )
+            conn.execute("DELETE FROM hits WHERE w < ?", (idx - 1,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM hits WHERE key = ?", (key,))
+
+class SlidingWindowLimiter:
+    """Lejon deri në `limit` ngjarje për çdo çelës brenda `window` sekondave."""
+
+    def __init__(self, store, prefix, limit, window):
+        self.store = store
+        self.prefix = prefix
+        self.limit = limit
+        self.window = window
+
+    def _estimate(self, key, now):
+        idx, frac = divmod(now / self.window, 1)
+        _, prev, cur = self.store.get(f"{self.prefix}:{key}", int(idx))
+        return prev * (1 - frac) + cur
+
+    def blocked(self, key) -> bool:
+        return self._estimate(key, time.time()) >= self.limit
+
+    def hit(self, key):
+        self.store.incr(f"{self.prefix}:{key}", int(time.time() // self.window))
+
+    def reset(self, key):
+        self.store.delete(f"{self.prefix}:{key}")
+
+_limit_store = (
+    SqliteWindowStore(app.config["RATELIMIT_STORAGE"])
+    if app.config["RATELIMIT_STORAGE"]
+    else MemoryWindowStore()
+)
+email_limiter = SlidingWindowLimiter(
+    _limit_store, "login-email", app.config["LOGIN_LIMIT_PER_EMAIL"], app.config["LOGIN_LIMIT_WINDOW"]
+)
+ip_limiter = SlidingWindowLimiter(
+    _limit_store, "login-ip", app.config["LOGIN_LIMIT_PER_IP"], app.config["LOGIN_LIMIT_WINDOW"]
+)
+pin_change_limiter = SlidingWindowLimiter(
+    _limit_store, "pin-change", app.config["PIN_CHANGE_LIMIT"], app.config["LOGIN_LIMIT_WINDOW"]
+)
+
+def client_ip() -> str:
+    return request.remote_addr or "-"
 
 
 # -------------------- HELPERS --------------------
+@on_database_setup
 def ensure_initial_admin():
     db = SessionLocal()
     try:
@@ -109,20 +976,23 @@ def ensure_initial_admin():
             admin = User(
                 name="Admin",
                 email="admin@example.com",
-                pin="1234",           # PIN fillestar
+                pin=hash_pin("1234"),  # PIN fillestar
                 role="admin",
                 annual_allowance=22,
                 carryover=0,
                 first_login=True      # që ta ndryshosh PIN-in herën e parë
             )
             db.add(admin)
+            db.flush()
+            db.add_all([
+                BalanceEvent(user_id=admin.id, kind="allowance_set", amount=22),
+                BalanceEvent(user_id=admin.id, kind="carryover_set", amount=0),
+            ])
             db.commit()
             print("✔ Admini fillestar u krijua: admin@example.com / 1234")
     finally:
         db.close()
 
-ensure_initial_admin()
-
 def get_current_user():
     uid = session.get("uid")
     if not uid:
@@ -132,6 +1002,42 @@ def get_current_user():
     db.close()
     return user
 
+def can_manage(user) -> bool:
+    return user is not None and user.role in ("admin", "manager")
+
+def team_scope(db, user):
+    """Ekipet që sheh përdoruesi në faqet e menaxhimit: None = gjithë kompania (admin, pa ?team=).
+
+    `?team=` ngushton fushëveprimin te një ekip, vetëm brenda ekipeve që përdoruesi ka të drejtë."""
+    if user.role == "admin":
+        teams = None
+    elif user.role == "manager":
+        teams = [tid for (tid,) in db.query(Team.id).filter(Team.manager_id == user.id).order_by(Team.id)]
+    else:
+        return []
+    team = request.args.get("team", type=int)
+    if team and (teams is None or team in teams):
+        return [team]
+    return teams
+
+def in_teams(column, teams):
+    """Filtri i fushëveprimit: pa kufizim për None, përndryshe column IN teams."""
+    return true() if teams is None else column.in_(teams)
+
+def read_version(db, name: str) -> str:
+    """Numërues versioni në settings; proceset krahasojnë këtë për të hedhur cache-t lokale."""
+    row = db.get(Setting, f"version_{name}")
+    return row.value if row else "0"
+
+def bump_version(db, name: str) -> str:
+    row = db.get(Setting, f"version_{name}")
+    if row:
+        row.value = str(int(row.value) + 1)
+    else:
+        row = Setting(key=f"version_{name}", value="1")
+        db.add(row)
+    return row.value
+
 def get_theme():
     return session.get("theme", "light")
 
@@ -141,432 +1047,2442 @@ def days_between_calendar(start: date, end: date) -> int:
         start, end = end, start
     return (end - start).days + 1
 
-def maybe_run_monthly_accrual(db):
-    """Nëse nuk është bërë akumulimi për këtë muaj, shton +MONTHLY_RATE për të gjithë user-at."""
-    today = date.today()
-    month_key = f"accrual_{today.year}_{today.month:02d}"
+def units_to_days(units: int) -> float:
+    return units / UNITS_PER_DAY
+
+def portion_units(portion: str, hours: int = None) -> int:
+    """Njësitë e një pjese dite (am / pm / hours); None për kombinime të pavlefshme."""
+    if portion in ("am", "pm"):
+        return UNITS_PER_DAY // 2
+    if portion == "hours" and hours and 0 < hours < WORKDAY_HOURS:
+        return hours * UNITS_PER_DAY // WORKDAY_HOURS
+    return None
+
+def day_units(portion: str, units: int) -> int:
+    """Njësitë e mungesës për secilën ditë të intervalit të një kërkese."""
+    return UNITS_PER_DAY if portion in (None, "full") else units
+
+def format_days(value) -> str:
+    """5.0 -> "5", 0.5 -> "0.5" (për tabela dhe CSV)."""
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+def portion_label(portion: str, units: int = None) -> str:
+    if portion == "am":
+        return "½ paradite"
+    if portion == "pm":
+        return "½ pasdite"
+    if portion == "hours":
+        return f"{units * WORKDAY_HOURS // UNITS_PER_DAY} orë"
+    return ""
+
+# -------------------- AUDIT --------------------
+# Ngjarjet mblidhen në sesion dhe shkruhen me një executemany të vetëm në commit,
+# brenda të njëjtit transaksion me ndryshimin që përshkruajnë.
+def audit(db, entity: str, entity_id: int, action: str, actor_id: int = None, **data):
+    """Shton një ngjarje auditi në sesion; shkruhet kur sesioni bën commit."""
+    if actor_id is None and has_request_context():
+        actor_id = session.get("uid")
+    db.info.setdefault("audit", []).append({
+        "ts": datetime.utcnow(),
+        "actor_id": actor_id,
+        "entity": entity,
+        "entity_id": entity_id,
+        "action": action,
+        "data": json.dumps(data, separators=(",", ":"), default=str) if data else None,
+    })
+
+def changes(obj, **new_values):
+    """{fusha: [e vjetra, e reja]} vetëm për vlerat që ndryshojnë; i vendos edhe në objekt."""
+    diff = {}
+    for name, value in new_values.items():
+        old = getattr(obj, name)
+        if old != value:
+            diff[name] = [old, value]
+            setattr(obj, name, value)
+    return diff
+
+@event.listens_for(SessionLocal, "before_commit")
+def _flush_audit(db):
+    rows = db.info.pop("audit", None)
+    if rows:
+        db.execute(insert(AuditEvent), rows)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_audit(db):
+    db.info.pop("audit", None)
+
+def archive_audit_events(db, older_than_days: int = None, progress=None):
+    """Zhvendos ngjarjet më të vjetra se afati në skedarë vjetorë audit-YYYY.jsonl.gz."""
+    days = app.config["AUDIT_RETENTION_DAYS"] if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    folder = tenant_folder(app.config["AUDIT_ARCHIVE_DIR"])
+    os.makedirs(folder, exist_ok=True)
+
+    total = db.query(func.count(AuditEvent.id)).filter(AuditEvent.ts < cutoff).scalar()
+    moved = 0
+    while moved < total:
+        batch = (
+            db.query(AuditEvent)
+            .filter(AuditEvent.ts < cutoff)
+            .order_by(AuditEvent.id)
+            .limit(1000)
+            .all()
+        )
+        if not batch:
+            break
+        by_year = {}
+        for e in batch:
+            by_year.setdefault(e.ts.year, []).append(json.dumps({
+                "id": e.id, "ts": e.ts.isoformat(), "actor_id": e.actor_id, "entity": e.entity,
+                "entity_id": e.entity_id, "action": e.action, "data": json.loads(e.data) if e.data else None,
+            }, separators=(",", ":")))
+        # skedari shkruhet para fshirjes; gzip "ab" shton një anëtar të ri në fund
+        for year, lines in by_year.items():
+            with gzip.open(os.path.join(folder, f"audit-{year}.jsonl.gz"), "ab") as fh:
+                fh.write(("\n".join(lines) + "\n").encode("utf-8"))
+        db.query(AuditEvent).filter(AuditEvent.id.in_([e.id for e in batch])).delete(synchronize_session=False)
+        db.commit()
+        moved += len(batch)
+        if progress:
+            progress(moved * 100 // total)
+    return moved
+
+
+# -------------------- LIBRI I BILANCEVE --------------------
+# annual_allowance/carryover mbishkruhen në vend; libri mban çdo lëvizje me kohën kur u
+# regjistrua, që bilanci "siç dukej më datë X" të rindërtohet. Pikat e kontrollit (çdo muaj
+# me akumulimin) kufizojnë rishfaqjen vetëm te ngjarjet pas pikës më të afërt.
+def record_balance(db, user_id: int, kind: str, amount: float = 0, year: int = None, vacation_id: int = None):
+    db.add(BalanceEvent(
+        user_id=user_id, ts=datetime.utcnow(), kind=kind, amount=amount, year=year, vacation_id=vacation_id,
+    ))
+
+def vacation_status_changed(db, v, old_status: str, new_status: str):
+    """Regjistron në libër efektin e një ndryshimi statusi (new_status=None për fshirje)."""
+    if v.leave_type != ANNUAL_LEAVE:
+        return
+    per_year = days_by_year((p.year, p.days) for p in v.parts) or {v.start.year: v.days}
+    for year, days in sorted(per_year.items()):
+        if old_status != "approved" and new_status == "approved":
+            record_balance(db, v.user_id, "approval", days, year, v.id)
+        elif old_status == "approved" and new_status != "approved":
+            record_balance(db, v.user_id, "reversal", -days, year, v.id)
+        elif new_status == "denied":
+            record_balance(db, v.user_id, "denial", 0, year, v.id)
+
+def empty_balance_state():
+    return {"allowance": 0, "carryover": 0, "years": {}}
+
+def apply_balance_event(state, kind: str, amount: float, year: int):
+    amount = amount or 0
+    if kind == "allowance_set":
+        state["allowance"] = amount
+    elif kind == "carryover_set":
+        state["carryover"] = amount
+    elif kind not in ("denial", "opened"):
+        y = state["years"].setdefault(str(year), {"adjust": 0, "taken": 0})
+        y["adjust" if kind in ("accrual", "adjustment") else "taken"] += amount
+    return state
+
+def balance_remaining(state, year: int) -> float:
+    y = state["years"].get(str(year), {"adjust": 0, "taken": 0})
+    return state["allowance"] + state["carryover"] + y["adjust"] - y["taken"]
+
+def balance_as_of(db, user_id: int, at: datetime):
+    """(gjendja, id e ngjarjes së fundit) e bilancit siç ishte në momentin `at`."""
+    cp = (
+        db.query(BalanceCheckpoint)
+        .filter(BalanceCheckpoint.user_id == user_id, BalanceCheckpoint.ts <= at)
+        .order_by(BalanceCheckpoint.ts.desc())
+        .first()
+    )
+    state = json.loads(cp.state) if cp else empty_balance_state()
+    last_id = cp.last_event_id if cp else 0
+    events = (
+        db.query(BalanceEvent.id, BalanceEvent.kind, BalanceEvent.amount, BalanceEvent.year)
+        .filter(BalanceEvent.user_id == user_id, BalanceEvent.id > last_id, BalanceEvent.ts <= at)
+        .order_by(BalanceEvent.id)
+    )
+    for eid, kind, amount, year in events:
+        apply_balance_event(state, kind, amount, year)
+        last_id = eid
+    return state, last_id
+
+def write_balance_checkpoints(db, user_ids=None):
+    """Pikë kontrolli me gjendjen e tanishme për përdoruesit me lëvizje pas pikës së fundit; pa commit.
+
+    Një kalim i vetëm: pika e fundit e secilit dhe ngjarjet pas saj lexohen me dy query."""
+    latest = select(func.max(BalanceCheckpoint.id)).group_by(BalanceCheckpoint.user_id)
+    if user_ids is not None:
+        latest = latest.where(BalanceCheckpoint.user_id.in_(user_ids))
+    states = {
+        cp.user_id: (json.loads(cp.state), cp.last_event_id)
+        for cp in db.query(BalanceCheckpoint).filter(BalanceCheckpoint.id.in_(latest))
+    }
+    cursor = (
+        select(BalanceCheckpoint.user_id, BalanceCheckpoint.last_event_id)
+        .where(BalanceCheckpoint.id.in_(latest))
+        .subquery()
+    )
+    events = (
+        db.query(BalanceEvent.user_id, BalanceEvent.id, BalanceEvent.kind, BalanceEvent.amount, BalanceEvent.year)
+        .outerjoin(cursor, cursor.c.user_id == BalanceEvent.user_id)
+        .filter(BalanceEvent.id > func.coalesce(cursor.c.last_event_id, 0))
+        .order_by(BalanceEvent.user_id, BalanceEvent.id)
+    )
+    if user_ids is not None:
+        events = events.filter(BalanceEvent.user_id.in_(user_ids))
+
+    changed = {}
+    for uid, eid, kind, amount, year in events:
+        state, _ = changed.get(uid) or states.get(uid) or (empty_balance_state(), 0)
+        changed[uid] = (apply_balance_event(state, kind, amount, year), eid)
+
+    now = datetime.utcnow()
+    rows = [
+        dict(user_id=uid, ts=now, last_event_id=last_id, state=json.dumps(state, separators=(",", ":")))
+        for uid, (state, last_id) in changed.items()
+    ]
+    if rows:
+        db.execute(insert(BalanceCheckpoint), rows)
+    return len(rows)
+
+def unopened_ledger_users(db):
+    """Përdoruesit që kishin histori para librit dhe ende s'e kanë ngjarjen "opened".
+
+    Përdoruesit e krijuar me librin e nisin me allowance_set, kështu që nuk kanë nevojë."""
+    first_kind = (
+        select(BalanceEvent.kind)
+        .where(BalanceEvent.user_id == User.id)
+        .order_by(BalanceEvent.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    opened = select(BalanceEvent.id).where(BalanceEvent.user_id == User.id, BalanceEvent.kind == "opened").exists()
+    return db.query(User).filter(~opened, func.coalesce(first_kind, "") != "allowance_set")
+
+def bootstrap_ledger(db) -> int:
+    """Hap librin për përdoruesit pa ngjarjen "opened", nga gjendja aktuale në bazë.
+
+    Ngjarjet e shkruara pas deploy-it (akumulime, aprovime, kthime) mbahen; nga historia
+    shtohet vetëm ajo që mungon, që asgjë të mos numërohet dy herë."""
+    started = 0
+    for u in unopened_ledger_users(db).all():
+        existing = db.query(BalanceEvent).filter_by(user_id=u.id).order_by(BalanceEvent.id).all()
+        rows = []
+
+        # korrigjimet që kanë tashmë ngjarjen e tyre hiqen një nga një (lloji, viti, sasia)
+        logged = {}
+        for e in existing:
+            if e.kind in ("accrual", "adjustment"):
+                key = (e.kind, e.year, round(e.amount or 0, 4))
+                logged[key] = logged.get(key, 0) + 1
+        for a in db.query(Adjustment).filter_by(user_id=u.id, leave_type=ANNUAL_LEAVE):
+            kind = "accrual" if (a.reason or "").startswith("Akumulim") else "adjustment"
+            key = (kind, a.when.year, round(a.amount or 0, 4))
+            if logged.get(key):
+                logged[key] -= 1
+                continue
+            rows.append(dict(user_id=u.id, ts=datetime.combine(a.when, datetime.min.time()),
+                             kind=kind, amount=a.amount, year=a.when.year))
+
+        # një kërkesë ishte aprovuar para librit nëse s'ka ngjarje dhe është "approved",
+        # ose nëse ngjarja e saj e parë është një kthim / rillogaritje
+        by_vacation = {}
+        for e in existing:
+            if e.vacation_id is not None:
+                by_vacation.setdefault(e.vacation_id, []).append(e)
+        for v in db.query(Vacation).filter_by(user_id=u.id, leave_type=ANNUAL_LEAVE):
+            history = by_vacation.get(v.id, [])
+            if history and history[0].kind not in ("reversal", "recompute"):
+                continue
+            if not history and v.status != "approved":
+                continue
+            split = days_by_year((p.year, p.days) for p in v.parts) or {v.start.year: v.days}
+            for e in history:
+                if e.kind == "recompute":  # ditët e sotme përfshijnë rillogaritjet e mëvonshme
+                    split[e.year] = split.get(e.year, 0) - (e.amount or 0)
+            ts = v.updated_at or datetime.combine(v.start, datetime.min.time())
+            if history:
+                ts = min(ts, history[0].ts)
+            rows += [
+                dict(user_id=u.id, ts=ts, kind="approval", amount=round(days, 4), year=year, vacation_id=v.id)
+                for year, days in sorted(split.items())
+            ]
+
+        dates = [r["ts"] for r in rows] + [e.ts for e in existing]
+        opened = min(dates, default=datetime.utcnow())
+        rows = [
+            dict(user_id=u.id, ts=opened, kind="opened", amount=0),
+            dict(user_id=u.id, ts=opened, kind="allowance_set", amount=u.annual_allowance or 0),
+            dict(user_id=u.id, ts=opened, kind="carryover_set", amount=u.carryover or 0),
+        ] + sorted(rows, key=lambda r: r["ts"])
+        for r in rows:
+            r.setdefault("year", None)
+            r.setdefault("vacation_id", None)
+        db.execute(insert(BalanceEvent), rows)
+        # pikat e vjetra nuk i përfshijnë këto ngjarje; rishkruhen më poshtë
+        db.query(BalanceCheckpoint).filter_by(user_id=u.id).delete()
+        started += 1
+    if started:
+        write_balance_checkpoints(db)
+    db.commit()
+    return started
+
+
+# -------------------- DITË PUNE --------------------
+ANNUAL_LEAVE = "annual"  # i vetmi lloj që prek remaining(), carryover-in dhe librin
+DEFAULT_COUNTRY = "AL"
+DEFAULT_WEEKEND_MASK = "0000011"
+
+def _workday_cache():
+    """Për tenant-in aktual: {"version", "tables": (shteti, viti) -> array kumulativ}.
+
+    cum[n] = ditë pune në n ditët e para të vitit."""
+    return tenant_cache("workdays", lambda: {"version": None, "tables": {}})
+
+def default_country(db) -> str:
+    row = db.get(Setting, "default_country")
+    return row.value if row and row.value else DEFAULT_COUNTRY
+
+def _check_workday_version(db):
+    cache = _workday_cache()
+    version = read_version(db, "workdays")
+    if version != cache["version"]:
+        cache["tables"] = {}
+        cache["version"] = version
+
+def _workday_context(db) -> str:
+    """Kontrollon versionin e tabelave një herë për transaksion (kërkesë ose grup) dhe kthen shtetin e paracaktuar."""
+    country = db.info.get("workdays_country")
+    if country is None:
+        _check_workday_version(db)
+        country = db.info["workdays_country"] = default_country(db)
+    return country
+
+@event.listens_for(SessionLocal, "after_commit")
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_workday_context(db):
+    # një commit mund të ketë ndryshuar festat ose shtetin e paracaktuar
+    db.info.pop("workdays_country", None)
+
+def _workday_table(db, country: str, year: int):
+    tables = _workday_cache()["tables"]
+    table = tables.get((country, year))
+    if table is not None:
+        return table
+
+    cal = db.get(WorkCalendar, country)
+    mask = (cal.weekend_mask if cal and cal.weekend_mask else DEFAULT_WEEKEND_MASK)
+    holidays = {
+        d for (d,) in db.query(Holiday.day).filter(
+            Holiday.country == country,
+            Holiday.day >= date(year, 1, 1),
+            Holiday.day <= date(year, 12, 31),
+        )
+    }
+
+    table = array("H", [0])
+    d = date(year, 1, 1)
+    while d.year == year:
+        free = mask[d.weekday()] == "1" or d in holidays
+        table.append(table[-1] + (0 if free else 1))
+        d += timedelta(days=1)
+
+    tables[(country, year)] = table
+    return table
+
+def working_days(db, start: date, end: date, country: str = None) -> int:
+    """Ditë pune në interval (përfshirë skajet), pa fundjava dhe festa zyrtare."""
+    if end < start:
+        start, end = end, start
+    # versioni kontrollohet edhe kur shteti jepet nga thirrësi, përndryshe tabelat e një
+    # shteti tjetër mbeteshin me festat e vjetra
+    default = _workday_context(db)
+    country = country or default
+
+    total = 0
+    for year in range(start.year, end.year + 1):
+        table = _workday_table(db, country, year)
+        s = max(start, date(year, 1, 1)).timetuple().tm_yday
+        e = min(end, date(year, 12, 31)).timetuple().tm_yday
+        total += table[e] - table[s - 1]
+    return total
+
+def run_monthly_accrual(db, year: int, month: int) -> bool:
+    """Shton +MONTHLY_RATE për të gjithë user-at për muajin e dhënë, nëse nuk është bërë."""
+    month_key = f"accrual_{year}_{month:02d}"
 
     existing = db.query(Setting).filter_by(key=month_key).first()
     if existing:
-        return  # ky muaj është bërë
+        return False  # ky muaj është bërë
 
-    users = db.query(User).all()
-    for u in users:
-        adj = Adjustment(
-            user_id=u.id,
+    when = date(year, month, 1)
+    rows = [
+        dict(
+            user_id=uid,
             amount=MONTHLY_RATE,
-            reason=f"Akumulim mujor {today.strftime('%Y-%m')}",
-            when=date(today.year, today.month, 1),
+            reason=f"Akumulim mujor {when.strftime('%Y-%m')}",
+            when=when,
+            leave_type=ANNUAL_LEAVE,
         )
-        db.add(adj)
-
-    db.add(Setting(key=month_key, value=str(today)))
+        for (uid,) in db.query(User.id)
+    ]
+    if rows:
+        db.execute(insert(Adjustment), rows)
+        now = datetime.utcnow()
+        db.execute(insert(BalanceEvent), [
+            dict(user_id=r["user_id"], ts=now, kind="accrual", amount=MONTHLY_RATE, year=year, vacation_id=None)
+            for r in rows
+        ])
+        write_balance_checkpoints(db)
+
+    db.add(Setting(key=month_key, value=str(date.today())))
     db.commit()
+    return True
 
-# -------------------- ROUTES --------------------
-@app.route("/")
-def index():
-    user = get_current_user()
-    if user:
-        return redirect(url_for("me"))
-    return redirect(url_for("login"))
+def maybe_run_monthly_accrual(db):
+    """Nëse nuk është bërë akumulimi për këtë muaj, shton +MONTHLY_RATE për të gjithë user-at."""
+    done = tenant_cache("accrual")  # "for": (viti, muaji) i konfirmuar tashmë nga ky proces
+    today = date.today()
+    if done.get("for") == (today.year, today.month):
+        return
+    run_monthly_accrual(db, today.year, today.month)
+    # carryover-i skadon vetëm pasi të jetë kaluar mbetja e vitit të kaluar (year-end-rollover)
+    if db.get(Setting, f"rollover_{today.year - 1}"):
+        expire_carryover(db, today.year)
+    done["for"] = (today.year, today.month)
+
+def split_interval(db, start: date, end: date, country: str = None, total: float = None):
+    """[(viti, muaji, ditë pune)] për copat mujore të [start, end].
+
+    Me `total`, ditët ripërndahen proporcionalisht që shuma të jetë saktësisht `total`
+    (p.sh. kërkesa të vjetra me ditë kalendarike)."""
+    pieces = []
+    d = start
+    while d <= end:
+        m_end = min(end, date(d.year, d.month, monthrange(d.year, d.month)[1]))
+        pieces.append((d.year, d.month, working_days(db, d, m_end, country), (m_end - d).days + 1))
+        d = m_end + timedelta(days=1)
+
+    weights = [p[2] for p in pieces]
+    if total is not None and sum(weights) != total:
+        if not sum(weights):
+            weights = [p[3] for p in pieces]
+        scale = total / sum(weights)
+        weights = [round(w * scale, 4) for w in weights]
+        weights[-1] = round(total - sum(weights[:-1]), 4)
+    return [(y, m, w) for (y, m, _, _), w in zip(pieces, weights) if w]
+
+def days_by_year(parts):
+    """{viti: ditë} nga çiftet (viti, ditë) të copave mujore."""
+    years = {}
+    for year, days in parts:
+        years[year] = years.get(year, 0) + days
+    return years
+
+def vacation_part_rows(db, vacation_id: int, start: date, end: date, country: str, total: float):
+    return [
+        dict(vacation_id=vacation_id, year=y, month=m, days=days)
+        for y, m, days in split_interval(db, start, end, country, total)
+    ]
+
+def write_vacation_parts(db, vacation_id: int, start: date, end: date, country: str, total: float):
+    db.query(VacationPart).filter_by(vacation_id=vacation_id).delete()
+    rows = vacation_part_rows(db, vacation_id, start, end, country, total)
+    if rows:
+        db.execute(insert(VacationPart), rows)
+    return rows
+
+def shift_occupancy(db, start: date, end: date, approved: int = 0, pending: int = 0,
+                    units: int = UNITS_PER_DAY):
+    """Shton (ose heq) numërimet për çdo ditë të [start, end] me dy query intervali.
+
+    `units` janë njësitë e mungesës për ditë (gjysmë dite = UNITS_PER_DAY / 2)."""
+    if not approved and not pending:
+        return
+    params = {
+        "start": start.isoformat(), "end": end.isoformat(),
+        "a": approved, "p": pending, "au": approved * units, "pu": pending * units,
+    }
+    db.execute(text(
+        "WITH RECURSIVE d(day) AS (SELECT :start UNION ALL "
+        "SELECT date(day, '+1 day') FROM d WHERE day < :end) "
+        "INSERT OR IGNORE INTO daily_occupancy (day, approved, pending, approved_units, pending_units) "
+        "SELECT day, 0, 0, 0, 0 FROM d"
+    ), params)
+    db.execute(text(
+        "UPDATE daily_occupancy SET approved = approved + :a, pending = pending + :p, "
+        "approved_units = approved_units + :au, pending_units = pending_units + :pu "
+        "WHERE day BETWEEN :start AND :end"
+    ), params)
+
+def _occupancy_weight(status):
+    return (status == "approved", status == "pending")
+
+def vacation_changed(db, v, deleted=False, old_status=None):
+    """Thirret nga çdo shkrim mbi një pushim (krijim, status, fshirje), para commit-it.
+
+    `old_status` është statusi para ndryshimit (None për një kërkesë të re)."""
+    old_a, old_p = _occupancy_weight(old_status)
+    new_a, new_p = _occupancy_weight(None if deleted else v.status)
+    shift_occupancy(db, v.start, v.end, new_a - old_a, new_p - old_p, day_units(v.portion, v.units))
+    invalidate_report_cache(db, v.start.year, v.end.year)
+    version = bump_version(db, "report")
+    if v.id is None:
+        db.flush()
+    # indeksi "kush mungon" përditësohet pas commit-it (shih _apply_out_updates)
+    pending = db.info.setdefault("out_index", {"from": str(int(version) - 1), "ops": []})
+    pending["to"] = version
+    gone = deleted or v.status not in ("approved", "pending")
+    pending["ops"].append((
+        v.id,
+        None if gone else (
+            v.id, v.start.toordinal(), v.end.toordinal(), v.user_id, v.status, v.leave_type,
+            v.portion, v.units,
+        ),
+    ))
+    owner = db.query(User.name, User.email, User.country).filter(User.id == v.user_id).first()
+    # ngjarja për dashboard-et e hapura publikohet pas commit-it (shih _publish_live)
+    db.info.setdefault("live", []).append({
+        "id": v.id, "version": version, "user_id": v.user_id, "team_id": v.team_id,
+        "name": owner.name if owner else "?", "email": owner.email if owner else "",
+        "start": v.start.isoformat(), "end": v.end.isoformat(),
+        "status": None if deleted else v.status, "old_status": old_status,
+        "leave_type": v.leave_type, "portion": v.portion,
+        "days": format_days(v.days), "part": portion_label(v.portion, v.units),
+    })
+    if deleted:
+        db.query(CalendarEvent).filter_by(vacation_id=v.id).delete()
+        db.query(VacationPart).filter_by(vacation_id=v.id).delete()
+    else:
+        write_calendar_event(db, v.id, v.user_id, owner.name if owner else "?", v.start, v.end, v.note, v.status)
+        write_vacation_parts(db, v.id, v.start, v.end, owner.country if owner else None, v.days)
+        db.expire(v, ["parts"])
+
+def _recompute_query(db):
+    return (
+        db.query(Vacation.id, Vacation.start, Vacation.end, Vacation.days, Vacation.status,
+                 Vacation.user_id, Vacation.leave_type, Vacation.portion, User.country)
+        .join(User, Vacation.user_id == User.id)
+        .order_by(Vacation.id)
+    )
 
+def _recompute_batch(db, batch) -> int:
+    """Rillogarit ditët dhe copat për rreshtat e `_recompute_query`, pa commit; kthen sa ndryshuan."""
+    updates, parts = [], {}
+    for vid, start, end, days, status, uid, leave_type, portion, country in batch:
+        if portion not in (None, "full"):
+            continue  # pjesët e ditës kanë kohëzgjatjen e zgjedhur në kërkesë
+        new_days = working_days(db, start, end, country)
+        if new_days != days:
+            updates.append({"id": vid, "days": new_days, "units": new_days * UNITS_PER_DAY})
+            parts[vid] = vacation_part_rows(db, vid, start, end, country, new_days)
+    if not updates:
+        return 0
+
+    # copat e vjetra lexohen, fshihen dhe zëvendësohen me një query për grupin
+    old_parts = {}
+    for vid, year, days in db.execute(
+        select(VacationPart.vacation_id, VacationPart.year, VacationPart.days)
+        .where(VacationPart.vacation_id.in_(parts))
+    ):
+        old_parts.setdefault(vid, []).append((year, days))
+    db.execute(delete(VacationPart).where(VacationPart.vacation_id.in_(parts)))
+    new_rows = [r for rows in parts.values() for r in rows]
+    if new_rows:
+        db.execute(insert(VacationPart), new_rows)
+    for vid, start, end, days, status, uid, leave_type, portion, country in batch:
+        if vid not in parts or status != "approved" or leave_type != ANNUAL_LEAVE:
+            continue
+        old_split = days_by_year(old_parts.get(vid, []))
+        new_split = days_by_year((r["year"], r["days"]) for r in parts[vid])
+        for year in sorted(set(old_split) | set(new_split)):
+            delta = new_split.get(year, 0) - old_split.get(year, 0)
+            if delta:
+                record_balance(db, uid, "recompute", delta, year, vid)
+    db.execute(update(Vacation), updates)
+    # agregatet dhe payload-et e raporteve ishin me ditët e vjetra; në të njëjtin commit me grupin
+    db.query(ReportAggregate).delete()
+    bump_version(db, "report")
+    return len(updates)
+
+def recompute_vacation_days(db, batch_size: int = 1000, progress=None):
+    """Rillogarit ditët e punës për të gjitha kërkesat, me përditësime në grupe."""
+    total = db.query(func.count(Vacation.id)).scalar() or 1
+    changed, seen, last_id = 0, 0, 0
+
+    while True:
+        batch = _recompute_query(db).filter(Vacation.id > last_id).limit(batch_size).all()
+        if not batch:
+            break
+        n = _recompute_batch(db, batch)
+        if n:
+            db.commit()
 
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    if request.method == "POST":
-        email = request.form.get("email", "").lower()
-        pin = request.form.get("pin", "").strip()
+        changed += n
+        seen += len(batch)
+        last_id = batch[-1][0]
+        if progress:
+            progress(seen * 100 // total)
+
+    return seen, changed
+
+def rebuild_vacation_parts(db, batch_size: int = 1000, progress=None) -> int:
+    """Rindërton copat mujore për të gjitha kërkesat (p.sh. pas migrimit)."""
+    total = db.query(func.count(Vacation.id)).scalar() or 1
+    seen, last_id = 0, 0
+    while True:
+        batch = (
+            db.query(Vacation.id, Vacation.start, Vacation.end, Vacation.days, User.country)
+            .join(User, Vacation.user_id == User.id)
+            .filter(Vacation.id > last_id)
+            .order_by(Vacation.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        rows = [
+            r for vid, start, end, days, country in batch
+            for r in vacation_part_rows(db, vid, start, end, country, days)
+        ]
+        db.execute(delete(VacationPart).where(VacationPart.vacation_id.in_([b[0] for b in batch])))
+        if rows:
+            db.execute(insert(VacationPart), rows)
+        db.commit()
+        seen += len(batch)
+        last_id = batch[-1][0]
+        if progress:
+            progress(seen * 100 // total)
+    return seen
+
+def rebuild_occupancy(db) -> int:
+    """Rindërton daily_occupancy nga e para me vargje diferencash (një kalim mbi kërkesat)."""
+    rows = db.execute(
+        select(Vacation.start, Vacation.end, Vacation.status, Vacation.portion, Vacation.units)
+        .where(Vacation.status.in_(["approved", "pending"]))
+    ).all()
+    db.query(DailyOccupancy).delete()
+    if rows:
+        base = min(r.start for r in rows).toordinal()
+        span = max(r.end for r in rows).toordinal() - base + 2
+        diff = {s: ([0] * span, [0] * span) for s in ("approved", "pending")}
+        for start, end, status, portion, units in rows:
+            count, unit = diff[status]
+            per_day = day_units(portion, units)
+            count[start.toordinal() - base] += 1
+            count[end.toordinal() - base + 1] -= 1
+            unit[start.toordinal() - base] += per_day
+            unit[end.toordinal() - base + 1] -= per_day
+        approved, approved_units = (list(accumulate(d)) for d in diff["approved"])
+        pending, pending_units = (list(accumulate(d)) for d in diff["pending"])
+        db.execute(insert(DailyOccupancy), [
+            dict(
+                day=date.fromordinal(base + i),
+                approved=approved[i],
+                pending=pending[i],
+                approved_units=approved_units[i],
+                pending_units=pending_units[i],
+            )
+            for i in range(span - 1)
+            if approved[i] or pending[i]
+        ])
+    db.commit()
+    return len(rows)
 
-        db = SessionLocal()
-        user = db.query(User).filter(User.email == email).first()
+@on_database_setup
+def ensure_vacation_parts():
+    """Migrim i njëhershëm: bazat e vjetra nuk kanë copa për kërkesat ekzistuese."""
+    db = SessionLocal()
+    try:
+        if db.get(Setting, "vacation_parts_built") is None:
+            rebuild_vacation_parts(db)
+            # agregatet e ruajtura ishin me ditë kalendarike
+            db.query(ReportAggregate).delete()
+            bump_version(db, "report")
+            db.merge(Setting(key="vacation_parts_built", value=str(date.today())))
+            db.commit()
+    finally:
         db.close()
 
-        if user and user.pin == pin:
-            if user.first_login:
-                session["uid"]=user.id
-                return redirect(url_for("force_change_pin"))
-            #login normal
-            session["uid"] = user.id
-            flash("Hyrja me sukses!", "success")
-            
-            if user.role == "admin":
-                return redirect(url_for("admin_dashboard"))
-            return redirect(url_for("me"))
-        else:
-            flash("Email ose PIN i gabuar!", "danger")
+@on_database_setup
+def ensure_ledger():
+    """Migrim: hap librin e bilancit për përdoruesit me histori para tij (shih bootstrap_ledger)."""
+    db = SessionLocal()
+    try:
+        bootstrap_ledger(db)
+    finally:
+        db.close()
 
-    return render_template_string(
-        """
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Vacation Planner – Hyrje</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      margin: 0;
-      min-height: 100vh;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: radial-gradient(circle at top left, #4f46e5, #111827);
-      display: flex;
-      align-items: center;
-      justify-content: center;
-      color: #111827;
-    }
-    .card {
-      background: #f9fafb;
-      border-radius: 18px;
-      padding: 28px 26px 22px;
-      width: 100%;
-      max-width: 380px;
-      box-shadow: 0 20px 40px rgba(15, 23, 42, .6);
-    }
-    .logo {
-      font-weight: 700;
-      font-size: 18px;
-      letter-spacing: .08em;
-      text-transform: uppercase;
-      color: #111827;
-      margin-bottom: 6px;
-    }
-    h2 {
-      margin: 0 0 4px;
-      font-size: 22px;
-      font-weight: 650;
-    }
-    .subtitle {
-      font-size: 13px;
-      color: #6b7280;
-      margin-bottom: 18px;
-    }
-    label {
-      display: block;
-      font-size: 13px;
-      color: #4b5563;
-      margin-bottom: 4px;
-    }
-    input {
-      width: 100%;
-      padding: 9px 11px;
-      border-radius: 11px;
-      border: 1px solid #d1d5db;
-      font-size: 14px;
-      margin-bottom: 12px;
-      outline: none;
-      transition: 0.15s;
-      background: #fdfdfd;
-    }
-    input:focus {
-      border-color: #4f46e5;
-      box-shadow: 0 0 0 1px rgba(79,70,229,.25);
-      background: #ffffff;
-    }
-    .btn {
-      width: 100%;
-      border: none;
-      border-radius: 999px;
-      padding: 9px 0;
-      font-size: 14px;
-      font-weight: 600;
-      background: linear-gradient(90deg, #4f46e5, #2563eb);
-      color: #f9fafb;
-      cursor: pointer;
-      margin-top: 4px;
-      transition: 0.15s;
-    }
-    .btn:hover {
-      filter: brightness(1.05);
-      transform: translateY(-1px);
-      box-shadow: 0 6px 18px rgba(37, 99, 235, .35);
-    }
-    .flash {
-      font-size: 13px;
-      padding: 8px 10px;
-      border-radius: 10px;
-      margin-bottom: 10px;
-    }
-    .flash-err {
-      background: #fee2e2;
-      color: #b91c1c;
-      border: 1px solid #fecaca;
-    }
-    .flash-ok {
-      background: #dcfce7;
-      color: #166534;
-      border: 1px solid #bbf7d0;
-    }
-    .footer {
-      margin-top: 10px;
-      font-size: 11px;
-      color: #9ca3af;
-      text-align: center;
-    }
-  </style>
-</head>
-<body>
-  <div class="card">
-    <div class="logo">VACATION PLANNER</div>
-    <h2>Mirë se erdhe 👋</h2>
-    <div class="subtitle">Hyr me email-in dhe PIN-in tënd.</div>
+@on_database_setup
+def ensure_occupancy():
+    """Migrim i njëhershëm për bazat që kanë kërkesa para tabelës daily_occupancy."""
+    db = SessionLocal()
+    try:
+        # v2: me kolonat e njësive (kërkesat me gjysmë dite / orë)
+        if db.get(Setting, "occupancy_built_v2") is None:
+            rebuild_occupancy(db)
+            db.merge(Setting(key="occupancy_built_v2", value=str(date.today())))
+            db.commit()
+    finally:
+        db.close()
 
-    {% with messages = get_flashed_messages(with_categories=true) %}
-      {% for cat, msg in messages %}
-        <div class="flash {{ 'flash-ok' if cat == 'success' else 'flash-err' }}">{{ msg }}</div>
-      {% endfor %}
-    {% endwith %}
+# -------------------- LEXIME --------------------
+# Query-t e faqeve të leximit ndërtohen një herë si select() dhe ekzekutohen ose në
+# sesionin sinkron, ose (me ASYNC_READS) njëkohësisht në motorin aiosqlite nga view-i
+# asinkron i dashboard-it. Nën WSGI Flask e ekzekuton view-in asinkron në një event loop
+# për kërkesë: thread-i i worker-it mbetet i zënë deri në përgjigje, fitimi është që
+# query-t e dashboard-it nuk presin njëra-tjetrën (krahaso me `flask bench-reads`).
+_async_engine = None
+
+def team_members(teams):
+    return select(User.id).where(in_teams(User.team_id, teams))
+
+def balance_select(year: int, teams=None):
+    """Bilanci i përdoruesve (të gjithëve, ose të ekipeve `teams`) për vitin, në një query të vetëm."""
+    y_start, y_end = date(year, 1, 1), date(year, 12, 31)
+    vac = (
+        select(
+            Vacation.user_id,
+            func.sum(case((Vacation.status == "approved", VacationPart.days), else_=0)).label("taken"),
+            func.sum(case((Vacation.status == "pending", VacationPart.days), else_=0)).label("pending"),
+        )
+        .join(VacationPart, VacationPart.vacation_id == Vacation.id)
+        .where(VacationPart.year == year, Vacation.leave_type == ANNUAL_LEAVE, in_teams(Vacation.team_id, teams))
+        .group_by(Vacation.user_id)
+        .subquery()
+    )
+    adj = select(Adjustment.user_id, func.sum(Adjustment.amount).label("adjust")).where(
+        Adjustment.when >= y_start, Adjustment.when <= y_end, Adjustment.leave_type == ANNUAL_LEAVE
+    )
+    if teams is not None:
+        adj = adj.where(Adjustment.user_id.in_(team_members(teams)))
+    adj = adj.group_by(Adjustment.user_id).subquery()
+    allowance = func.coalesce(User.annual_allowance, 0) + func.coalesce(User.carryover, 0)
+    adjust = func.coalesce(adj.c.adjust, 0)
+    taken = func.coalesce(vac.c.taken, 0)
+    return (
+        select(
+            User.id,
+            User.name,
+            User.email,
+            allowance.label("allowance"),
+            adjust.label("adjust"),
+            taken.label("taken"),
+            func.coalesce(vac.c.pending, 0).label("pending"),
+            (allowance + adjust - taken).label("remaining"),
+        )
+        .outerjoin(vac, vac.c.user_id == User.id)
+        .outerjoin(adj, adj.c.user_id == User.id)
+        .where(in_teams(User.team_id, teams))
+        .order_by(User.id)
+    )
 
-    <form method="post">
-      <label for="email">Email</label>
-      <input id="email" name="email" type="email" autocomplete="username">
+def leave_types(db):
+    """Llojet e lejes në rendin e shfaqjes."""
+    return db.execute(
+        select(LeaveType.code, LeaveType.name, LeaveType.allowance).order_by(LeaveType.sort, LeaveType.code)
+    ).all()
+
+def leave_balances_select(year: int, user_id: int = None, teams=None):
+    """Bilanci për çdo (përdorues, lloj leje) të vitit në një query të vetëm të grupuar."""
+    y_start, y_end = date(year, 1, 1), date(year, 12, 31)
+    used = (
+        select(
+            Vacation.user_id.label("user_id"),
+            Vacation.leave_type.label("leave_type"),
+            case((Vacation.status == "approved", VacationPart.days), else_=0).label("taken"),
+            case((Vacation.status == "pending", VacationPart.days), else_=0).label("pending"),
+            literal(0).label("adjust"),
+        )
+        .join(VacationPart, VacationPart.vacation_id == Vacation.id)
+        .where(VacationPart.year == year)
+    )
+    adjusted = select(
+        Adjustment.user_id,
+        Adjustment.leave_type,
+        literal(0),
+        literal(0),
+        Adjustment.amount,
+    ).where(Adjustment.when >= y_start, Adjustment.when <= y_end)
+    if user_id is not None:
+        used = used.where(Vacation.user_id == user_id)
+        adjusted = adjusted.where(Adjustment.user_id == user_id)
+    if teams is not None:
+        used = used.where(in_teams(Vacation.team_id, teams))
+        adjusted = adjusted.where(Adjustment.user_id.in_(team_members(teams)))
+    moves = union_all(used, adjusted).subquery()
+    totals = (
+        select(
+            moves.c.user_id,
+            moves.c.leave_type,
+            func.sum(moves.c.taken).label("taken"),
+            func.sum(moves.c.pending).label("pending"),
+            func.sum(moves.c.adjust).label("adjust"),
+        )
+        .group_by(moves.c.user_id, moves.c.leave_type)
+        .subquery()
+    )
+    # leje vjetore = leja e përdoruesit + carryover; llojet e tjera = leja e llojit
+    allowance = case(
+        (LeaveType.code == ANNUAL_LEAVE, func.coalesce(User.annual_allowance, 0) + func.coalesce(User.carryover, 0)),
+        else_=LeaveType.allowance,
+    )
+    stmt = (
+        select(
+            User.id.label("user_id"),
+            LeaveType.code.label("leave_type"),
+            allowance.label("allowance"),
+            func.coalesce(totals.c.taken, 0).label("taken"),
+            func.coalesce(totals.c.pending, 0).label("pending"),
+            func.coalesce(totals.c.adjust, 0).label("adjust"),
+        )
+        .select_from(User)
+        .join(LeaveType, true())
+        .outerjoin(totals, (totals.c.user_id == User.id) & (totals.c.leave_type == LeaveType.code))
+        .order_by(User.id, LeaveType.sort, LeaveType.code)
+    )
+    if user_id is not None:
+        stmt = stmt.where(User.id == user_id)
+    return stmt.where(in_teams(User.team_id, teams))
 
-      <label for="pin">PIN</label>
-      <input id="pin" name="pin" type="password" autocomplete="current-password">
+LeaveTypeRow = namedtuple("LeaveTypeRow", "code name allowance")
+BalanceRow = namedtuple("BalanceRow", "user_id leave_type allowance taken pending adjust")
 
-      <button class="btn" type="submit">Hyr</button>
-    </form>
+def pivot_leave_balances(rows):
+    """{user_id: {lloji: rresht}}, me `remaining` (None kur lloji s'ka kufi)."""
+    out = {}
+    for r in rows:
+        remaining = None if r.allowance is None else r.allowance + r.adjust - r.taken
+        out.setdefault(r.user_id, {})[r.leave_type] = dict(
+            allowance=r.allowance, taken=r.taken, pending=r.pending, adjust=r.adjust, remaining=remaining,
+        )
+    return out
+
+def vacation_list_select(teams=None):
+    return (
+        select(
+            Vacation.id,
+            User.name.label("user_name"),
+            User.email.label("user_email"),
+            Vacation.start,
+            Vacation.end,
+            Vacation.days,
+            Vacation.status,
+            Vacation.leave_type,
+            Vacation.portion,
+            Vacation.units,
+        )
+        .join(User, Vacation.user_id == User.id)
+        .where(in_teams(Vacation.team_id, teams))
+        .order_by(Vacation.start.desc())
+    )
 
-    <div class="footer">
-      Admin krijon llogaritë dhe përcakton balancën e pushimeve.
-    </div>
-  </div>
-</body>
-</html>
-    """
+def pending_count_select(teams=None):
+    return select(func.count(Vacation.id)).where(Vacation.status == "pending", in_teams(Vacation.team_id, teams))
+
+def approval_queue_select(teams=None):
+    """Kërkesat në pritje të ekipeve, më e afërta e para (ix_vacations_team_status_start)."""
+    return (
+        select(
+            Vacation.id,
+            User.name.label("user_name"),
+            Vacation.start,
+            Vacation.end,
+            Vacation.days,
+            Vacation.leave_type,
+            Vacation.portion,
+            Vacation.units,
+        )
+        .join(User, Vacation.user_id == User.id)
+        .where(in_teams(Vacation.team_id, teams), Vacation.status == "pending")
+        .order_by(Vacation.start, Vacation.id)
     )
 
+def team_out_select(teams, first_day: date, last_day: date):
+    """Mungesat e ekipeve që prekin [first_day, last_day], në formën e rreshtave të indeksit."""
+    return (
+        select(
+            Vacation.id, Vacation.start, Vacation.end, Vacation.user_id, Vacation.status, Vacation.leave_type,
+            Vacation.portion, Vacation.units, User.name,
+        )
+        .join(User, Vacation.user_id == User.id)
+        .where(
+            in_teams(Vacation.team_id, teams),
+            Vacation.status.in_(["approved", "pending"]),
+            Vacation.start <= last_day,
+            Vacation.end >= first_day,
+        )
+    )
 
+def occupancy_select(first_day: date, last_day: date):
+    return (
+        select(
+            DailyOccupancy.day,
+            DailyOccupancy.approved,
+            DailyOccupancy.pending,
+            DailyOccupancy.approved_units,
+            DailyOccupancy.pending_units,
+        )
+        .where(DailyOccupancy.day >= first_day, DailyOccupancy.day <= last_day)
+        .order_by(DailyOccupancy.day)
+    )
 
-@app.route("/me", methods=["GET", "POST"])
-def me():
-    user = get_current_user()
-    if not user:
-        return redirect(url_for("login"))
+def vacation_export_select(year: int):
+    """Rreshtat e eksportit CSV, në rendin e kolonave të skedarit."""
+    return (
+        select(User.name, User.email, Vacation.start, Vacation.end, Vacation.days, Vacation.status,
+               Vacation.leave_type)
+        .join(User, Vacation.user_id == User.id)
+        .where(Vacation.start >= date(year, 1, 1), Vacation.start <= date(year, 12, 31))
+        .order_by(Vacation.start)
+    )
 
-    db = SessionLocal()
-    maybe_run_monthly_accrual(db)
-    user = db.get(User, user.id)  # rifresko nga DB
+ME_PAGE_SIZE = 20
+
+def me_select(user_id: int, year: int, before=None, limit: int = ME_PAGE_SIZE):
+    """Profili + bilanci i vitit + bilancet sipas llojit + një faqe kërkesash (limit+1) në një query të vetëm.
+
+    Çdo rresht përsërit kolonat e përdoruesit; pa kërkesa kthehet një rresht me NULL.
+    Bilancet sipas llojit vijnë si varg JSON në kolonën `by_type` (shih `me_leave_types`)."""
+    page = select(
+        Vacation.id, Vacation.start, Vacation.end, Vacation.days, Vacation.note, Vacation.status,
+        Vacation.leave_type, Vacation.portion, Vacation.units,
+    ).where(Vacation.user_id == user_id)
+    if before:
+        # faqosje me çelës (start, id): "më të vjetra se" kërkesa e fundit e shfaqur
+        b_start, b_id = before
+        page = page.where(
+            (Vacation.start < b_start) | ((Vacation.start == b_start) & (Vacation.id < b_id))
+        )
+    page = page.order_by(Vacation.start.desc(), Vacation.id.desc()).limit(limit + 1).subquery()
+
+    def part_sum(status):
+        return (
+            select(func.coalesce(func.sum(VacationPart.days), 0))
+            .join(Vacation, VacationPart.vacation_id == Vacation.id)
+            .where(
+                Vacation.user_id == User.id,
+                Vacation.status == status,
+                Vacation.leave_type == ANNUAL_LEAVE,
+                VacationPart.year == year,
+            )
+            .scalar_subquery()
+        )
 
-    # POST = kërkesë e re pushimi
-    if request.method == "POST":
-        start_str = request.form.get("start")
-        end_str = request.form.get("end")
-        note = request.form.get("note") or ""
+    adjust = (
+        select(func.coalesce(func.sum(Adjustment.amount), 0))
+        .where(
+            Adjustment.user_id == User.id,
+            Adjustment.leave_type == ANNUAL_LEAVE,
+            Adjustment.when >= date(year, 1, 1),
+            Adjustment.when <= date(year, 12, 31),
+        )
+        .scalar_subquery()
+    )
+    # subquery në FROM: nuk korrelohet me User-in e query-t kryesor
+    balances = leave_balances_select(year, user_id=user_id).subquery()
+    by_type = (
+        select(func.json_group_array(func.json_array(
+            func.coalesce(LeaveType.sort, 0), LeaveType.code, LeaveType.name,
+            balances.c.allowance, balances.c.taken, balances.c.pending, balances.c.adjust,
+        )))
+        .select_from(balances)
+        .join(LeaveType, LeaveType.code == balances.c.leave_type)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            User.id.label("user_id"),
+            User.name,
+            User.role,
+            User.calendar_token,
+            by_type.label("by_type"),
+            (func.coalesce(User.annual_allowance, 0) + func.coalesce(User.carryover, 0)).label("allowance"),
+            part_sum("approved").label("taken"),
+            part_sum("pending").label("pending"),
+            adjust.label("adjust"),
+            page.c.id,
+            page.c.start,
+            page.c.end,
+            page.c.days,
+            page.c.note,
+            page.c.status,
+            page.c.leave_type,
+            page.c.portion,
+            page.c.units,
+        )
+        .outerjoin(page, true())
+        .where(User.id == user_id)
+        .order_by(page.c.start.desc(), page.c.id.desc())
+    )
 
-        try:
-            start = datetime.strptime(start_str, "%Y-%m-%d").date()
-            end = datetime.strptime(end_str, "%Y-%m-%d").date()
-        except Exception:
-            flash("Datë e pavlefshme.", "danger")
-            db.close()
-            return redirect(url_for("me"))
+def me_leave_types(by_type: str):
+    """Kolona `by_type` e `me_select` → (llojet në rendin e shfaqjes, {lloji: bilanc})."""
+    types, balances = [], []
+    for sort, code, name, allowance, taken, pending, adjust in sorted(json.loads(by_type or "[]")):
+        types.append(LeaveTypeRow(code, name, allowance))
+        balances.append(BalanceRow(None, code, allowance, taken, pending, adjust))
+    return types, pivot_leave_balances(balances).get(None, {})
+
+async def _first_connect(eng):
+    async with eng.connect():
+        pass
+
+def get_async_engine():
+    """Motori aiosqlite, krijuar herën e parë; None kur varësitë opsionale mungojnë."""
+    global _async_engine
+    if _async_engine is None and create_async_engine is not None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                url = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+                # NullPool: çdo kërkesë ka event loop-in e vet, lidhjet nuk ndahen mes tyre
+                eng = create_async_engine(url, poolclass=NullPool)
+                event.listen(eng.sync_engine, "before_cursor_execute", _count_query)
+                # lidhja e parë inicializon dialektin nën një asyncio.Lock që lidhet me loop-in e saj:
+                # bëhet një herë këtu, në një loop më vete, jo njëkohësisht nga loop-et e kërkesave
+                warm = threading.Thread(target=asyncio.run, args=(_first_connect(eng),))
+                warm.start()
+                warm.join()
+                _async_engine = eng
+    return _async_engine
+
+async def _fetch_all(stmt):
+    # çdo query në lidhjen e vet: aiosqlite e ekzekuton në thread-in e lidhjes, paralelisht
+    async with get_async_engine().connect() as conn:
+        return (await conn.execute(stmt)).all()
+
+async def load_dashboard_async(year: int, teams=None):
+    """Si load_dashboard, me të pesë query-t njëkohësisht (asyncio.gather) mbi aiosqlite."""
+    balances, vacations, pending, by_type, queue = await asyncio.gather(
+        _fetch_all(balance_select(year, teams)),
+        _fetch_all(vacation_list_select(teams)),
+        _fetch_all(pending_count_select(teams)),
+        _fetch_all(leave_balances_select(year, teams=teams)),
+        _fetch_all(approval_queue_select(teams)),
+    )
+    return balances, vacations, pending[0][0], by_type, queue
+
+def load_dashboard(db, year: int, teams=None):
+    """(bilancet, kërkesat, numri në pritje, bilancet sipas llojit, radha e aprovimit) për dashboard-in.
+
+    `teams` kufizon çdo query te ekipet e dhëna (None = gjithë kompania)."""
+    return (
+        db.execute(balance_select(year, teams)).all(),
+        db.execute(vacation_list_select(teams)).all(),
+        db.execute(pending_count_select(teams)).scalar(),
+        db.execute(leave_balances_select(year, teams=teams)).all(),
+        db.execute(approval_queue_select(teams)).all(),
+    )
 
-        days = days_between_calendar(start, end)
 
-        vac = Vacation(
-            user_id=user.id,
-            start=start,
-            end=end,
-            days=days,
-            note=note,
-            status="pending",
-        )
-        db.add(vac)
+# -------------------- FUNDI I VITIT --------------------
+# Mbetja e vitit që mbyllet kalon te User.carryover (me kufi), në grupe përdoruesish.
+# Çdo grup shkruan edhe kursorin në settings në të njëjtin transaksion, kështu që një
+# ekzekutim i ndërprerë vazhdon nga përdoruesi i radhës dhe askush nuk llogaritet dy herë.
+def year_end_rollover(db, year: int, cap: float = None, batch_size: int = 5000, progress=None):
+    """Kalon mbetjen e `year` në carryover; kthen numrin e përdoruesve të përditësuar (None = bërë më parë)."""
+    done_key, cursor_key = f"rollover_{year}", f"rollover_{year}_cursor"
+    if db.get(Setting, done_key):
+        return None
+    cap = app.config["CARRYOVER_CAP"] if cap is None else cap
+
+    cursor = db.get(Setting, cursor_key)
+    if not cursor:
+        cursor = Setting(key=cursor_key, value="0")
+        db.add(cursor)
+    total = db.query(func.count(User.id)).filter(User.id > int(cursor.value)).scalar() or 1
+    updated = seen = 0
+
+    while True:
+        stmt = balance_select(year).where(User.id > int(cursor.value)).limit(batch_size)
+        batch = db.execute(stmt).all()
+        if not batch:
+            break
+
+        now = datetime.utcnow()
+        rows = []
+        for r in batch:
+            carry = max(r.remaining, 0)
+            if cap is not None:
+                carry = min(carry, cap)
+            rows.append({"id": r.id, "carryover": round(carry, 4)})
+        db.execute(update(User), rows)
+        db.execute(insert(BalanceEvent), [
+            dict(user_id=r["id"], ts=now, kind="carryover_set", amount=r["carryover"], year=year + 1, vacation_id=None)
+            for r in rows
+        ])
+        cursor.value = str(batch[-1].id)
         db.commit()
-        flash(f"Kërkesa u dërgua: {days} ditë.", "success")
-        db.close()
-        return redirect(url_for("me"))
 
-    # GET = shfaq view personale
-    year = date.today().year
-    vacations = (
-        db.query(Vacation)
-        .filter(Vacation.user_id == user.id)
-        .order_by(Vacation.start.desc())
-        .all()
+        updated += len(rows)
+        seen += len(batch)
+        if progress:
+            progress(min(seen * 100 // total, 99))
+
+    db.add(Setting(key=done_key, value=str(date.today())))
+    db.delete(cursor)
+    write_balance_checkpoints(db)
+    db.commit()
+    return updated
+
+def expire_carryover(db, year: int):
+    """Pas CARRYOVER_EXPIRY_MONTHS muajsh të `year`, carryover-i i papërdorur bie (None = bërë / ende herët)."""
+    months = app.config["CARRYOVER_EXPIRY_MONTHS"]
+    done_key = f"carryover_expiry_{year}"
+    if not months or db.get(Setting, done_key):
+        return None
+    cutoff = date(year + (months // 12), months % 12 + 1, 1)
+    if date.today() < cutoff:
+        return None
+
+    # ditët e marra para afatit harxhojnë së pari carryover-in
+    used = (
+        select(Vacation.user_id, func.sum(VacationPart.days).label("days"))
+        .join(VacationPart, VacationPart.vacation_id == Vacation.id)
+        .where(
+            Vacation.status == "approved",
+            Vacation.leave_type == ANNUAL_LEAVE,
+            VacationPart.year * 100 + VacationPart.month >= year * 100 + 1,
+            VacationPart.year * 100 + VacationPart.month < cutoff.year * 100 + cutoff.month,
+        )
+        .group_by(Vacation.user_id)
+        .subquery()
     )
+    rows = db.execute(
+        select(User.id, User.carryover, func.coalesce(used.c.days, 0))
+        .outerjoin(used, used.c.user_id == User.id)
+        .where(User.carryover > 0)
+    ).all()
+
+    now = datetime.utcnow()
+    updates = [{"id": uid, "carryover": min(carry, days)} for uid, carry, days in rows if days < carry]
+    if updates:
+        db.execute(update(User), updates)
+        db.execute(insert(BalanceEvent), [
+            dict(user_id=u["id"], ts=now, kind="carryover_set", amount=u["carryover"], year=year, vacation_id=None)
+            for u in updates
+        ])
+    db.add(Setting(key=done_key, value=str(date.today())))
+    db.commit()
+    return len(updates)
 
-    allowance = user.allowance_total()
-    taken = user.taken_days(year)
-    pending = user.pending_days(year)
-    adjust = user.adjustments_sum(year)
-    remaining = user.remaining(year)
 
-    db.close()
+# -------------------- KUSH MUNGON --------------------
+# Indeks në memorie i intervaleve (approved + pending), i renditur sipas fillimit, me
+# maksimumin prefiks të fundeve: një pyetje është dy bisect + skanim i kandidatëve.
+# Shkrimet e këtij procesi e përditësojnë pas commit-it; të tjerët vërehen nga versioni
+# "report" në settings, i kontrolluar jo më shpesh se një herë në sekondë.
+OUT_INDEX_CHECK_SECONDS = 1.0
 
-    return render_template_string(
-        """
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Vacation Planner - Profili im</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <style>
-    * { box-sizing: border-box; }
-    :root {
-      --bg: #f3f4f6;
-      --card: #ffffff;
-      --text-main: #111827;
-      --text-muted: #6b7280;
-      --header-bg: #111827;
-      --header-text: #ffffff;
-    }
-    body.dark {
-      --bg: #020617;
-      --card: #020617;
-      --text-main: #e5e7eb;
-      --text-muted: #9ca3af;
-      --header-bg: #020617;
-      --header-text: #e5e7eb;
-    }
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: var(--bg);
-      color: var(--text-main);
-    }
-    header {
-      background: var(--header-bg);
-      color: var(--header-text);
-      padding: 12px 24px;
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-    }
-    header .title {
-      font-weight: 600;
-      letter-spacing: .03em;
-    }
-    header a {
-      color: #e5e7eb;
-      text-decoration: none;
-      margin-left: 12px;
-      font-size: 14px;
-    }
-    .container {
-      max-width: 1000px;
-      margin: 20px auto;
-      padding: 0 16px 32px;
-    }
-    .flash {
-      padding: 10px 12px;
-      border-radius: 8px;
-      margin-bottom: 12px;
-      font-size: 14px;
-    }
-    .flash-ok { background: #dcfce7; color: #166534; }
-    .flash-err { background: #fee2e2; color: #b91c1c; }
-    .grid {
-      display: grid;
-      grid-template-columns: repeat(4, minmax(0,1fr));
-      gap: 12px;
-      margin-bottom: 18px;
-    }
-    .stat {
-      background: #fff;
-      border-radius: 14px;
-      padding: 10px 14px;
-      box-shadow: 0 4px 12px rgba(15, 23, 42, .06);
-    }
-    .stat-label { font-size: 12px; color: #6b7280; }
-    .stat-value { font-size: 20px; font-weight: 600; margin-top: 4px; }
-    .card {
-      background: #fff;
-      border-radius: 14px;
-      padding: 18px 18px 14px;
-      box-shadow: 0 4px 14px rgba(15, 23, 42, .08);
-      margin-bottom: 18px;
-    }
-    h2, h3 {
-      margin: 0 0 12px;
-      font-weight: 600;
-      color: #111827;
-    }
-    form label {
-      font-size: 13px;
-      color: #4b5563;
-    }
-    form input, form textarea, form select {
-      width: 100%;
-      padding: 8px 10px;
-      border-radius: 10px;
-      border: 1px solid #e5e7eb;
-      font-size: 14px;
-      margin-top: 4px;
-    }
-    form textarea { resize: vertical; min-height: 60px; }
-    .form-row {
-      display: grid;
-      grid-template-columns: repeat(2, minmax(0,1fr));
-      gap: 12px;
-    }
-    .btn {
-      display: inline-block;
-      padding: 8px 16px;
-      border-radius: 999px;
-      border: none;
-      background: #111827;
-      color: #fff;
-      font-size: 14px;
-      cursor: pointer;
-      margin-top: 10px;
-    }
-    .btn-secondary {
-      background: #4b5563;
-    }
-    table {
-      width: 100%;
-      border-collapse: collapse;
-      font-size: 13px;
-    }
-    th, td {
-      padding: 8px 10px;
-      border-bottom: 1px solid #e5e7eb;
-      text-align: left;
-    }
-    th {
-      background: #f9fafb;
-      font-weight: 600;
-      color: #374151;
-    }
-    .status {
-      display: inline-block;
-      padding: 2px 8px;
-      border-radius: 999px;
-      font-size: 11px;
-      font-weight: 500;
+class IntervalIndex:
+    """Intervalet (id, fillimi, fundi, user_id, statusi, lloji, pjesa, njësitë) me data si ordinal-e.
+
+    Lexuesit nuk marrin kyç: ndryshimet ndërtohen mbi kopje të listave dhe publikohen me një
+    caktim të vetëm të `_data` (copy-on-write), kështu që një pyetje sheh gjithmonë një gjendje të plotë."""
+
+    def __init__(self, items, names, version):
+        items = sorted(items, key=lambda it: it[1])
+        ends = [it[2] for it in items]
+        # (id -> interval, fillimet, fundet, id-të, maksimumi prefiks i fundeve)
+        self._data = (
+            {it[0]: it for it in items}, [it[1] for it in items], ends, [it[0] for it in items],
+            list(accumulate(ends, max)),
+        )
+        self.names = names
+        self.version = version
+        self.checked = time.monotonic()
+
+    def overlapping(self, first: int, last: int):
+        items, starts, ends, ids, max_end = self._data
+        hi = bisect_right(starts, last)
+        # para `lo` asnjë interval nuk arrin deri te `first`
+        lo = bisect_left(max_end, first, 0, hi)
+        return [items[ids[i]] for i in range(lo, hi) if ends[i] >= first]
+
+    def apply(self, ops):
+        """Zbaton [(id, interval ose None për heqje)] mbi kopje dhe i publikon njëherësh.
+
+        Shkrimtarët duhet të serializohen nga jashtë (_out_lock)."""
+        items, starts, ends, ids, max_end = self._data
+        items, starts, ends, ids = dict(items), starts[:], ends[:], ids[:]
+        lowest = len(starts)  # pozicionet para kësaj s'kanë lëvizur: maksimumi i tyre mbetet i vlefshëm
+        for vid, item in ops:
+            old = items.pop(vid, None)
+            if old is not None:
+                i = bisect_left(starts, old[1])
+                while ids[i] != vid:
+                    i += 1
+                del starts[i], ends[i], ids[i]
+                lowest = min(lowest, i)
+            if item is not None:
+                i = bisect_right(starts, item[1])
+                starts.insert(i, item[1])
+                ends.insert(i, item[2])
+                ids.insert(i, vid)
+                items[vid] = item
+                lowest = min(lowest, i)
+        lowest = min(lowest, len(starts))
+        max_end = max_end[:lowest] + list(
+            accumulate(ends[lowest:], max, initial=max_end[lowest - 1] if lowest else 0)
+        )[1:]
+        self._data = (items, starts, ends, ids, max_end)
+
+    def add(self, item):
+        self.apply([(item[0], item)])
+
+    def discard(self, vid: int):
+        self.apply([(vid, None)])
+
+_out_lock = threading.Lock()
+
+def _out_state(tenant):
+    return tenant_cache("out_index", lambda: {"idx": None}, tenant)
+
+def load_out_index(db, version: str) -> IntervalIndex:
+    rows = db.execute(
+        select(
+            Vacation.id, Vacation.start, Vacation.end, Vacation.user_id, Vacation.status, Vacation.leave_type,
+            Vacation.portion, Vacation.units,
+        )
+        .where(Vacation.status.in_(["approved", "pending"]))
+    ).all()
+    items = [(vid, s.toordinal(), e.toordinal(), *rest) for vid, s, e, *rest in rows]
+    names = dict(db.execute(select(User.id, User.name)).all())
+    return IntervalIndex(items, names, version)
+
+def out_index() -> IntervalIndex:
+    """Indeksi i këtij procesi (për tenant); ngarkohet herën e parë dhe rindërtohet kur versioni ndryshon."""
+    state = _out_state(current_tenant())
+    idx = state["idx"]
+    now = time.monotonic()
+    if idx is not None and now - idx.checked < OUT_INDEX_CHECK_SECONDS:
+        return idx
+    with _out_lock:
+        idx = state["idx"]
+        if idx is not None and now - idx.checked < OUT_INDEX_CHECK_SECONDS:
+            return idx
+        db = SessionLocal()
+        try:
+            version = read_version(db, "report")
+            if idx is None or idx.version != version:
+                idx = state["idx"] = load_out_index(db, version)
+            idx.checked = now
+        finally:
+            db.close()
+    return idx
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_out_updates(db):
+    pending = db.info.pop("out_index", None)
+    state = _out_state(db.tenant)
+    if not pending or state["idx"] is None:
+        return
+    with _out_lock:
+        idx = state["idx"]
+        if idx is None:
+            return
+        unknown_user = any(item and item[3] not in idx.names for _, item in pending["ops"])
+        if idx.version != pending["from"] or unknown_user:
+            # një proces tjetër ka shkruar ndërkohë: rindërtim në pyetjen e radhës
+            state["idx"] = None
+            return
+        idx.apply(pending["ops"])
+        idx.version = pending["to"]
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_out_updates(db):
+    db.info.pop("out_index", None)
+
+# -------------------- LIVE (SSE) --------------------
+# Dashboard-i dhe kalendari i hapur marrin ndryshimet si ngjarje të vogla në /admin/events
+# dhe i vendosin vetë në faqe, në vend që adminët ta rifreskojnë faqen e plotë.
+# Çdo proces mban ngjarjet e fundit sipas versionit "report" që i krijoi. Klienti kërkon
+# gjithçka pas versionit të vet; kur mungon ndonjë version (shkrim nga një worker tjetër,
+# ose klient shumë prapa) merr "stale" dhe rifreskon faqen një herë.
+LIVE_BUFFER = 1024  # ngjarje për tenant
+
+class LiveBus:
+    """Ngjarjet e fundit për tenant, të indeksuara me versionin "report"."""
+
+    def __init__(self):
+        self._events = {}
+        self._cond = threading.Condition()
+
+    def publish(self, tenant, events):
+        with self._cond:
+            buf = self._events.setdefault(tenant, OrderedDict())
+            for ev in events:
+                buf[int(ev["version"])] = ev
+            while len(buf) > LIVE_BUFFER:
+                buf.popitem(last=False)
+            self._cond.notify_all()
+
+    def since(self, tenant, version: int, current: int):
+        """Ngjarjet me version në (version, current]; None nëse ndonjëra mungon këtu."""
+        if current - version > LIVE_BUFFER:
+            return None
+        with self._cond:
+            buf = self._events.get(tenant, {})
+            try:
+                return [buf[v] for v in range(version + 1, current + 1)]
+            except KeyError:
+                return None
+
+    def wait(self, timeout: float):
+        with self._cond:
+            self._cond.wait(timeout)
+
+live_bus = LiveBus()
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_live(db):
+    events = db.info.pop("live", None)
+    if events:
+        live_bus.publish(db.tenant, events)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_live(db):
+    db.info.pop("live", None)
+
+def sse(event_name: str, data, event_id: str = None) -> str:
+    """Një mesazh text/event-stream."""
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event_name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+# -------------------- NJOFTIME (OUTBOX) --------------------
+# Kërkesat nuk dërgojnë asgjë vetë: notify() shton rreshta në tabelën outbox brenda të njëjtit
+# transaksion me ndryshimin (si auditi), kështu që një rollback nuk lë njoftime fantazmë dhe
+# një commit nuk humb asnjë. Dispatcher-i në sfond i dërgon në grupe te "sink"-et, me
+# ripërpjekje dhe vonesë që dyfishohet; kërkesa HTTP nuk pret kurrë SMTP-në apo webhook-un.
+OUTBOX_SINKS = {}  # sink -> funksioni(mesazhet) -> {id: gabimi} për ato që dështuan
+_outbox_wake = threading.Event()
+_outbox_dirty = set()  # tenant-ët me mesazhe të reja që nga kontrolli i fundit
+_outbox_thread_pid = None
+_outbox_start_lock = threading.Lock()
+
+def outbox_sink(name: str):
+    def register(fn):
+        OUTBOX_SINKS[name] = fn
+        return fn
+    return register
+
+def next_digest_at(now: datetime) -> datetime:
+    at = now.replace(hour=app.config["DIGEST_HOUR"], minute=0, second=0, microsecond=0)
+    return at if at > now else at + timedelta(days=1)
+
+def notify(db, kind: str, subject: str, body: str, recipients, data: dict):
+    """Shton njoftimin në outbox: një email (ose rresht përmbledhjeje) për marrës dhe një webhook."""
+    now = datetime.utcnow()
+    if not db.in_transaction():
+        db.begin()  # që një rollback() pa asnjë query më parë ta hedhë gjithsesi buffer-in
+    rows = db.info.setdefault("outbox", [])
+
+    def add(sink, recipient, payload, when=now):
+        rows.append({
+            "created_at": now, "kind": kind, "sink": sink, "recipient": recipient,
+            "payload": json.dumps(payload, separators=(",", ":"), default=str),
+            "status": "pending", "attempts": 0, "next_attempt_at": when,
+        })
+
+    if app.config["NOTIFY_EMAIL"]:
+        digest = kind in app.config["NOTIFY_DIGEST_KINDS"]
+        for email in sorted(set(recipients)):
+            if digest:
+                add("digest", email, {"subject": subject, "body": body}, next_digest_at(now))
+            else:
+                add("email", email, {"subject": subject, "body": body})
+    if app.config["WEBHOOK_URL"]:
+        add("webhook", app.config["WEBHOOK_URL"], {"event": kind, "tenant": db.tenant, "ts": now.isoformat(timespec="seconds"), "data": data})
+
+def notify_vacation(db, v, kind: str):
+    """Njoftimi për një kërkesë të re (te adminët dhe menaxheri i ekipit) ose për vendimin (te punonjësi)."""
+    owner = db.get(User, v.user_id)
+    type_name = db.query(LeaveType.name).filter(LeaveType.code == v.leave_type).scalar() or v.leave_type
+    period = f"{v.start} → {v.end}, {format_days(v.days)} ditë {portion_label(v.portion, v.units)}".rstrip()
+    data = {
+        "id": v.id, "user_id": v.user_id, "user": owner.name, "email": owner.email, "team_id": v.team_id,
+        "start": v.start, "end": v.end, "days": v.days, "portion": v.portion,
+        "leave_type": v.leave_type, "status": v.status,
     }
-    .st-approved { background: #dcfce7; color: #166534; }
-    .st-pending { background: #fef3c7; color: #92400e; }
-    .st-denied  { background: #fee2e2; color: #b91c1c; }
-  </style>
-</head>
-<body class = "{{ theme }}">
-<header>
-  <div class="title">Vacation Planner</div>
-  <div>
-    <span style="font-size:14px; margin-right:8px;">{{ user.name }}</span>
-     <a href="{{ url_for('toggle_theme') }}">Tema: {{ 'Dark' if theme == 'light' else 'Light' }}</a>
-     {% if user.role == 'admin' %}
-     <a href="{{ url_for('admin_dashboard') }}">Admin</a>
-     {% endif %}
-    <a href="{{ url_for('logout') }}">Dil</a>
+    if kind == "vacation_requested":
+        manager = select(Team.manager_id).where(Team.id == v.team_id).scalar_subquery()
+        recipients = db.execute(
+            select(User.email).where((User.role == "admin") | (User.id == manager), User.id != v.user_id)
+        ).scalars().all()
+        subject = f"Kërkesë e re pushimi: {owner.name}"
+        body = (
+            f"{owner.name} kërkoi {type_name.lower()} ({period}).\n\n"
+            f"Aprovo ose refuzo te: {url_for('admin_dashboard', _external=True)}"
+        )
+    else:
+        decision = "u aprovua" if kind == "vacation_approved" else "u refuzua"
+        recipients = [owner.email]
+        subject = f"Kërkesa jote për pushim {decision}"
+        body = f"Përshëndetje {owner.name},\n\nkërkesa jote ({type_name}, {period}) {decision}."
+    notify(db, kind, subject, body, recipients, data)
+
+# Kur bëhet gati mesazhi i radhës i një baze shënohet si mtime e skedarit <baza>.outbox:
+# kontrolli periodik i çdo procesi lexon vetëm këto skedarë dhe hap vetëm bazat me punë.
+def _outbox_marker(tenant):
+    path = tenant_db_path(tenant) if tenant else engine.url.database
+    return f"{path}.outbox" if path and path != ":memory:" else None
+
+def mark_outbox_due(tenant, when: datetime = None, earlier_only: bool = False):
+    """Shënon kohën (UTC) të mesazhit të radhës; None = outbox-i është bosh."""
+    path = _outbox_marker(tenant)
+    if path is None:
+        return
+    if when is None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    ts = (when - datetime(1970, 1, 1)).total_seconds()
+    if earlier_only and os.path.exists(path) and os.path.getmtime(path) <= ts:
+        return
+    with open(path, "a"):
+        pass
+    os.utime(path, (ts, ts))
+
+def due_outbox_tenants() -> list:
+    """Bazat me mesazhe të gatshme sipas shënimeve (baza pa skedar kontrollohet gjithmonë)."""
+    now = time.time()
+    path = _outbox_marker(None)
+    tenants = [None] if path is None or (os.path.exists(path) and os.path.getmtime(path) <= now) else []
+    folder = app.config["TENANTS_DIR"]
+    if folder and os.path.isdir(folder):
+        for entry in os.scandir(folder):
+            if entry.name.endswith(".db.outbox") and entry.stat().st_mtime <= now:
+                tenants.append(entry.name[: -len(".db.outbox")])
+    return tenants
+
+@on_database_open
+def ensure_outbox_marker():
+    """Shënimi për mesazhet që ishin në pritje para se të ekzistonte (ose pas një kopjimi të bazës)."""
+    db = SessionLocal()
+    try:
+        due = db.query(func.min(OutboxMessage.next_attempt_at)).filter(OutboxMessage.status == "pending").scalar()
+        if due is not None:
+            mark_outbox_due(db.tenant, due, earlier_only=True)
+    finally:
+        db.close()
+
+@event.listens_for(SessionLocal, "before_commit")
+def _flush_outbox(db):
+    rows = db.info.pop("outbox", None)
+    if rows:
+        db.execute(insert(OutboxMessage), rows)
+        db.info["outbox_due"] = min(r["next_attempt_at"] for r in rows)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_outbox(db):
+    due = db.info.pop("outbox_due", None)
+    if due is not None:
+        mark_outbox_due(db.tenant, due, earlier_only=True)
+        _outbox_dirty.add(db.tenant)
+        _outbox_wake.set()
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _drop_outbox(db, previous_transaction):
+    # "soft": thirret edhe kur rollback() s'gjen transaksion të hapur në bazë
+    db.info.pop("outbox", None)
+    db.info.pop("outbox_due", None)
+
+def _smtp():
+    smtp = smtplib.SMTP(app.config["SMTP_HOST"], app.config["SMTP_PORT"], timeout=app.config["OUTBOX_TIMEOUT"])
+    if app.config["SMTP_STARTTLS"]:
+        smtp.starttls()
+    if app.config["SMTP_USER"]:
+        smtp.login(app.config["SMTP_USER"], app.config["SMTP_PASSWORD"])
+    return smtp
+
+def _email(to: str, subject: str, body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = app.config["MAIL_FROM"]
+    msg["To"] = to
+    msg["Subject"] = subject
+    msg.set_content(body)
+    return msg
+
+@outbox_sink("email")
+def _send_emails(messages):
+    errors = {}
+    with _smtp() as smtp:  # një lidhje për gjithë grupin
+        for m in messages:
+            payload = json.loads(m.payload)
+            try:
+                smtp.send_message(_email(m.recipient, payload["subject"], payload["body"]))
+            except smtplib.SMTPException as exc:
+                errors[m.id] = str(exc)
+    return errors
+
+@outbox_sink("digest")
+def _send_digests(messages):
+    by_recipient = {}
+    for m in messages:
+        by_recipient.setdefault(m.recipient, []).append(m)
+    errors = {}
+    with _smtp() as smtp:
+        for recipient, items in by_recipient.items():
+            parts = [json.loads(m.payload) for m in items]
+            body = "\n\n".join(f"• {p['subject']}\n{p['body']}" for p in parts)
+            try:
+                smtp.send_message(_email(recipient, f"Përmbledhja ditore: {len(parts)} njoftime", body))
+            except smtplib.SMTPException as exc:
+                errors.update((m.id, str(exc)) for m in items)
+    return errors
+
+@outbox_sink("webhook")
+def _post_webhooks(messages):
+    errors = {}
+    for m in messages:
+        body = m.payload.encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Outbox-Id": str(m.id)}
+        if app.config["WEBHOOK_SECRET"]:
+            sig = hmac.new(app.config["WEBHOOK_SECRET"].encode("utf-8"), body, "sha256").hexdigest()
+            headers["X-Signature"] = f"sha256={sig}"
+        try:
+            request_ = urllib.request.Request(m.recipient, data=body, headers=headers)
+            with urllib.request.urlopen(request_, timeout=app.config["OUTBOX_TIMEOUT"]):
+                pass
+        except (urllib.error.URLError, OSError) as exc:
+            errors[m.id] = str(exc)
+    return errors
+
+def dispatch_outbox(db, limit: int = None) -> dict:
+    """Dërgon një grup mesazhesh të gatshme; kthen {"sent": n, "retry": n, "failed": n}."""
+    limit = app.config["OUTBOX_BATCH"] if limit is None else limit
+    now = datetime.utcnow()
+    due = (
+        OutboxMessage.status == "pending",
+        OutboxMessage.next_attempt_at <= now,
+    )
+    ids = db.execute(select(OutboxMessage.id).where(*due).order_by(OutboxMessage.id).limit(limit)).scalars().all()
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    if not ids:
+        return counts
+
+    # marrja në dorë: me disa workers, vetëm njëri e kalon kushtin `due` për secilin rresht.
+    # Afati mbulon rastin më të keq (çdo mesazh pret deri në timeout); pas tij, një grup i
+    # pambaruar (procesi ra) rimerret nga një tjetër
+    claim = secrets.token_hex(8)
+    lease = timedelta(seconds=(len(ids) + 1) * app.config["OUTBOX_TIMEOUT"] + 60)
+    db.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ids), *due)
+        .values(claim=claim, next_attempt_at=now + lease)
+    )
+    db.commit()
+    messages = db.query(OutboxMessage).filter(OutboxMessage.id.in_(ids), OutboxMessage.claim == claim).all()
+
+    by_sink = {}
+    for m in messages:
+        by_sink.setdefault(m.sink, []).append(m)
+    for sink, batch in by_sink.items():
+        fn = OUTBOX_SINKS.get(sink)
+        try:
+            errors = fn(batch) if fn else {m.id: f"Sink i panjohur: {sink}" for m in batch}
+        except Exception as exc:  # p.sh. serveri SMTP s'përgjigjet: i gjithë grupi riprovohet
+            errors = {m.id: str(exc) or type(exc).__name__ for m in batch}
+
+        done = datetime.utcnow()
+        for m in batch:
+            m.claim = None
+            if m.id not in errors:
+                m.status, m.sent_at, m.last_error = "sent", done, None
+                counts["sent"] += 1
+                continue
+            m.attempts += 1
+            m.last_error = errors[m.id][:500]
+            if m.attempts >= app.config["OUTBOX_MAX_ATTEMPTS"]:
+                m.status = "failed"
+                counts["failed"] += 1
+            else:
+                delay = min(app.config["OUTBOX_BACKOFF"] * 2 ** (m.attempts - 1), 6 * 3600)
+                m.next_attempt_at = done + timedelta(seconds=delay)
+                counts["retry"] += 1
+        db.commit()
+    return counts
+
+def purge_outbox(db):
+    """Fshin mesazhet e dërguara më të vjetra se OUTBOX_RETENTION_DAYS; një herë në ditë për bazë."""
+    state = tenant_cache("outbox")
+    today = date.today()
+    if state.get("purged") == today:
+        return
+    cutoff = datetime.utcnow() - timedelta(days=app.config["OUTBOX_RETENTION_DAYS"])
+    db.query(OutboxMessage).filter(
+        OutboxMessage.status == "sent", OutboxMessage.sent_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    state["purged"] = today
+
+def drain_outbox(tenants) -> dict:
+    """Zbraz outbox-in e secilit tenant deri te mesazhet që s'janë ende gati."""
+    total = {"sent": 0, "retry": 0, "failed": 0}
+    for tenant in tenants:
+        token = _current_tenant.set(tenant)
+        db = SessionLocal()
+        try:
+            while True:
+                counts = dispatch_outbox(db)
+                for k, n in counts.items():
+                    total[k] += n
+                if sum(counts.values()) < app.config["OUTBOX_BATCH"]:
+                    break
+            purge_outbox(db)
+            pending = db.query(func.min(OutboxMessage.next_attempt_at)).filter(OutboxMessage.status == "pending")
+            mark_outbox_due(tenant, pending.scalar())
+        except Exception:
+            db.rollback()
+            app.logger.exception("Outbox-i dështoi (%s)", tenant or "default")
+        finally:
+            db.close()
+            _current_tenant.reset(token)
+    return total
+
+def _outbox_dispatcher():
+    interval = app.config["OUTBOX_INTERVAL"]
+    next_scan = 0.0
+    while True:
+        # një commit me njoftime e zgjon menjëherë; ripërpjekjet dhe përmbledhjet presin kontrollin
+        # periodik, i cili bëhet në kohë edhe kur zgjimet janë të shpeshta
+        _outbox_wake.wait(max(next_scan - time.monotonic(), 0))
+        _outbox_wake.clear()
+        tenants = set(_outbox_dirty)
+        _outbox_dirty.difference_update(tenants)
+        if time.monotonic() >= next_scan:
+            tenants.update(due_outbox_tenants())
+            next_scan = time.monotonic() + interval
+        drain_outbox(sorted(tenants, key=lambda t: t or ""))
+
+@app.before_request
+def _start_outbox_dispatcher():
+    # nisja me kërkesën e parë të çdo procesi (jo në import): komandat CLI nuk e nisin, dhe
+    # me gunicorn --preload çdo worker ka thread-in e vet
+    global _outbox_thread_pid
+    if app.config["OUTBOX_INTERVAL"] <= 0 or _outbox_thread_pid == os.getpid():
+        return
+    with _outbox_start_lock:
+        if _outbox_thread_pid != os.getpid():
+            _outbox_thread_pid = os.getpid()
+            threading.Thread(target=_outbox_dispatcher, name="outbox", daemon=True).start()
+
+
+# -------------------- RAPORTE --------------------
+def compute_year_aggregates(db, year: int, teams=None):
+    """Ditët e punës të një viti nga copat mujore: për muaj, për përdorues dhe për status.
+
+    Totalet janë për të gjitha llojet; `types` mban të njëjtat ndarje për çdo lloj leje.
+    Me `teams` numërohen vetëm kërkesat e atyre ekipeve."""
+    rows = (
+        db.query(
+            VacationPart.month,
+            Vacation.status,
+            Vacation.leave_type,
+            User.id,
+            User.name,
+            func.sum(VacationPart.days),
+        )
+        .join(Vacation, VacationPart.vacation_id == Vacation.id)
+        .join(User, Vacation.user_id == User.id)
+        .filter(VacationPart.year == year, in_teams(Vacation.team_id, teams))
+        .group_by(VacationPart.month, Vacation.status, Vacation.leave_type, User.id, User.name)
+        .all()
+    )
+
+    def empty():
+        return {"months": [0] * 12, "users": {}, "statuses": {"approved": 0, "pending": 0, "denied": 0}}
+
+    total = empty()
+    types = {}
+    for month, status, leave_type, uid, name, days in rows:
+        for agg in (total, types.setdefault(leave_type or ANNUAL_LEAVE, empty())):
+            agg["statuses"][status] = agg["statuses"].get(status, 0) + days
+            if status != "approved":
+                continue
+            agg["months"][month - 1] += days
+            row = agg["users"].setdefault(str(uid), {"name": name, "days": 0})
+            row["days"] += days
+
+    return {"year": year, **total, "types": types}
+
+def year_aggregates(db, year: int):
+    """Agregatet e vitit; vitet e mbyllura lexohen nga cache-i, viti aktual llogaritet live."""
+    if year >= date.today().year:
+        return compute_year_aggregates(db, year)
+
+    cached = db.get(ReportAggregate, year)
+    if cached:
+        data = json.loads(cached.data)
+        if "types" in data:  # agregatet para llojeve të lejes rillogariten
+            return data
+
+    data = compute_year_aggregates(db, year)
+    if not db.info.get("readonly"):
+        db.merge(ReportAggregate(year=year, data=json.dumps(data)))
+        db.commit()
+        return data
+
+    # nga replika nuk mund të shkruajmë, dhe kopja mund të jetë e vjetër: cache-i ruhet në
+    # bazën primare vetëm kur versioni i raporteve s'ka lëvizur që nga kopja
+    version = read_version(db, "report")
+    store = SessionLocal()
+    try:
+        store.merge(ReportAggregate(year=year, data=json.dumps(data)))
+        store.flush()  # transaksioni i shkrimit është hapur: versioni më poshtë është i fundit
+        if read_version(store, "report") == version:
+            store.commit()
+        else:
+            store.rollback()
+    finally:
+        store.close()
+    return data
+
+def export_vacations_csv(db, year: int) -> bytes:
+    """CSV (;) me të gjitha kërkesat që fillojnë në vitin e dhënë."""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(["User", "Email", "Start", "End", "Days", "Status", "Type"])
+    # rreshtat Core shkojnë drejt e te writer-i, pa objekte ORM ndërmjet
+    writer.writerows(
+        (name, email, start, end, format_days(days), status, leave_type)
+        for name, email, start, end, days, status, leave_type in db.execute(vacation_export_select(year))
+    )
+    return output.getvalue().encode("utf-8-sig")
+
+def trend_csv(db, n_years: int, progress=None) -> bytes:
+    """CSV me trendin shumëvjeçar: ditë për muaj dhe për person, një rresht për vit."""
+    this_year = date.today().year
+    years = list(range(this_year - n_years + 1, this_year + 1))
+
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(["Year"] + [f"M{m}" for m in range(1, 13)] + ["Approved", "Pending", "Denied"])
+
+    per_user = {}
+    for i, year in enumerate(years):
+        agg = year_aggregates(db, year)
+        st = agg["statuses"]
+        writer.writerow([year] + agg["months"] + [st["approved"], st["pending"], st["denied"]])
+        for uid, u in agg["users"].items():
+            per_user.setdefault(uid, {"name": u["name"], "days": [0] * len(years)})["days"][i] = u["days"]
+        if progress:
+            progress((i + 1) * 100 // len(years))
+
+    writer.writerow([])
+    writer.writerow(["User"] + years)
+    for u in sorted(per_user.values(), key=lambda r: r["name"]):
+        writer.writerow([u["name"]] + u["days"])
+    return output.getvalue().encode("utf-8-sig")
+
+REPORT_TOP_USERS = 25
+
+# për tenant: {"version", "items": (viti, top, columnar, lloji, ekipet) -> (json bytes, etag)}.
+# Çelësi vjen nga parametrat e kërkesës: cache-i zbrazet kur ndryshon versioni "report" dhe
+# mban më së shumti REPORT_PAYLOAD_CACHE_SIZE hyrje (LRU).
+REPORT_PAYLOAD_CACHE_SIZE = 256
+_report_payload_lock = threading.Lock()
+
+def report_payload(db, year: int, top: int = REPORT_TOP_USERS, columnar: bool = True, leave_type: str = None,
+                   teams=None):
+    """JSON i gatshëm për grafikët e raportit, i ruajtur në proces deri në ndryshimin e radhës.
+
+    Agregatet e kompanisë ruhen në report_aggregates; ato të ekipeve llogariten vetëm për ekipet."""
+    version = read_version(db, "report")
+    key = (year, top, columnar, leave_type, None if teams is None else tuple(teams))
+    payloads = tenant_cache("report_payloads", lambda: {"version": None, "items": OrderedDict()})
+    with _report_payload_lock:
+        if payloads["version"] != version:
+            payloads["version"] = version
+            payloads["items"] = OrderedDict()
+        cached = payloads["items"].get(key)
+        if cached:
+            payloads["items"].move_to_end(key)
+            return cached
+
+    agg = year_aggregates(db, year) if teams is None else compute_year_aggregates(db, year, teams)
+    if leave_type:
+        agg = agg["types"].get(leave_type) or {
+            "months": [0] * 12, "users": {}, "statuses": {"approved": 0, "pending": 0, "denied": 0},
+        }
+    users = sorted(agg["users"].values(), key=lambda u: u["days"], reverse=True)
+    if top and len(users) > top:
+        others = sum(u["days"] for u in users[top:])
+        users = users[:top] + [{"name": f"Të tjerë ({len(users) - top})", "days": others}]
+
+    if columnar:
+        data = {
+            "year": year,
+            "months": {"labels": list(range(1, 13)), "data": agg["months"]},
+            "users": {"labels": [u["name"] for u in users], "data": [u["days"] for u in users]},
+            "statuses": agg["statuses"],
+        }
+    else:
+        data = {
+            "year": year,
+            "months": [{"month": m, "days": d} for m, d in enumerate(agg["months"], start=1)],
+            "users": users,
+            "statuses": agg["statuses"],
+        }
+
+    body = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    etag = hashlib.sha1(body).hexdigest()[:16]
+    with _report_payload_lock:
+        # një version më i ri mund të ketë zbrazur cache-in ndërkohë: mos e rifut këtë
+        if payloads["version"] == version:
+            items = payloads["items"]
+            items[key] = (body, etag)
+            while len(items) > REPORT_PAYLOAD_CACHE_SIZE:
+                items.popitem(last=False)
+    return body, etag
+
+def invalidate_report_cache(db, first_year: int, last_year: int = None):
+    """Fshin agregatet e ruajtura për vitet që preku një ndryshim."""
+    last_year = last_year or first_year
+    db.query(ReportAggregate).filter(
+        ReportAggregate.year >= first_year, ReportAggregate.year <= last_year
+    ).delete(synchronize_session=False)
+
+# -------------------- KALENDAR (iCalendar) --------------------
+def ical_escape(value: str) -> str:
+    return (
+        (value or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+def ical_fold(line: str) -> str:
+    """Ndan rreshtat më të gjatë se 75 oktete (RFC 5545)."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line
+    parts, chunk = [], b""
+    for ch in line:
+        b = ch.encode("utf-8")
+        if len(chunk) + len(b) > (75 if not parts else 74):
+            parts.append(chunk.decode("utf-8"))
+            chunk = b""
+        chunk += b
+    parts.append(chunk.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+def render_vevent(vid, name, start, end, note, updated_at) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:vacation-{vid}@vacation-planner",
+        f"DTSTAMP:{updated_at:%Y%m%dT%H%M%SZ}",
+        f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{end + timedelta(days=1):%Y%m%d}",
+        f"SUMMARY:{ical_escape(name)} – pushim",
+    ]
+    if note:
+        lines.append(f"DESCRIPTION:{ical_escape(note)}")
+    lines.append("END:VEVENT")
+    return "".join(ical_fold(l) + "\r\n" for l in lines)
+
+def write_calendar_event(db, vid, user_id, name, start, end, note, status):
+    """Eventi iCalendar i një pushimi, në transaksionin e shkrimit: upsert kur aprovohet, përndryshe fshirje."""
+    if status != "approved":
+        db.query(CalendarEvent).filter_by(vacation_id=vid).delete()
+        return
+    stamp = datetime.utcnow().replace(microsecond=0)
+    db.merge(CalendarEvent(
+        vacation_id=vid,
+        user_id=user_id,
+        updated_at=stamp,
+        ics=render_vevent(vid, name, start, end, note, stamp),
+    ))
+
+def sync_calendar_events(db, user_id: int = None) -> int:
+    """Rindërton eventet e të gjitha pushimeve të aprovuara (ose të një përdoruesi); i idempotentë.
+
+    Shkrimet e zakonshme e mbajnë tabelën të saktë vetë (shih vacation_changed); kjo përdoret
+    për migrimin dhe kur ndryshon emri i përdoruesit (SUMMARY)."""
+    events = delete(CalendarEvent)
+    approved = (
+        select(Vacation.id, Vacation.user_id, Vacation.start, Vacation.end, Vacation.note, User.name)
+        .join(User, Vacation.user_id == User.id)
+        .where(Vacation.status == "approved")
+    )
+    if user_id is not None:
+        events = events.where(CalendarEvent.user_id == user_id)
+        approved = approved.where(Vacation.user_id == user_id)
+    stamp = datetime.utcnow().replace(microsecond=0)
+    rows = [
+        dict(vacation_id=vid, user_id=uid, updated_at=stamp, ics=render_vevent(vid, name, start, end, note, stamp))
+        for vid, uid, start, end, note, name in db.execute(approved)
+    ]
+    db.execute(events)
+    if rows:
+        db.execute(insert(CalendarEvent), rows)
+    return len(rows)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _calendar_renames(db, flush_context):
+    # historiku i atributeve është ende i pranishëm këtu; emri i ri është shkruar tashmë
+    renamed = [
+        obj.id for obj in db.dirty
+        if isinstance(obj, User) and inspect(obj).attrs.name.history.has_changes()
+    ]
+    for uid in renamed:
+        sync_calendar_events(db, user_id=uid)
+
+@on_database_setup
+def ensure_calendar_events():
+    """Migrim i njëhershëm: eventet mbaheshin me një watermark mbi updated_at, tani në çdo shkrim."""
+    db = SessionLocal()
+    try:
+        if db.get(Setting, "calendar_events_v2") is None:
+            sync_calendar_events(db)
+            db.query(Setting).filter_by(key="ical_watermark").delete()
+            db.merge(Setting(key="calendar_events_v2", value=str(date.today())))
+            db.commit()
+    finally:
+        db.close()
+
+def calendar_token_for(db, user):
+    """Kthen token-in e feed-it personal, duke e krijuar herën e parë."""
+    if not user.calendar_token:
+        user.calendar_token = secrets.token_urlsafe(24)
+        db.commit()
+    return user.calendar_token
+
+def team_calendar_token(db):
+    row = db.get(Setting, "ical_team_token")
+    if not row:
+        row = Setting(key="ical_team_token", value=secrets.token_urlsafe(24))
+        db.add(row)
+        db.commit()
+    return row.value
+
+# -------------------- PUNË NË SFOND --------------------
+# Punët e rënda (eksporte, raporte shumëvjeçare, rillogaritje, importe) ekzekutohen në një
+# pool të vogël thread-esh; statusi dhe rezultati ruhen në tabelën jobs.
+JOB_KINDS = {}  # kind -> (titulli, funksioni(db, params, progress) -> (bytes, emri, tipi) | None)
+
+def worker_id() -> str:
+    """host:pid i procesit aktual; llogaritet në çdo thirrje, sepse me `gunicorn --preload`
+    moduli importohet në master dhe worker-at e trashëgojnë pas fork-ut."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+_job_pool = ThreadPoolExecutor(max_workers=app.config["JOB_WORKERS"], thread_name_prefix="job")
+
+def job_kind(kind: str, title: str):
+    def register(fn):
+        JOB_KINDS[kind] = (title, fn)
+        return fn
+    return register
+
+def enqueue_job(db, kind: str, params: dict, user_id: int = None) -> int:
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Lloj pune i panjohur: {kind}")
+
+    # pastro punët e vjetra bashkë me rezultatet e tyre
+    cutoff = datetime.utcnow() - timedelta(days=app.config["JOB_RETENTION_DAYS"])
+    db.query(Job).filter(Job.status.in_(["done", "failed"]), Job.created_at < cutoff).delete(
+        synchronize_session=False
+    )
+
+    job = Job(
+        kind=kind, params=json.dumps(params), created_by=user_id, status="queued", worker=worker_id()
+    )
+    db.add(job)
+    db.commit()
+    # thread-i i punës trashëgon tenant-in e kërkesës
+    _job_pool.submit(copy_context().run, _run_job, job.id)
+    return job.id
+
+def _run_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        job.status = "running"
+        job.worker = worker_id()
+        db.commit()
+        title, fn = JOB_KINDS[job.kind]
+        params = json.loads(job.params or "{}")
+
+        last = {"pct": -1, "at": 0.0}
+
+        def progress(pct):
+            now = time.monotonic()
+            if pct != last["pct"] and (now - last["at"] > 0.5 or pct >= 100):
+                last.update(pct=pct, at=now)
+                with SessionLocal() as pdb:
+                    pdb.execute(update(Job).where(Job.id == job_id).values(progress=min(pct, 100)))
+                    pdb.commit()
+
+        result = fn(db, params, progress)
+
+        job = db.get(Job, job_id)
+        job.status = "done"
+        job.progress = 100
+        job.finished_at = datetime.utcnow()
+        if isinstance(result, tuple):
+            job.result, job.result_name, job.result_type = result
+        elif isinstance(result, str):
+            job.message = result
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        app.logger.exception("Puna %s dështoi", job_id)
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status="failed", message=str(exc)[:500], finished_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+@on_database_open
+def fail_orphaned_jobs():
+    """Punët e mbetura 'running' nga një proces i këtij hosti që nuk jeton më shënohen të dështuara."""
+    host = socket.gethostname()
+    db = SessionLocal()
+    try:
+        for job in db.query(Job).filter(Job.status.in_(["queued", "running"])):
+            worker_host, _, pid = (job.worker or f"{host}:").partition(":")
+            if worker_host != host:
+                continue
+            try:
+                os.kill(int(pid), 0)
+                alive = True
+            except (ValueError, OSError):
+                alive = False
+            if not alive:
+                job.status = "failed"
+                job.message = "Procesi që e ekzekutonte u ndal."
+                job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+@job_kind("audit_archive", "Arkivo auditin e vjetër")
+def _job_audit_archive(db, params, progress):
+    moved = archive_audit_events(db, progress=progress)
+    return f"{moved} ngjarje u arkivuan në {tenant_folder(app.config['AUDIT_ARCHIVE_DIR'])}."
+
+@job_kind("year_end_rollover", "Mbyllja e vitit (carryover)")
+def _job_year_end_rollover(db, params, progress):
+    year = int(params.get("year") or date.today().year - 1)
+    updated = year_end_rollover(db, year, progress=progress)
+    if updated is None:
+        return f"Viti {year} është mbyllur më parë."
+    return f"Carryover-i u përditësua për {updated} përdorues ({year} → {year + 1})."
+
+@job_kind("export_vacations", "Eksport CSV i pushimeve")
+def _job_export_vacations(db, params, progress):
+    year = int(params.get("year") or date.today().year)
+    rdb = ReportSession()
+    try:
+        data = export_vacations_csv(rdb, year)
+    finally:
+        rdb.close()
+    return data, f"vacations_{year}.csv", "text/csv; charset=utf-8"
+
+@job_kind("report_trend", "Raport shumëvjeçar (CSV)")
+def _job_report_trend(db, params, progress):
+    n_years = min(max(int(params.get("years") or 5), 1), 30)
+    rdb = ReportSession()
+    try:
+        data = trend_csv(rdb, n_years, progress)
+    finally:
+        rdb.close()
+    return data, f"trend_{n_years}y.csv", "text/csv; charset=utf-8"
+
+@job_kind("recompute_days", "Rillogarit ditët e punës")
+def _job_recompute_days(db, params, progress):
+    seen, changed = recompute_vacation_days(db, progress=progress)
+    return f"{seen} kërkesa u kontrolluan, {changed} u përditësuan."
+
+@job_kind("accrual_backfill", "Plotëso akumulimet mujore që mungojnë")
+def _job_accrual_backfill(db, params, progress):
+    first = datetime.strptime(params.get("since") or date.today().strftime("%Y-%m"), "%Y-%m").date()
+    today = date.today()
+    months = []
+    d = first
+    while (d.year, d.month) <= (today.year, today.month):
+        months.append((d.year, d.month))
+        d = date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+    done = 0
+    for i, (y, m) in enumerate(months):
+        done += run_monthly_accrual(db, y, m)
+        progress((i + 1) * 100 // len(months))
+    return f"{done} muaj u plotësuan nga {len(months)}."
+
+@job_kind("import_users", "Import përdoruesish (CSV)")
+def _job_import_users(db, params, progress):
+    """CSV me kolonat: name;email;pin;days;role"""
+    rows = list(csv.reader(io.StringIO(params.get("csv") or ""), delimiter=";"))
+    first_line = 1
+    if rows and rows[0] and rows[0][0].strip().lower() == "name":
+        rows = rows[1:]
+        first_line = 2
+
+    existing = {e for (e,) in db.query(User.email)}
+    created, skipped, errors = 0, 0, []
+    for i, row in enumerate(rows):
+        row = [c.strip() for c in row] + [""] * 5
+        name, email, pin, days, role = row[:5]
+        email = email.lower()
+        if not name or not email or not pin or email in existing:
+            skipped += 1
+            continue
+        try:
+            allowance = float(days.replace(",", ".")) if days else 0.0
+        except ValueError:
+            allowance = None
+        if allowance is None or not 0 <= allowance <= 366:  # NaN dhe inf nuk e kalojnë krahasimin
+            errors.append(f"rreshti {first_line + i}: ditë të pavlefshme '{days}'")
+            continue
+        u = User(
+            name=name,
+            email=email,
+            pin=hash_pin(pin),
+            role=role if role in ("member", "manager", "admin") else "member",
+            annual_allowance=allowance,
+            carryover=0,
+            first_login=True,
+        )
+        db.add(u)
+        db.flush()
+        record_balance(db, u.id, "allowance_set", u.annual_allowance)
+        record_balance(db, u.id, "carryover_set", 0)
+        existing.add(email)
+        created += 1
+        if created % 100 == 0:
+            db.commit()
+        progress((i + 1) * 100 // len(rows))
+    db.commit()
+    message = f"{created} përdorues u krijuan, {skipped} u anashkaluan."
+    if errors:
+        shown = "; ".join(errors[:10]) + (f"; … (+{len(errors) - 10})" if len(errors) > 10 else "")
+        message += f" {len(errors)} me gabime: {shown}"
+    return message
+
+# -------------------- STATIC & KOMPRESIM --------------------
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/csv", "text/css", "text/calendar",
+    "application/json", "text/javascript", "application/javascript",
+}
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+_static_hashes = {}
+_static_compressed = {}  # (shtegu, versioni, kodimi) -> bytes
+
+def static_url(filename: str) -> str:
+    """URL për një skedar statik me gjurmë përmbajtjeje (?v=...), që mund të ruhet gjatë në cache."""
+    digest = None if app.debug else _static_hashes.get(filename)
+    if digest is None:
+        with open(os.path.join(app.static_folder, filename), "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        _static_hashes[filename] = digest
+    return url_for("static", filename=filename, v=digest)
+
+app.jinja_env.globals["static_url"] = static_url
+app.jinja_env.globals["portion_label"] = portion_label
+app.jinja_env.filters["days"] = format_days
+
+def _pick_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+
+@app.after_request
+def query_count_header(resp):
+    if app.config["QUERY_COUNT_HEADER"]:
+        resp.headers["X-Query-Count"] = str(g.get("query_count", 0))
+    return resp
+
+@app.after_request
+def cache_and_compress(resp):
+    is_static = request.path.startswith(app.static_url_path + "/")
+    if is_static and request.args.get("v") and resp.status_code == 200:
+        resp.cache_control.no_cache = None
+        resp.cache_control.public = True
+        resp.cache_control.max_age = STATIC_MAX_AGE
+        resp.cache_control.immutable = True
+
+    if (
+        resp.status_code != 200
+        or resp.mimetype not in COMPRESSIBLE_TYPES
+        or "Content-Encoding" in resp.headers
+        or (resp.is_streamed and not is_static)
+    ):
+        return resp
+
+    encoding = _pick_encoding()
+    resp.vary.add("Accept-Encoding")
+    if not encoding:
+        return resp
+
+    if is_static:
+        resp.direct_passthrough = False
+        key = (request.path, request.args.get("v"), encoding)
+        body = _static_compressed.get(key)
+        if body is None:
+            body = _compress(resp.get_data(), encoding)
+            if request.args.get("v"):
+                _static_compressed[key] = body
+    else:
+        data = resp.get_data()
+        if len(data) < 512:
+            return resp
+        body = _compress(data, encoding)
+
+    resp.set_data(body)
+    resp.headers["Content-Encoding"] = encoding
+    # përmbajtja e kompresuar nuk është identike bajt për bajt: ETag-u bëhet i dobët
+    etag, weak = resp.get_etag()
+    if etag and not weak:
+        resp.set_etag(etag, weak=True)
+    return resp
+
+# -------------------- ROUTES --------------------
+@app.route("/")
+def index():
+    user = get_current_user()
+    if user:
+        return redirect(url_for("me"))
+    return redirect(url_for("login"))
+
+
+@app.route("/login", methods=["GET", "POST"])
+def login():
+    status = 200
+    if request.method == "POST":
+        email = request.form.get("email", "").lower()
+        pin = request.form.get("pin", "").strip()
+        ip = client_ip()
+        limit_key = f"{current_tenant()}/{email}" if current_tenant() else email
+
+        # përpjekjet e refuzuara përgjigjen pa asnjë query në DB
+        if email_limiter.blocked(limit_key) or ip_limiter.blocked(ip):
+            flash("Shumë përpjekje të dështuara. Provo përsëri pas pak minutash.", "danger")
+            status = 429
+        else:
+            db = SessionLocal()
+            user = db.query(User).filter(User.email == email).first()
+            db.close()
+
+            if user and verify_pin(user.pin, pin):
+                email_limiter.reset(limit_key)
+
+                # migrim: PIN-et e vjetra (tekst ose kosto tjetër) rihash-ohen pas hyrjes së suksesshme
+                if pin_needs_rehash(user.pin):
+                    db = SessionLocal()
+                    db.execute(update(User).where(User.id == user.id).values(pin=hash_pin(pin)))
+                    db.commit()
+                    db.close()
+
+                session["tenant"] = current_tenant()
+                if user.first_login:
+                    session["uid"]=user.id
+                    return redirect(url_for("force_change_pin"))
+                #login normal
+                session["uid"] = user.id
+                flash("Hyrja me sukses!", "success")
+
+                if user.role == "admin":
+                    return redirect(url_for("admin_dashboard"))
+                return redirect(url_for("me"))
+            else:
+                email_limiter.hit(limit_key)
+                ip_limiter.hit(ip)
+                flash("Email ose PIN i gabuar!", "danger")
+
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Vacation Planner – Hyrje{% endblock %}
+{% block body_class %}auth{% endblock %}
+{% block page %}
+  <div class="auth-card">
+    <div class="logo">VACATION PLANNER</div>
+    <h2>Mirë se erdhe 👋</h2>
+    <div class="subtitle">Hyr me email-in dhe PIN-in tënd.</div>
+
+    {% with messages = get_flashed_messages(with_categories=true) %}
+      {% for cat, msg in messages %}
+        <div class="flash {{ 'flash-ok' if cat == 'success' else 'flash-err' }}">{{ msg }}</div>
+      {% endfor %}
+    {% endwith %}
+
+    <form method="post" class="form-stack">
+      {% if ask_tenant %}
+      <label for="tenant">Kompania</label>
+      <input id="tenant" name="tenant" type="text" autocomplete="organization" value="{{ request.values.get('tenant', '') }}">
+      {% endif %}
+      <label for="email">Email</label>
+      <input id="email" name="email" type="email" autocomplete="username">
+
+      <label for="pin">PIN</label>
+      <input id="pin" name="pin" type="password" autocomplete="current-password">
+
+      <button class="btn" type="submit">Hyr</button>
+    </form>
+
+    <div class="footer">
+      Admin krijon llogaritë dhe përcakton balancën e pushimeve.
+    </div>
   </div>
-</header>
-<div class="container">
+{% endblock %}
+    """,
+        ask_tenant=bool(app.config["TENANTS_DIR"]) and not app.config["TENANT_DOMAIN"],
+    ), status
+
+
+
+@app.route("/me", methods=["GET", "POST"])
+def me():
+    uid = session.get("uid")
+    if not uid:
+        return redirect(url_for("login"))
+
+    db = SessionLocal()
+    maybe_run_monthly_accrual(db)
+
+    # POST = kërkesë e re pushimi
+    if request.method == "POST":
+        user = db.get(User, uid)
+        if not user:
+            db.close()
+            return redirect(url_for("login"))
+        start_str = request.form.get("start")
+        end_str = request.form.get("end")
+        note = request.form.get("note") or ""
+        leave_type = request.form.get("leave_type") or ANNUAL_LEAVE
+        if not db.get(LeaveType, leave_type):
+            flash("Lloj leje i panjohur.", "danger")
+            db.close()
+            return redirect(url_for("me"))
+
+        try:
+            start = datetime.strptime(start_str, "%Y-%m-%d").date()
+            end = datetime.strptime(end_str, "%Y-%m-%d").date()
+        except Exception:
+            flash("Datë e pavlefshme.", "danger")
+            db.close()
+            return redirect(url_for("me"))
+
+        if end < start:
+            start, end = end, start
+        portion = request.form.get("portion") or "full"
+        if portion not in PORTIONS:
+            portion = "full"
+        units = working_days(db, start, end, user.country) * UNITS_PER_DAY
+        if units == 0:
+            flash("Intervali i zgjedhur nuk përmban asnjë ditë pune.", "danger")
+            db.close()
+            return redirect(url_for("me"))
+        if portion != "full":
+            # gjysmë dite / orë: vetëm për një ditë pune, data e fundit injorohet
+            end = start
+            units = portion_units(portion, request.form.get("hours", type=int))
+            if units is None or not working_days(db, start, end, user.country):
+                flash(f"Pjesët e ditës kërkohen për një ditë pune (1–{WORKDAY_HOURS - 1} orë).", "danger")
+                db.close()
+                return redirect(url_for("me"))
+        days = units_to_days(units)
+
+        vac = Vacation(
+            user_id=user.id,
+            start=start,
+            end=end,
+            days=days,
+            units=units,
+            portion=portion,
+            note=note,
+            status="pending",
+            leave_type=leave_type,
+            team_id=user.team_id,
+        )
+        db.add(vac)
+        db.flush()
+        audit(
+            db, "vacation", vac.id, "request",
+            user_id=user.id, start=start, end=end, days=days, portion=portion, leave_type=leave_type,
+        )
+        vacation_changed(db, vac)
+        notify_vacation(db, vac, "vacation_requested")
+        db.commit()
+        flash(f"Kërkesa u dërgua: {format_days(days)} ditë.", "success")
+        db.close()
+        return redirect(url_for("me"))
+
+    # GET = shfaq view personale, nga një query i vetëm
+    year = date.today().year
+    before = None
+    if request.args.get("before"):
+        try:
+            b_start, b_id = request.args["before"].split("_")
+            before = (date.fromisoformat(b_start), int(b_id))
+        except ValueError:
+            before = None
 
-  {% with messages = get_flashed_messages(with_categories=true) %}
-    {% for cat, msg in messages %}
-      <div class="flash {{ 'flash-ok' if cat == 'success' else 'flash-err' }}">{{ msg }}</div>
-    {% endfor %}
-  {% endwith %}
+    rows = db.execute(me_select(uid, year, before)).all()
+    if not rows:
+        db.close()
+        return redirect(url_for("login"))
+
+    user = rows[0]
+    feed_token = user.calendar_token
+    if not feed_token:
+        feed_token = calendar_token_for(db, db.get(User, uid))
+    db.close()
+    types, by_type = me_leave_types(user.by_type)
 
+    vacations = [r for r in rows if r.id is not None]
+    has_more = len(vacations) > ME_PAGE_SIZE
+    vacations = vacations[:ME_PAGE_SIZE]
+    next_before = f"{vacations[-1].start.isoformat()}_{vacations[-1].id}" if has_more else None
+
+    allowance = user.allowance
+    taken = user.taken
+    pending = user.pending
+    adjust = user.adjust
+    remaining = allowance + adjust - taken
+
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Vacation Planner - Profili im{% endblock %}
+{% block body_class %}{{ theme }}{% endblock %}
+{% block nav %}
+    <span class="who">{{ user.name }}</span>
+    <a href="{{ url_for('toggle_theme') }}">Tema: {{ 'Dark' if theme == 'light' else 'Light' }}</a>
+    {% if user.role == 'admin' %}
+    <a href="{{ url_for('admin_dashboard') }}">Admin</a>
+    {% elif user.role == 'manager' %}
+    <a href="{{ url_for('admin_dashboard') }}">Ekipi im</a>
+    {% endif %}
+    <a href="{{ url_for('logout') }}">Dil</a>
+{% endblock %}
+{% block content %}
   <h2>Profili im – {{ year }}</h2>
 
-  <div class="grid">
+  <div class="grid-4">
     <div class="stat">
       <div class="stat-label">Leje + carryover</div>
       <div class="stat-value">{{ allowance }}</div>
@@ -586,8 +3502,8 @@ def me():
   </div>
 
   <div class="card">
-    <h3>Kërko pushim (ditë kalendarike)</h3>
-    <form method="post">
+    <h3>Kërko pushim (ditë pune)</h3>
+    <form method="post" class="form-stack">
       <div class="form-row">
         <div>
           <label>Data fillimit</label>
@@ -598,19 +3514,67 @@ def me():
           <input type="date" name="end" required>
         </div>
       </div>
-      <div style="margin-top:10px;">
-        <label>Shënim (opsional)</label>
-        <textarea name="note"></textarea>
+      <div class="form-row">
+        <div>
+          <label>Kohëzgjatja</label>
+          <select name="portion">
+            <option value="full">Ditë të plota</option>
+            <option value="am">Gjysmë dite – paradite</option>
+            <option value="pm">Gjysmë dite – pasdite</option>
+            <option value="hours">Orë (vetëm data e fillimit)</option>
+          </select>
+        </div>
+        <div>
+          <label>Orë</label>
+          <input type="number" name="hours" min="1" max="{{ workday_hours - 1 }}" placeholder="p.sh. 2">
+        </div>
       </div>
+      <label>Lloji i lejes</label>
+      <select name="leave_type">
+        {% for t in types %}
+          <option value="{{ t.code }}">{{ t.name }}</option>
+        {% endfor %}
+      </select>
+      <label>Shënim (opsional)</label>
+      <textarea name="note"></textarea>
       <button class="btn" type="submit">Dërgo kërkesë</button>
     </form>
   </div>
 
+  <div class="card">
+    <h3>Sipas llojit të lejes</h3>
+    <table class="numeric">
+      <tr><th>Lloji</th><th>Leje</th><th>Rregullime</th><th>Të marra</th><th>Në pritje</th><th>Të mbetura</th></tr>
+      {% for t in types %}
+        {% set b = by_type.get(t.code, {}) %}
+        <tr>
+          <td>{{ t.name }}</td>
+          <td>{{ b.allowance if b.allowance is not none else '–' }}</td>
+          <td>{{ b.adjust or 0 }}</td>
+          <td>{{ b.taken or 0 }}</td>
+          <td>{{ b.pending or 0 }}</td>
+          <td>{{ b.remaining if b.remaining is not none else '–' }}</td>
+        </tr>
+      {% endfor %}
+    </table>
+  </div>
+
+  <div class="card">
+    <h3>Kalendari im</h3>
+    <div class="muted">
+      Abonohu në këtë adresë nga Google Calendar, Outlook ose Apple Calendar për të parë pushimet e aprovuara:
+    </div>
+    <div class="form-stack" style="margin-top:8px;">
+      <input type="text" readonly value="{{ url_for('calendar_feed', token=feed_token, _external=True) }}">
+    </div>
+  </div>
+
   <div class="card">
     <h3>Kërkesat e mia</h3>
     <table>
       <tr>
         <th>Data</th>
+        <th>Lloji</th>
         <th>Ditë</th>
         <th>Status</th>
         <th>Shënim</th>
@@ -618,27 +3582,31 @@ def me():
       {% for v in vacations %}
       <tr>
         <td>{{ v.start }} → {{ v.end }}</td>
-        <td>{{ v.days }}</td>
+        <td><span class="tag">{{ type_names.get(v.leave_type, v.leave_type) }}</span></td>
+        <td>{{ v.days|days }} {{ portion_label(v.portion, v.units) }}</td>
         <td>
           {% if v.status == 'approved' %}
-            <span class="status st-approved">Aprovuar</span>
+            <span class="status-badge status-approved">Aprovuar</span>
           {% elif v.status == 'pending' %}
-            <span class="status st-pending">Në pritje</span>
+            <span class="status-badge status-pending">Në pritje</span>
           {% else %}
-            <span class="status st-denied">Refuzuar</span>
+            <span class="status-badge status-denied">Refuzuar</span>
           {% endif %}
         </td>
-        <td>{{ v.note }}</td>
+        <td>{{ v.note or '' }}</td>
       </tr>
       {% endfor %}
     </table>
+    {% if next_before %}
+      <p><a class="btn btn-sm" href="{{ url_for('me', before=next_before) }}">Më të vjetra →</a></p>
+    {% elif request.args.get('before') %}
+      <p><a class="link" href="{{ url_for('me') }}">⬅ Kërkesat e fundit</a></p>
+    {% endif %}
   </div>
-
-</div>
-</body>
-</html>
+{% endblock %}
     """,
         user=user,
+        next_before=next_before,
         year=year,
         allowance=allowance,
         adjust=adjust,
@@ -646,264 +3614,124 @@ def me():
         pending=pending,
         remaining=remaining,
         vacations=vacations,
+        feed_token=feed_token,
+        types=types,
+        type_names={t.code: t.name for t in types},
+        by_type=by_type,
+        workday_hours=WORKDAY_HOURS,
         theme = get_theme(),
     )
 
-@app.route("/admin")
-def admin_dashboard():
+DashboardScope = namedtuple("DashboardScope", "user db year teams live_version")
+
+def _dashboard_scope():
+    """Përdoruesi, sesioni, viti, ekipet dhe versioni live i dashboard-it; ose një redirect."""
     user = get_current_user()
     if not user:
       return redirect(url_for("login"))
-    if user.role != "admin":
+    if not can_manage(user):
         return redirect(url_for("me"))
 
     db = SessionLocal()
     maybe_run_monthly_accrual(db)
-    year = date.today().year
+    # menaxherët shohin vetëm ekipet e tyre; çdo query kushton sa madhësia e ekipit
+    teams = team_scope(db, user)
+    # versioni lexohet para të dhënave: një shkrim në mes shkakton rifreskim, jo humbje
+    return DashboardScope(user, db, date.today().year, teams, read_version(db, "report"))
 
-    users = db.query(User).all()
-    vacations = db.query(Vacation).order_by(Vacation.start.desc()).all()
-
-    # rreshtat për tabelën e ekipit
-    rows = []
-    for u in users:
-        rows.append(
-            dict(
-                id=u.id,
-                name=u.name,
-                email=u.email,
-                allowance=u.allowance_total(),
-                adjust=u.adjustments_sum(year),
-                taken=u.taken_days(year),
-                pending=u.pending_days(year),
-                remaining=u.remaining(year),
-            )
-        )
-
-    # rreshtat për tabelën e pushimeve
-    vac_rows = []
-    for v in vacations:
-        vac_rows.append(
-            dict(
-                id=v.id,
-                user_name=v.user.name,
-                user_email=v.user.email,
-                start=v.start,
-                end=v.end,
-                days=v.days,
-                status=v.status,
-            )
-        )
-
-    db.close()
+def admin_dashboard():
+    scope = _dashboard_scope()
+    if not isinstance(scope, DashboardScope):
+        return scope
+    return render_dashboard(scope, load_dashboard(scope.db, scope.year, scope.teams))
+
+async def admin_dashboard_async():
+    scope = _dashboard_scope()
+    if not isinstance(scope, DashboardScope):
+        return scope
+    if current_tenant() is None:
+        data = await load_dashboard_async(scope.year, scope.teams)
+    else:
+        # motori asinkron lidhet vetëm me DATABASE_URL; tenant-ët lexojnë në rrugën sinkrone
+        data = load_dashboard(scope.db, scope.year, scope.teams)
+    return render_dashboard(scope, data)
+
+def render_dashboard(scope, data):
+    user, db, year, teams, live_version = scope
+    rows, vac_rows, pending_count, type_rows, queue = data
+    by_type = pivot_leave_balances(type_rows)
+
+    team_token = team_calendar_token(db)
+    types = leave_types(db)
+    all_teams = db.execute(select(Team.id, Team.name).order_by(Team.name)).all()
+    db.close()
 
     return render_template_string(
         """
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Vacation Planner - Admin</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: #f3f4f6;
-      color: #111827;
-    }
-    header {
-      background: #111827;
-      color: #fff;
-      padding: 12px 24px;
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-    }
-    header .title {
-      font-weight: 600;
-      letter-spacing: .03em;
-    }
-    header a {
-      color: #e5e7eb;
-      text-decoration: none;
-      margin-left: 12px;
-      font-size: 14px;
-    }
-    .container {
-      max-width: 1200px;
-      margin: 20px auto;
-      padding: 0 16px 32px;
-    }
-    .flash {
-      padding: 10px 12px;
-      border-radius: 8px;
-      margin-bottom: 12px;
-      font-size: 14px;
-      background: #dcfce7;
-      color: #166534;
-    }
-    h2, h3 {
-      margin: 0 0 12px;
-      font-weight: 600;
-      color: #111827;
-    }
-    .toolbar a {
-      display: inline-block;
-      padding: 6px 12px;
-      border-radius: 999px;
-      background: #111827;
-      color: #fff;
-      text-decoration: none;
-      font-size: 13px;
-      margin-right: 8px;
-    }
-    .toolbar a.secondary {
-      background: #4b5563;
-    }
-    .toolbar a.accent {
-      background: #2563eb;
-    }
-    .grid {
-      display: grid;
-      grid-template-columns: minmax(0,1.1fr) minmax(0,1fr);
-      gap: 16px;
-      margin-top: 10px;
-    }
-    .card {
-      background: #fff;
-      border-radius: 14px;
-      padding: 16px 16px 12px;
-      box-shadow: 0 4px 14px rgba(15, 23, 42, .08);
-    }
-    table {
-      width: 100%;
-      border-collapse: collapse;
-      font-size: 13px;
-    }
-    th, td {
-      padding: 8px 10px;
-      border-bottom: 1px solid #e5e7eb;
-      text-align: left;
-    }
-    th {
-      background: #f9fafb;
-      font-weight: 600;
-      color: #374151;
-    }
-    .tag {
-      display: inline-block;
-      padding: 2px 8px;
-      border-radius: 999px;
-      font-size: 11px;
-      background: #e5e7eb;
-      color: #374151;
-    }
-    .link-actions a {
-      font-size: 12px;
-      margin-right: 6px;
-      text-decoration: none;
-      color: #2563eb;
-    }
-    .action-btn {
-      display: inline-block;
-      padding: 5px 10px;
-      border-radius: 8px;
-      font-size: 12px;
-      font-weight: 500;
-      text-decoration: none;
-      margin-right: 6px;
-      transition: 0.15s;
-    }
-
-    .approve-btn {
-      background: #d1fae5;
-      color: #065f46;
-      border: 1px solid #34d399;
-    }
-    .approve-btn:hover {
-      background: #34d399;
-      color: white;
-    }
-
-    .deny-btn {
-      background: #fef3c7;
-      color: #92400e;
-      border: 1px solid #fbbf24;
-    }
-    .deny-btn:hover {
-      background: #fbbf24;
-      color: white;
-    }
-
-    .delete-btn {
-      background: #fee2e2;
-      color: #b91c1c;
-      border: 1px solid #ef4444;
-    }
-    .delete-btn:hover {
-      background: #ef4444;
-      color: white;
-    }
-        .status-badge {
-      display: inline-flex;
-      align-items: center;
-      gap: 4px;
-      padding: 4px 10px;
-      font-size: 12px;
-      font-weight: 600;
-      border-radius: 999px;
-      width: max-content;
-    }
-
-    .status-approved {
-      background: #d1fae5;
-      color: #065f46;
-      border: 1px solid #34d399;
-    }
-
-    .status-pending {
-      background: #fef9c3;
-      color: #854d0e;
-      border: 1px solid #facc15;
-    }
-
-    .status-denied {
-      background: #fee2e2;
-      color: #b91c1c;
-      border: 1px solid #ef4444;
-    }
-    .link-actions a.danger { color: #b91c1c; }
-  </style>
-</head>
-<body>
-<header>
-  <div class="title">Vacation Planner – Admin</div>
-  <div>
+{% extends "base.html" %}
+{% block title %}Vacation Planner - Admin{% endblock %}
+{% block header_title %}Vacation Planner – Admin{% endblock %}
+{% block nav %}
     <a href="{{ url_for('me') }}">Profili im</a>
-    <a href="{{ url_for('admin_report') }}" class="secondary">📊 Raport</a>
-    <a href="{{ url_for('admin_export_vacations') }}" class="secondary">⬇ Export CSV</a>
+    <a href="{{ url_for('admin_report', team=team_arg) }}">📊 Raport</a>
+    {% if user.role == 'admin' %}
+    <a href="{{ url_for('admin_export_vacations') }}">⬇ Export CSV</a>
+    {% endif %}
     <a href="{{ url_for('logout') }}">Dil</a>
-  </div>
-</header>
-<div class="container">
-
-  {% with messages = get_flashed_messages(with_categories=true) %}
-    {% for cat, msg in messages %}
-      <div class="flash">{{ msg }}</div>
-    {% endfor %}
-  {% endwith %}
-
-  <h2>Pasqyra {{ year }}</h2>
+{% endblock %}
+{% block container_class %}container-wide{% endblock %}
+{% block content %}
+  <h2>Pasqyra {{ year }} <span class="tag" id="pending-count" data-count="{{ pending_count }}">⏳ {{ pending_count }} në pritje</span></h2>
+  {% if user.role == 'admin' and all_teams %}
+  <form method="get" class="form-inline">
+    <span>Ekipi</span>
+    <select name="team" onchange="this.form.submit()">
+      <option value="">Gjithë kompania</option>
+      {% for t in all_teams %}
+        <option value="{{ t.id }}" {{ 'selected' if t.id == team_arg }}>{{ t.name }}</option>
+      {% endfor %}
+    </select>
+  </form>
+  {% endif %}
   <div class="toolbar">
+    {% if user.role == 'admin' %}
     <a href="{{ url_for('admin_create_user') }}" class="secondary">➕ Shto përdorues</a>
-    <a href="{{ url_for('admin_calendar') }}" class="secondary">📅 Kalendar pushimesh</a>
+    {% endif %}
+    <a href="{{ url_for('admin_calendar', team=team_arg) }}" class="secondary">📅 Kalendar pushimesh</a>
+    {% if user.role == 'admin' %}
+    <a href="{{ url_for('admin_teams') }}" class="secondary">👥 Ekipet</a>
+    <a href="{{ url_for('admin_occupancy') }}" class="secondary">🔥 Ngarkesa vjetore</a>
+    <a href="{{ url_for('admin_holidays') }}" class="secondary">🎌 Festat & fundjavat</a>
+    <a href="{{ url_for('admin_jobs') }}" class="secondary">⚙ Punët në sfond</a>
+    <a href="{{ url_for('admin_audit') }}" class="secondary">🧾 Auditi</a>
+    <a href="{{ url_for('admin_leave_types') }}" class="secondary">🏷 Llojet e lejes</a>
+    <a href="{{ url_for('calendar_feed', token=team_token, _external=True) }}" class="accent">🗓 Feed iCal i ekipit</a>
+    {% endif %}
   </div>
 
-  <div class="grid">
+  <div class="card">
+    <h3>Radha e aprovimit</h3>
+    <table id="queue-table" {{ 'hidden' if not queue }}>
+      <tr><th>Përdoruesi</th><th>Data</th><th>Ditë</th><th>Veprim</th></tr>
+      {% for v in queue %}
+      <tr data-vid="{{ v.id }}" data-start="{{ v.start }}">
+        <td>{{ v.user_name }}</td>
+        <td>{{ v.start }} → {{ v.end }} <span class="tag">{{ type_names.get(v.leave_type, v.leave_type) }}</span></td>
+        <td>{{ v.days|days }} {{ portion_label(v.portion, v.units) }}</td>
+        <td>
+          <a href="{{ url_for('admin_vacation_action', vid=v.id, action='approve') }}" class="action-btn approve-btn">Aprovo</a>
+          <a href="{{ url_for('admin_vacation_action', vid=v.id, action='deny') }}" class="action-btn deny-btn">Refuzo</a>
+        </td>
+      </tr>
+      {% endfor %}
+    </table>
+    <div class="muted" id="queue-empty" {{ 'hidden' if queue }}>Asnjë kërkesë në pritje.</div>
+  </div>
+
+  <div class="grid-2">
     <div class="card">
       <h3>Ekipi</h3>
+      <a href="" class="link" id="balances-stale" hidden>Bilancet kanë ndryshuar – rifresko</a>
       <table>
         <tr>
           <th>Emri</th>
@@ -925,17 +3753,9 @@ def admin_dashboard():
           <td>{{ r.pending }}</td>
           <td><strong>{{ r.remaining }}</strong></td>
           <td>
-            <a href="{{ url_for('admin_edit_user', uid=r.id) }}"
-            style="
-            padding:6px 12px;
-            background:#111827;
-            color:white;
-            border-radius:8px;
-            text-decoration:none;
-            font-size:13px;
-            display:inline-block;">
-            Edito
-            </a>
+            {% if user.role == 'admin' %}
+            <a href="{{ url_for('admin_edit_user', uid=r.id) }}" class="btn btn-sm">Edito</a>
+            {% endif %}
           </td>
         </tr>
         {% endfor %}
@@ -944,7 +3764,7 @@ def admin_dashboard():
 
     <div class="card">
       <h3>Kërkesa pushimi</h3>
-      <table>
+      <table id="vac-table">
         <tr>
           <th>Përdoruesi</th>
           <th>Data</th>
@@ -953,10 +3773,10 @@ def admin_dashboard():
           <th>Veprim</th>
         </tr>
         {% for v in vac_rows %}
-        <tr>
+        <tr data-vid="{{ v.id }}" data-start="{{ v.start }}">
           <td>{{ v.user_name }} <span class="tag">{{ v.user_email }}</span></td>
-          <td>{{ v.start }} → {{ v.end }}</td>
-          <td>{{ v.days }}</td>
+          <td>{{ v.start }} → {{ v.end }} <span class="tag">{{ type_names.get(v.leave_type, v.leave_type) }}</span></td>
+          <td>{{ v.days|days }} {{ portion_label(v.portion, v.units) }}</td>
           <td>
             {% if v.status == 'approved' %}
             <span class="status-badge status-approved">✔ Aprovuar</span>
@@ -971,8 +3791,10 @@ def admin_dashboard():
              class="action-btn approve-btn">Aprovo</a>
              <a href="{{ url_for('admin_vacation_action', vid=v.id, action='deny') }}"
              class="action-btn deny-btn">Refuzo</a>
+             {% if user.role == 'admin' %}
              <a href="{{ url_for('admin_vacation_action', vid=v.id, action='delete') }}"
              class="action-btn delete-btn">Fshi</a>
+             {% endif %}
           </td>
         </tr>
         {% endfor %}
@@ -980,20 +3802,62 @@ def admin_dashboard():
     </div>
   </div>
 
-</div>
-</body>
-</html>
+  <div class="card card-scroll">
+    <h3>Sipas llojit të lejes</h3>
+    <table class="numeric">
+      <tr>
+        <th>Emri</th>
+        {% for t in types %}<th>{{ t.name }} (marrë / mbetur)</th>{% endfor %}
+      </tr>
+      {% for r in rows %}
+      <tr>
+        <td>{{ r.name }}</td>
+        {% for t in types %}
+          {% set b = by_type.get(r.id, {}).get(t.code, {}) %}
+          <td>{{ b.taken or 0 }} / {{ b.remaining if b.remaining is not none else '–' }}</td>
+        {% endfor %}
+      </tr>
+      {% endfor %}
+    </table>
+  </div>
+{% endblock %}
+{% block scripts %}
+<script src="{{ static_url('live.js') }}"></script>
+<script>
+  liveDashboard({
+    events: {{ url_for('admin_events', team=team_arg, since=live_version)|tojson }},
+    actionUrl: {{ url_for('admin_vacation_action', vid=0, action='ACTION')|tojson }},
+    canDelete: {{ (user.role == 'admin')|tojson }},
+    typeNames: {{ type_names|tojson }}
+  });
+</script>
+{% endblock %}
     """,
         rows=rows,
         vac_rows=vac_rows,
+        live_version=live_version,
+        pending_count=pending_count,
         year=year,
+        team_token=team_token,
+        types=types,
+        type_names={t.code: t.name for t in types},
+        by_type=by_type,
+        queue=queue,
+        user=user,
+        all_teams=all_teams,
+        team_arg=request.args.get("team", type=int),
     )
 
+# me ASYNC_READS, /admin shërbehet nga view-i asinkron (kontrolluar në nisje që varësitë ekzistojnë)
+app.add_url_rule(
+    "/admin", "admin_dashboard", admin_dashboard_async if app.config["ASYNC_READS"] else admin_dashboard
+)
+
 
 @app.route("/admin/vacation/<int:vid>/<string:action>")
 def admin_vacation_action(vid, action):
     admin = get_current_user()
-    if not admin or admin.role != "admin":
+    if not can_manage(admin):
         return redirect(url_for("login"))
 
     db = SessionLocal()
@@ -1003,29 +3867,153 @@ def admin_vacation_action(vid, action):
         db.close()
         flash("Kërkesa nuk ekziston!", "danger")
         return redirect(url_for("admin_dashboard"))
+    # menaxheri aprovon / refuzon vetëm kërkesat e ekipeve të veta; fshirja mbetet për adminët
+    if admin.role != "admin" and v.user_id == admin.id:
+        db.close()
+        flash("Nuk mund të vendosësh për kërkesën tënde.", "danger")
+        return redirect(url_for("admin_dashboard"))
+    if admin.role != "admin" and (action == "delete" or v.team_id not in team_scope(db, admin)):
+        db.close()
+        flash("Kjo kërkesë nuk është në ekipin tënd.", "danger")
+        return redirect(url_for("admin_dashboard"))
+
+    old_status = v.status
+    if action in ("approve", "deny", "delete"):
+        audit(db, "vacation", v.id, action, user_id=v.user_id, days=v.days, status=old_status)
+        new_status = {"approve": "approved", "deny": "denied", "delete": None}[action]
+        vacation_status_changed(db, v, old_status, new_status)
 
     if action == "approve":
         v.status = "approved"
     elif action == "deny":
         v.status = "denied"
     elif action == "delete":
+        vacation_changed(db, v, deleted=True, old_status=old_status)
         db.delete(v)
         db.commit()
         db.close()
         flash("Kërkesa u fshi!", "success")
         return redirect(url_for("admin_dashboard"))
 
+    vacation_changed(db, v, old_status=old_status)
+    if v.status != old_status:
+        notify_vacation(db, v, f"vacation_{v.status}")
     db.commit()
     db.close()
     flash("U përditësua me sukses!", "success")
     return redirect(url_for("admin_dashboard"))
 
+
+@app.route("/admin/events")
+def admin_events():
+    """Ndryshimet e pushimeve për dashboard-in dhe kalendarin, si text/event-stream.
+
+    `?since=` (ose Last-Event-ID pas një rilidhjeje) është versioni "report" i faqes. Me
+    workers me thread-e (gthread, gevent, serveri i zhvillimit) lidhja mbahet hapur deri në
+    LIVE_MAX_SECONDS; me workers sync përgjigjet menjëherë dhe shfletuesi pyet përsëri pas
+    LIVE_POLL sekondash, që një tab i hapur të mos zërë një worker të tërë."""
+    admin = get_current_user()
+    if not can_manage(admin):
+        return "", 401
+
+    tenant = current_tenant()
+    db = SessionLocal()
+    teams = team_scope(db, admin)
+    current = int(read_version(db, "report"))
+    db.close()
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.args.get("since") or current)
+    except ValueError:
+        since = -1  # kursor i pavlefshëm: rifreskim
+    long_lived = bool(request.environ.get("wsgi.multithread"))
+    retry_ms = 3000 if long_lived else app.config["LIVE_POLL"] * 1000
+    heartbeat = app.config["LIVE_HEARTBEAT"]
+    deadline = time.monotonic() + (app.config["LIVE_MAX_SECONDS"] if long_lived else 0)
+
+    def stream():
+        last, version = since, current
+        yield f"retry: {retry_ms}\n\n"
+        while True:
+            events = live_bus.since(tenant, last, version)
+            if events is None:
+                # commit-i bëhet para publikimit: një çast pritje para se ta quajmë humbje
+                live_bus.wait(0.2)
+                events = live_bus.since(tenant, last, version)
+            if events is None:
+                yield sse("stale", {})
+                return
+            for ev in events:
+                last = int(ev["version"])
+                if teams is None or ev["team_id"] in teams:
+                    yield sse("vacation", ev, last)
+                else:
+                    yield f"id: {last}\n\n"  # vetëm kursori, pa ngjarje
+            if time.monotonic() >= deadline:
+                return
+            if not events:
+                yield ": ping\n\n"
+            live_bus.wait(heartbeat)
+            db = SessionLocal()
+            version = int(read_version(db, "report"))
+            db.close()
+
+    resp = Response(stream_with_context(stream()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: mos e mbaj në buffer
+    return resp
+
 @app.route("/logout")
 def logout():
     session.clear()
     return redirect(url_for("login"))
 
 
+@app.route("/calendar/<token>.ics")
+def calendar_feed(token):
+    db = SessionLocal()
+    team = db.get(Setting, "ical_team_token")
+    if team and secrets.compare_digest(team.value, token):
+        uid, cal_name = None, "Pushimet e ekipit"
+    else:
+        user = db.query(User).filter(User.calendar_token == token).first()
+        if not user:
+            db.close()
+            return "Feed nuk u gjet.", 404
+        uid, cal_name = user.id, f"Pushimet – {user.name}"
+
+    events = db.query(CalendarEvent)
+    if uid is not None:
+        events = events.filter(CalendarEvent.user_id == uid)
+
+    # ETag nga numri dhe ndryshimi i fundit: klientët pa ndryshime marrin 304 pa ndërtim feed-i
+    count, newest = events.with_entities(
+        func.count(CalendarEvent.vacation_id), func.max(CalendarEvent.updated_at)
+    ).one()
+    etag = f"{uid or 'team'}-{count}-{newest.timestamp() if newest else 0:.0f}"
+    if request.if_none_match.contains_weak(etag):
+        db.close()
+        resp = make_response("", 304)
+        resp.set_etag(etag)
+        return resp
+
+    chunks = [e.ics for e in events.order_by(CalendarEvent.vacation_id)]
+    db.close()
+
+    body = (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        "PRODID:-//Vacation Planner//SQ\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+        f"{ical_fold('X-WR-CALNAME:' + ical_escape(cal_name))}\r\n"
+        + "".join(chunks)
+        + "END:VCALENDAR\r\n"
+    )
+    resp = make_response(body)
+    resp.headers["Content-Type"] = "text/calendar; charset=utf-8"
+    resp.set_etag(etag)
+    return resp
+
+
 @app.route("/admin/user/<int:uid>", methods=["GET", "POST"])
 def admin_edit_user(uid):
     admin = get_current_user()
@@ -1048,11 +4036,30 @@ def admin_edit_user(uid):
             db.close()
             flash("Vlerë e pavlefshme.", "danger")
             return redirect(url_for("admin_edit_user", uid=uid))
-        if role not in ("member", "admin"):
+        if role not in ("member", "manager", "admin"):
             role = "member"
 
-        u.annual_allowance = days
-        u.role = role
+        team_id = request.form.get("team_id", type=int)
+        if team_id is not None and not db.get(Team, team_id):
+            team_id = None
+        diff = changes(
+            u,
+            annual_allowance=days,
+            role=role,
+            country=(request.form.get("country") or "").strip().upper() or None,
+            team_id=team_id,
+        )
+        if diff:
+            audit(db, "user", u.id, "edit", **diff)
+        if "team_id" in diff:
+            # kërkesat e përdoruesit ndjekin ekipin e tij (radhët dhe faqet e menaxherëve)
+            db.execute(update(Vacation).where(Vacation.user_id == u.id).values(team_id=team_id))
+            bump_version(db, "report")
+        if "annual_allowance" in diff:
+            record_balance(db, u.id, "allowance_set", days)
+        if "country" in diff:
+            # festat dhe fundjavat e shtetit të ri: ditët, copat dhe raportet e kërkesave të tij
+            _recompute_batch(db, _recompute_query(db).filter(Vacation.user_id == u.id).all())
         db.commit()
         db.close()
         flash("Ditët dhe roli u perditsuan.", "success")
@@ -1062,92 +4069,23 @@ def admin_edit_user(uid):
     email = u.email
     current_days = u.annual_allowance or 0
     current_role = u.role
+    current_country = u.country or ""
+    current_team = u.team_id
+    countries = [c for (c,) in db.query(WorkCalendar.country).order_by(WorkCalendar.country)]
+    teams = db.execute(select(Team.id, Team.name).order_by(Team.name)).all()
     db.close()
 
     return render_template_string("""
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Edito përdoruesin</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: #f3f4f6;
-      color: #111827;
-    }
-    header {
-      background: #111827;
-      color: #fff;
-      padding: 12px 24px;
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-    }
-    header a { color: #e5e7eb; text-decoration: none; font-size: 14px; }
-    .container {
-      max-width: 520px;
-      margin: 24px auto 32px;
-      padding: 0 16px;
-    }
-    .card {
-      background: #fff;
-      border-radius: 14px;
-      padding: 20px 20px 16px;
-      box-shadow: 0 4px 14px rgba(15,23,42,.08);
-    }
-    h2 { margin: 0 0 6px; }
-    .subtitle {
-      font-size: 13px;
-      color: #6b7280;
-      margin-bottom: 16px;
-    }
-    label {
-      display: block;
-      font-size: 13px;
-      color: #4b5563;
-      margin-bottom: 4px;
-    }
-    input, select {
-      width: 100%;
-      padding: 9px 10px;
-      border-radius: 10px;
-      border: 1px solid #d1d5db;
-      font-size: 14px;
-      margin-bottom: 12px;
-    }
-    input[disabled] {
-      background: #f9fafb;
-      color: #6b7280;
-    }
-    button {
-      border: none;
-      border-radius: 999px;
-      padding: 9px 18px;
-      font-size: 14px;
-      font-weight: 500;
-      background: #111827;
-      color: #fff;
-      cursor: pointer;
-      margin-top: 4px;
-    }
-  </style>
-</head>
-<body>
-<header>
-  <div>Vacation Planner – Admin</div>
-  <a href="{{ url_for('admin_dashboard') }}">⬅ Kthehu te admin</a>
-</header>
-
-<div class="container">
+{% extends "base.html" %}
+{% block title %}Edito përdoruesin{% endblock %}
+{% block header_title %}Vacation Planner – Admin{% endblock %}
+{% block container_class %}container-narrow{% endblock %}
+{% block content %}
   <div class="card">
     <h2>Edito përdoruesin</h2>
     <div class="subtitle">Ndrysho rolin ose lejen vjetore për këtë përdorues.</div>
 
-    <form method="post">
+    <form method="post" class="form-stack">
       <label>Emri</label>
       <input type="text" value="{{ name }}" disabled>
 
@@ -1157,40 +4095,53 @@ def admin_edit_user(uid):
       <label>Roli</label>
       <select name="role">
         <option value="member" {% if current_role == 'member' %}selected{% endif %}>Member</option>
+        <option value="manager" {% if current_role == 'manager' %}selected{% endif %}>Manager</option>
         <option value="admin" {% if current_role == 'admin' %}selected{% endif %}>Admin</option>
       </select>
 
+      <label>Ekipi</label>
+      <select name="team_id">
+        <option value="">Pa ekip</option>
+        {% for t in teams %}
+          <option value="{{ t.id }}" {% if t.id == current_team %}selected{% endif %}>{{ t.name }}</option>
+        {% endfor %}
+      </select>
+
       <label>Leje vjetore (ditë)</label>
       <input type="number" step="0.0001" name="days" value="{{ current_days }}">
 
-      <button type="submit">Ruaj ndryshimet</button>
+      <label>Kalendari i festave (shteti)</label>
+      <input type="text" name="country" maxlength="8" list="countries" value="{{ current_country }}"
+             placeholder="bosh = shteti i paracaktuar">
+      <datalist id="countries">
+        {% for c in countries %}<option value="{{ c }}">{% endfor %}
+      </datalist>
+
+      <button class="btn" type="submit">Ruaj ndryshimet</button>
     </form>
-    <div style="margin-top:18px; padding-top:12px; border-top:1px solid #e5e7eb;">
-      <div style="font-size:13px; color:#b91c1c; font-weight:600; margin-bottom:6px;">
-        Zona e rrezikshme
-      </div>
+    <p><a class="link" href="{{ url_for('admin_user_balance', uid=uid) }}">📒 Historiku i bilancit</a></p>
+    <div class="danger-zone">
+      <div class="title">Zona e rrezikshme</div>
       <form method="post" action="{{ url_for('admin_delete_user', uid=uid) }}">
-        <button type="submit"
-                onclick="return confirm('Je i sigurt që do ta fshish këtë përdorues? Kjo veprim është i pakthyeshëm.');"
-                style="padding:8px 14px; border-radius:999px; border:none; background:#b91c1c; color:white; font-size:13px; cursor:pointer;">
+        <button type="submit" class="btn btn-sm btn-danger"
+                onclick="return confirm('Je i sigurt që do ta fshish këtë përdorues? Kjo veprim është i pakthyeshëm.');">
           Fshi përdoruesin
         </button>
       </form>
-      <form method="post" action="{{ url_for('admin_reset_pin', uid=uid) }}" style="margin-top:10px;">
-       <button type="submit"
-          style="padding:8px 14px; border-radius:999px; background:#2563eb; color:white; border:none; cursor:pointer;">
-          Reset PIN
-       </button>
+      <form method="post" action="{{ url_for('admin_reset_pin', uid=uid) }}">
+        <button type="submit" class="btn btn-sm btn-accent">Reset PIN</button>
       </form>
     </div>
   </div>
-</div>
-</body>
-</html>
+{% endblock %}
     """, name=name,
         email=email,
         current_days=current_days,
         current_role=current_role,
+        current_country=current_country,
+        current_team=current_team,
+        countries=countries,
+        teams=teams,
         uid=uid
         )
 
@@ -1209,8 +4160,11 @@ def admin_create_user():
         pin = (request.form.get("pin") or "").strip()
         days_str = (request.form.get("days") or "").strip()
         role = (request.form.get("role") or "member").strip()
-        if role not in ("member", "admin"):
+        if role not in ("member", "manager", "admin"):
             role = "member"
+        team_id = request.form.get("team_id", type=int)
+        if team_id is not None and not db.get(Team, team_id):
+            team_id = None
 
         # validime të thjeshta
         if not name or not email or not pin:
@@ -1235,107 +4189,42 @@ def admin_create_user():
         u = User(
             name=name,
             email=email,
-            pin=pin,
+            pin=hash_pin(pin),
             role=role,
             annual_allowance=days,
             carryover=0,
             first_login=True,
+            team_id=team_id,
         )
         db.add(u)
+        db.flush()
+        audit(db, "user", u.id, "create", email=email, role=role, annual_allowance=days)
+        record_balance(db, u.id, "allowance_set", days)
+        record_balance(db, u.id, "carryover_set", 0)
         db.commit()
         db.close()
         flash("Përdoruesi u krijua me sukses.", "success")
         return redirect(url_for("admin_dashboard"))
 
+    teams = db.execute(select(Team.id, Team.name).order_by(Team.name)).all()
     db.close()
     return render_template_string("""
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Shto përdorues</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: #f3f4f6;
-      color: #111827;
-    }
-    header {
-      background: #111827;
-      color: #fff;
-      padding: 12px 24px;
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-    }
-    header a { color: #e5e7eb; text-decoration: none; font-size: 14px; }
-    .container {
-      max-width: 520px;
-      margin: 24px auto 32px;
-      padding: 0 16px;
-    }
-    .card {
-      background: #fff;
-      border-radius: 14px;
-      padding: 20px 20px 16px;
-      box-shadow: 0 4px 14px rgba(15,23,42,.08);
-    }
-    h2 { margin: 0 0 14px; }
-    label {
-      display: block;
-      font-size: 13px;
-      color: #4b5563;
-      margin-bottom: 4px;
-    }
-    input {
-      width: 100%;
-      padding: 8px 10px;
-      border-radius: 10px;
-      border: 1px solid #d1d5db;
-      font-size: 14px;
-      margin-bottom: 12px;
-    }
-    button {
-      border: none;
-      border-radius: 999px;
-      padding: 8px 18px;
-      font-size: 14px;
-      font-weight: 500;
-      background: #111827;
-      color: #fff;
-      cursor: pointer;
-      margin-top: 4px;
-    }
-    .flash {
-      padding: 8px 10px;
-      border-radius: 10px;
-      margin-bottom: 10px;
-      font-size: 13px;
-      background: #fee2e2;
-      color: #b91c1c;
-    }
-  </style>
-</head>
-<body>
-<header>
-  <div>Vacation Planner – Admin</div>
-  <a href="{{ url_for('admin_dashboard') }}">⬅ Kthehu te admin</a>
-</header>
-
-<div class="container">
+{% extends "base.html" %}
+{% block title %}Shto përdorues{% endblock %}
+{% block header_title %}Vacation Planner – Admin{% endblock %}
+{% block container_class %}container-narrow{% endblock %}
+{% block flashes %}{% endblock %}
+{% block content %}
   <div class="card">
     <h2>Shto përdorues të ri</h2>
 
     {% with messages = get_flashed_messages(with_categories=true) %}
       {% for cat, msg in messages %}
-        <div class="flash">{{ msg }}</div>
+        <div class="flash {{ 'flash-ok' if cat == 'success' else 'flash-err' }}">{{ msg }}</div>
       {% endfor %}
     {% endwith %}
 
-    <form method="post">
+    <form method="post" class="form-stack">
       <label>Emri</label>
       <input type="text" name="name" required>
 
@@ -1344,31 +4233,40 @@ def admin_create_user():
 
       <label>PIN (p.sh. 4 shifra)</label>
       <input type="text" name="pin" required>
-      
+
       <label>Roli</label>
-      <select name="role" style="width:100%; padding:8px 10px; border-radius:10px; border:1px solid #d1d5db; font-size:14px; margin-bottom:12px;">
+      <select name="role">
         <option value="member">Member</option>
+        <option value="manager">Manager</option>
         <option value="admin">Admin</option>
       </select>
 
+      <label>Ekipi</label>
+      <select name="team_id">
+        <option value="">Pa ekip</option>
+        {% for t in teams %}<option value="{{ t.id }}">{{ t.name }}</option>{% endfor %}
+      </select>
+
       <label>Ditë aktuale pushimi (balanca sot)</label>
       <input type="number" step="0.0001" name="days">
 
-      <button type="submit">Krijo përdorues</button>
+      <button class="btn" type="submit">Krijo përdorues</button>
     </form>
   </div>
-</div>
-</body>
-</html>F
-    """)
+{% endblock %}
+    """, teams=teams)
+
 
+CalendarDay = namedtuple("CalendarDay", "day weekday approved pending people")
 
 @app.route("/admin/calendar")
 def admin_calendar():
     admin = get_current_user()
-    if not admin or admin.role != "admin":
+    if not can_manage(admin):
         return redirect(url_for("login"))
 
+    # kalendari merr ngjarje live nga baza primare: numërimet, emrat dhe versioni lexohen
+    # që të gjitha prej saj (jo nga kopja e raporteve, as nga indeksi në memorie)
     db = SessionLocal()
     today = date.today()
 
@@ -1379,436 +4277,1226 @@ def admin_calendar():
     last_day_num = monthrange(year, month)[1]
     last_day = date(year, month, last_day_num)
 
-    vacations = (
-        db.query(Vacation)
-        .filter(
-            Vacation.status.in_(["approved", "pending"]),
-            Vacation.start <= last_day,
-            Vacation.end >= first_day,
-        )
-        .all()
-    )
+    leave_type = request.args.get("type") or None
+    types = leave_types(db)
+    teams = team_scope(db, admin)
+    # versioni lexohet para të dhënave: ngjarjet pas tij ridërgohen nga /admin/events
+    live_version = read_version(db, "report")
+    # numërimet vijnë nga intervalet (jo nga daily_occupancy) kur filtrohet sipas llojit ose ekipit
+    count_items = bool(leave_type) or teams is not None
 
+    # numërimet: lexim intervali nga daily_occupancy (të gjitha llojet bashkë)
     approved_counts = [0] * (last_day_num + 1)
     pending_counts = [0] * (last_day_num + 1)
+    first_ord = first_day.toordinal()
+    if not count_items:
+        for row in db.execute(occupancy_select(first_day, last_day)):
+            approved_counts[row.day.day] = row.approved
+            pending_counts[row.day.day] = row.pending
+    # emrat: query intervali mbi ix_vacations_team_status_start (të gjitha ekipet kur teams është None)
+    rows = db.execute(team_out_select(teams, first_day, last_day)).all()
+    items = [(vid, s.toordinal(), e.toordinal(), *rest) for vid, s, e, *rest, _ in rows]
+    names = {r.user_id: r.name for r in rows}
+    db.close()
+
     people_by_day = [[] for _ in range(last_day_num + 1)]
+    for vid, s, e, uid, status, lt, portion, units in sorted(items, key=lambda it: it[1]):
+        if leave_type and lt != leave_type:
+            continue
+        label = names.get(uid, "?")
+        if portion not in (None, "full"):
+            label += f" ({portion_label(portion, units)})"
+        if status != "approved":
+            label += " (pending)"
+        counts = approved_counts if status == "approved" else pending_counts
+        for day in range(max(s - first_ord, 0) + 1, min(e - first_ord + 1, last_day_num) + 1):
+            people_by_day[day].append((vid, label))
+            if count_items:
+                counts[day] += 1
 
-    for v in vacations:
-        start_d = max(v.start, first_day)
-        end_d = min(v.end, last_day)
-        d = start_d
-        while d <= end_d:
-            idx = d.day
-            if v.status == "approved":
-                approved_counts[idx] += 1
-                label = f"{v.user.name}"
-            else:
-                pending_counts[idx] += 1
-                label = f"{v.user.name} (pending)"
-            people_by_day[idx].append(label)
-            d += timedelta(days=1)
+    # emrat e ditëve të javës (0 = e hënë)
+    weekday_names = ["Hënë", "Martë", "Mërkurë", "Enjte", "Premte", "Shtunë", "Diel"]
 
+    rows = [
+        CalendarDay(
+            day,
+            weekday_names[date(year, month, day).weekday()],
+            approved_counts[day],
+            pending_counts[day],
+            people_by_day[day],
+        )
+        for day in range(1, last_day_num + 1)
+    ]
+
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Kalendar pushimesh{% endblock %}
+{% block header_title %}Kalendar pushimesh{% endblock %}
+{% block container_class %}container-mid{% endblock %}
+{% block content %}
+  <div class="card">
+    <h2>{{ month }}/{{ year }}</h2>
+
+    <form method="get" class="form-inline">
+      <span>Muaji</span>
+      <input type="number" name="month" min="1" max="12" value="{{ month }}">
+      <span>Viti</span>
+      <input type="number" name="year" value="{{ year }}">
+      <select name="type">
+        <option value="">Të gjitha llojet</option>
+        {% for t in types %}
+          <option value="{{ t.code }}" {{ 'selected' if t.code == leave_type }}>{{ t.name }}</option>
+        {% endfor %}
+      </select>
+      {% if team_arg %}<input type="hidden" name="team" value="{{ team_arg }}">{% endif %}
+      <button type="submit">Shfaq</button>
+    </form>
+
+    <table>
+      <tr>
+        <th>Dita</th>
+        <th>Dita e javës</th>
+        <th>Me pushim (approved)</th>
+        <th>Në pritje</th>
+        <th>Emrat</th>
+      </tr>
+      {% for r in rows %}
+        {% set total = r.approved %}
+        {% if total == 0 %}
+          {% set cls = 'pill-ok' %}
+        {% elif total <= 2 %}
+          {% set cls = 'pill-warn' %}
+        {% else %}
+          {% set cls = 'pill-hot' %}
+        {% endif %}
+      <tr data-day="{{ r.day }}">
+        <td>{{ r.day }}</td>
+        <td>{{ r.weekday }}</td>
+        <td><span class="pill {{ cls }}" data-approved="{{ r.approved }}">{{ r.approved }}</span></td>
+        <td data-pending="{{ r.pending }}">{{ r.pending }}</td>
+        <td class="people-list">
+          {% for vid, label in r.people %}
+            <div data-vid="{{ vid }}">{{ label }}</div>
+          {% endfor %}
+          <span class="muted" {{ 'hidden' if r.people }}>-</span>
+        </td>
+      </tr>
+      {% endfor %}
+    </table>
+  </div>
+{% endblock %}
+{% block scripts %}
+<script src="{{ static_url('live.js') }}"></script>
+<script>
+  liveCalendar({
+    events: {{ url_for('admin_events', team=team_arg, since=live_version)|tojson }},
+    year: {{ year }},
+    month: {{ month }},
+    leaveType: {{ leave_type|tojson }}
+  });
+</script>
+{% endblock %}
+    """,
+        year=year,
+        month=month,
+        rows=rows,
+        live_version=live_version,
+        leave_type=leave_type,
+        types=types,
+        team_arg=request.args.get("team", type=int),
+    )
+
+
+@app.route("/admin/occupancy")
+def admin_occupancy():
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
+
+    year = request.args.get("year", type=int) or date.today().year
+    db = ReportSession()
+    # ngarkesa në ditë-njeri: një gjysmë dite vlen 0.5, jo një person të plotë
+    counts = {
+        row.day: (units_to_days(row.approved_units), units_to_days(row.pending_units))
+        for row in db.execute(occupancy_select(date(year, 1, 1), date(year, 12, 31)))
+    }
+    db.close()
+
+    # rrjetë 12 x 31: None për ditët që nuk ekzistojnë në muaj
+    grid = [
+        [
+            counts.get(date(year, m, d), (0, 0)) if d <= monthrange(year, m)[1] else None
+            for d in range(1, 32)
+        ]
+        for m in range(1, 13)
+    ]
+    peak = max((a for a, _ in counts.values()), default=0)
+
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Ngarkesa vjetore{% endblock %}
+{% block header_title %}Ngarkesa vjetore {{ year }}{% endblock %}
+{% block container_class %}container-wide{% endblock %}
+{% block content %}
+  <div class="card card-scroll">
+    <form method="get" class="form-inline">
+      <span>Viti</span>
+      <input type="number" name="year" value="{{ year }}">
+      <button type="submit">Shfaq</button>
+      <span class="muted">Maksimumi: {{ peak|days }} ditë-njeri pushim në një ditë</span>
+    </form>
+    <table class="numeric">
+      <tr><th>Muaji</th>{% for d in range(1, 32) %}<th>{{ d }}</th>{% endfor %}</tr>
+      {% for row in grid %}
+        <tr>
+          <td><a class="link" href="{{ url_for('admin_calendar', year=year, month=loop.index) }}">{{ loop.index }}</a></td>
+          {% for cell in row %}
+            {% if cell is none %}
+              <td></td>
+            {% else %}
+              {% set a, p = cell %}
+              <td title="{{ a|days }} approved, {{ p|days }} në pritje (ditë-njeri)">
+                {% if a == 0 %}<span class="muted">{{ '·' if p == 0 else p|days ~ '?' }}</span>
+                {% else %}<span class="pill {{ 'pill-warn' if a <= 2 else 'pill-hot' }}">{{ a|days }}</span>{% endif %}
+              </td>
+            {% endif %}
+          {% endfor %}
+        </tr>
+      {% endfor %}
+    </table>
+  </div>
+{% endblock %}
+""",
+        year=year,
+        grid=grid,
+        peak=peak,
+    )
+
+
+@app.route("/toggle-theme")
+def toggle_theme():
+    current = session.get("theme", "light")
+    session["theme"] = "dark" if current == "light" else "light"
+    # kthehu te faqja e mëparshme
+    ref = request.headers.get("Referer") or url_for("me")
+    return redirect(ref)
+
+@app.route("/admin/holidays", methods=["GET", "POST"])
+def admin_holidays():
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
+
+    db = SessionLocal()
+    country = (request.values.get("country") or default_country(db)).strip().upper()
+    year = int(request.values.get("year", date.today().year))
+
+    if request.method == "POST":
+        action = request.form.get("action")
+        if action == "add":
+            try:
+                day = datetime.strptime(request.form.get("day", ""), "%Y-%m-%d").date()
+            except ValueError:
+                db.close()
+                flash("Datë e pavlefshme.", "danger")
+                return redirect(url_for("admin_holidays", country=country, year=year))
+            exists = db.query(Holiday).filter_by(country=country, day=day).first()
+            if not exists:
+                db.add(Holiday(country=country, day=day, name=(request.form.get("name") or "").strip()))
+        elif action == "delete":
+            db.query(Holiday).filter_by(id=int(request.form.get("hid", 0)), country=country).delete()
+        elif action == "mask":
+            mask = "".join("1" if str(i) in request.form.getlist("weekend") else "0" for i in range(7))
+            db.merge(WorkCalendar(country=country, weekend_mask=mask))
+        elif action == "default":
+            db.merge(Setting(key="default_country", value=country))
+
+        bump_version(db, "workdays")
+        db.commit()
+        db.close()
+        flash("Kalendari u përditësua. Ekzekuto 'flask recompute-days' për kërkesat ekzistuese.", "success")
+        return redirect(url_for("admin_holidays", country=country, year=year))
+
+    cal = db.get(WorkCalendar, country)
+    mask = cal.weekend_mask if cal and cal.weekend_mask else DEFAULT_WEEKEND_MASK
+    holiday_rows = db.execute(
+        select(Holiday.id, Holiday.day, Holiday.name)
+        .where(
+            Holiday.country == country,
+            Holiday.day >= date(year, 1, 1),
+            Holiday.day <= date(year, 12, 31),
+        )
+        .order_by(Holiday.day)
+    ).all()
+    countries = [c for (c,) in db.query(Holiday.country).distinct()]
+    countries = sorted(set(countries) | {c for (c,) in db.query(WorkCalendar.country)} | {country})
+    is_default = default_country(db) == country
+    working = working_days(db, date(year, 1, 1), date(year, 12, 31), country)
     db.close()
 
-    # emrat e ditëve të javës (0 = e hënë)
     weekday_names = ["Hënë", "Martë", "Mërkurë", "Enjte", "Premte", "Shtunë", "Diel"]
 
-    rows = []
-    for day in range(1, last_day_num + 1):
-        dt = date(year, month, day)
-        weekday = weekday_names[dt.weekday()]
-        rows.append(
-            dict(
-                day=day,
-                weekday=weekday,
-                approved=approved_counts[day],
-                pending=pending_counts[day],
-                people=people_by_day[day],
-            )
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Festat & fundjavat{% endblock %}
+{% block header_title %}Festat & fundjavat{% endblock %}
+{% block container_class %}container-mid{% endblock %}
+{% block content %}
+  <div class="card">
+    <h2>{{ country }} – {{ year }}</h2>
+    <form method="get" class="form-inline">
+      <span>Shteti</span>
+      <input type="text" name="country" value="{{ country }}" list="countries">
+      <datalist id="countries">
+        {% for c in countries %}<option value="{{ c }}">{% endfor %}
+      </datalist>
+      <span>Viti</span>
+      <input type="number" name="year" value="{{ year }}">
+      <button type="submit">Shfaq</button>
+    </form>
+    <div class="muted">
+      {{ working }} ditë pune në {{ year }}.
+      {% if is_default %}Ky është kalendari i paracaktuar.{% endif %}
+    </div>
+    {% if not is_default %}
+    <form method="post" class="form-inline" style="margin-top:10px;">
+      <input type="hidden" name="country" value="{{ country }}">
+      <input type="hidden" name="year" value="{{ year }}">
+      <input type="hidden" name="action" value="default">
+      <button type="submit">Bëje kalendar të paracaktuar</button>
+    </form>
+    {% endif %}
+  </div>
+
+  <div class="card">
+    <h3>Fundjava</h3>
+    <form method="post" class="form-inline">
+      <input type="hidden" name="country" value="{{ country }}">
+      <input type="hidden" name="year" value="{{ year }}">
+      <input type="hidden" name="action" value="mask">
+      {% for name in weekday_names %}
+        <label><input type="checkbox" name="weekend" value="{{ loop.index0 }}" style="width:auto;"
+          {% if mask[loop.index0] == '1' %}checked{% endif %}> {{ name }}</label>
+      {% endfor %}
+      <button type="submit">Ruaj</button>
+    </form>
+  </div>
+
+  <div class="card">
+    <h3>Festat zyrtare</h3>
+    <form method="post" class="form-inline">
+      <input type="hidden" name="country" value="{{ country }}">
+      <input type="hidden" name="year" value="{{ year }}">
+      <input type="hidden" name="action" value="add">
+      <input type="date" name="day" class="wide" required>
+      <input type="text" name="name" class="wide" placeholder="Emri i festës">
+      <button type="submit">Shto</button>
+    </form>
+    <table>
+      <tr>
+        <th>Data</th>
+        <th>Dita</th>
+        <th>Festa</th>
+        <th></th>
+      </tr>
+      {% for h in holiday_rows %}
+      <tr>
+        <td>{{ h.day }}</td>
+        <td>{{ weekday_names[h.day.weekday()] }}</td>
+        <td>{{ h.name }}</td>
+        <td>
+          <form method="post" class="form-inline" style="margin:0;">
+            <input type="hidden" name="country" value="{{ country }}">
+            <input type="hidden" name="year" value="{{ year }}">
+            <input type="hidden" name="action" value="delete">
+            <input type="hidden" name="hid" value="{{ h.id }}">
+            <button type="submit" class="danger">Fshi</button>
+          </form>
+        </td>
+      </tr>
+      {% endfor %}
+    </table>
+  </div>
+{% endblock %}
+        """,
+        country=country,
+        year=year,
+        countries=countries,
+        is_default=is_default,
+        mask=mask,
+        holiday_rows=holiday_rows,
+        working=working,
+        weekday_names=weekday_names,
+    )
+
+
+@app.route("/admin/report")
+def admin_report():
+    admin = get_current_user()
+    if not can_manage(admin):
+        return redirect(url_for("login"))
+
+    db = SessionLocal()
+    today = date.today()
+    year = int(request.args.get("year", today.year))
+
+    top = int(request.args.get("top", REPORT_TOP_USERS))
+    leave_type = request.args.get("type") or None
+    types = leave_types(db)
+    db.close()
+
+    # faqja është vetëm "shell"; të dhënat vijnë nga admin_report_data
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Raport pushimesh{% endblock %}
+{% block header_title %}Raport pushimesh{% endblock %}
+{% block head %}<script src="{{ static_url('vendor/chartjs/chart.umd.min.js') }}"></script>{% endblock %}
+{% block content %}
+  <div class="card">
+    <h2>Viti {{ year }}</h2>
+    <form method="get" class="form-inline">
+      <label>Viti</label>
+      <input type="number" name="year" value="{{ year }}">
+      <select name="type">
+        <option value="">Të gjitha llojet</option>
+        {% for t in types %}
+          <option value="{{ t.code }}" {{ 'selected' if t.code == leave_type }}>{{ t.name }}</option>
+        {% endfor %}
+      </select>
+      {% if team_arg %}<input type="hidden" name="team" value="{{ team_arg }}">{% endif %}
+      <button type="submit">Shfaq</button>
+    </form>
+    {% if is_admin %}
+    <a href="{{ url_for('admin_report_trend') }}" class="link">📈 Trendi shumëvjeçar</a>
+    {% endif %}
+  </div>
+
+  <div class="card">
+    <h3>Dite pushimi per muaj</h3>
+    <canvas id="byMonth"></canvas>
+  </div>
+
+  <div class="card">
+    <h3>Dite pushimi per person</h3>
+    <canvas id="byUser"></canvas>
+  </div>
+{% endblock %}
+{% block scripts %}
+<script>
+  fetch({{ url_for('admin_report_data', year=year, top=top, type=leave_type, team=team_arg)|tojson }}, { credentials: 'same-origin' })
+    .then(r => r.json())
+    .then(data => {
+      new Chart(document.getElementById('byMonth'), {
+        type: 'bar',
+        data: {
+          labels: data.months.labels,
+          datasets: [{
+            label: 'Ditë pushimi',
+            data: data.months.data,
+          }]
+        }
+      });
+
+      new Chart(document.getElementById('byUser'), {
+        type: 'bar',
+        data: {
+          labels: data.users.labels,
+          datasets: [{
+            label: 'Ditë pushimi',
+            data: data.users.data,
+          }]
+        },
+        options: {
+          indexAxis: 'y'
+        }
+      });
+    });
+</script>
+{% endblock %}
+        """,
+        year=year,
+        top=top,
+        leave_type=leave_type,
+        types=types,
+        team_arg=request.args.get("team", type=int),
+        is_admin=admin.role == "admin",
+    )
+
+
+@app.route("/admin/report/data.json")
+def admin_report_data():
+    admin = get_current_user()
+    if not can_manage(admin):
+        return {"error": "unauthorized"}, 401
+
+    year = int(request.args.get("year", date.today().year))
+    top = max(int(request.args.get("top", REPORT_TOP_USERS)), 0)
+    columnar = request.args.get("columnar", "1") != "0"
+    leave_type = request.args.get("type") or None
+
+    db = ReportSession()
+    body, etag = report_payload(db, year, top, columnar, leave_type, team_scope(db, admin))
+    db.close()
+
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(body)
+        resp.headers["Content-Type"] = "application/json; charset=utf-8"
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
+
+
+@app.route("/admin/report/trend")
+def admin_report_trend():
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
+
+    today = date.today()
+    n_years = min(max(int(request.args.get("years", 5)), 1), 30)
+    years = list(range(today.year - n_years + 1, today.year + 1))
+
+    # vetëm viti aktual llogaritet nga pushimet; të tjerët vijnë nga cache-i
+    db = ReportSession()
+    aggs = [year_aggregates(db, y) for y in years]
+    db.close()
+
+    month_rows = [dict(year=a["year"], months=a["months"], total=sum(a["months"])) for a in aggs]
+    status_rows = [dict(year=a["year"], **a["statuses"]) for a in aggs]
+
+    # përdoruesit: ditë për çdo vit, renditur sipas totalit
+    per_user = {}
+    for i, a in enumerate(aggs):
+        for uid, u in a["users"].items():
+            row = per_user.setdefault(uid, {"name": u["name"], "days": [0] * len(years)})
+            row["days"][i] = u["days"]
+    user_rows = sorted(per_user.values(), key=lambda r: sum(r["days"]), reverse=True)
+
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Trendi i pushimeve{% endblock %}
+{% block header_title %}Trendi i pushimeve{% endblock %}
+{% block nav %}<a href="{{ url_for('admin_report') }}">⬅ Kthehu te raporti</a>{% endblock %}
+{% block head %}<script src="{{ static_url('vendor/chartjs/chart.umd.min.js') }}"></script>{% endblock %}
+{% block content %}
+  <div class="card">
+    <h2>{{ years[0] }} – {{ years[-1] }}</h2>
+    <form method="get" class="form-inline">
+      <label>Vite</label>
+      <input type="number" name="years" min="1" max="30" value="{{ years|length }}">
+      <button type="submit">Shfaq</button>
+    </form>
+    <canvas id="byYear"></canvas>
+  </div>
+
+  <div class="card card-scroll">
+    <h3>Ditë të aprovuara për muaj</h3>
+    <table class="numeric">
+      <tr>
+        <th>Viti</th>
+        {% for m in range(1, 13) %}<th>{{ m }}</th>{% endfor %}
+        <th>Totali</th>
+      </tr>
+      {% for r in month_rows %}
+      <tr>
+        <td>{{ r.year }}</td>
+        {% for d in r.months %}<td>{{ d }}</td>{% endfor %}
+        <td><strong>{{ r.total }}</strong></td>
+      </tr>
+      {% endfor %}
+    </table>
+  </div>
+
+  <div class="card card-scroll">
+    <h3>Ditë sipas statusit</h3>
+    <table class="numeric">
+      <tr>
+        <th>Viti</th>
+        <th>Aprovuar</th>
+        <th>Në pritje</th>
+        <th>Refuzuar</th>
+      </tr>
+      {% for r in status_rows %}
+      <tr>
+        <td>{{ r.year }}</td>
+        <td>{{ r.approved }}</td>
+        <td>{{ r.pending }}</td>
+        <td>{{ r.denied }}</td>
+      </tr>
+      {% endfor %}
+    </table>
+  </div>
+
+  <div class="card card-scroll">
+    <h3>Ditë të aprovuara për person</h3>
+    <table class="numeric">
+      <tr>
+        <th>Emri</th>
+        {% for y in years %}<th>{{ y }}</th>{% endfor %}
+      </tr>
+      {% for r in user_rows %}
+      <tr>
+        <td>{{ r.name }}</td>
+        {% for d in r.days %}<td>{{ d }}</td>{% endfor %}
+      </tr>
+      {% endfor %}
+    </table>
+  </div>
+{% endblock %}
+{% block scripts %}
+<script>
+  const years = {{ years|tojson }};
+  const statusRows = {{ status_rows|tojson }};
+
+  new Chart(document.getElementById('byYear'), {
+    type: 'line',
+    data: {
+      labels: years,
+      datasets: [
+        { label: 'Aprovuar', data: statusRows.map(r => r.approved) },
+        { label: 'Në pritje', data: statusRows.map(r => r.pending) },
+        { label: 'Refuzuar', data: statusRows.map(r => r.denied) },
+      ]
+    }
+  });
+</script>
+{% endblock %}
+        """,
+        years=years,
+        month_rows=month_rows,
+        status_rows=status_rows,
+        user_rows=user_rows,
+    )
+
+
+@app.route("/admin/export-vacations")
+def admin_export_vacations():
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
+
+    db = ReportSession()
+    year = int(request.args.get("year", date.today().year))
+    data = export_vacations_csv(db, year)
+    db.close()
+
+    resp = make_response(data)
+    resp.headers["Content-Type"] = "text/csv; charset=utf-8"
+    resp.headers["Content-Disposition"] = f"attachment; filename=vacations_{year}.csv"
+    return resp
+
+@app.route("/admin/jobs", methods=["GET", "POST"])
+def admin_jobs():
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
+
+    db = SessionLocal()
+    if request.method == "POST":
+        kind = request.form.get("kind", "")
+        params = {k: v for k, v in request.form.items() if k != "kind"}
+        upload = request.files.get("file")
+        if upload and upload.filename:
+            params["csv"] = upload.read().decode("utf-8-sig", errors="replace")
+        try:
+            job_id = enqueue_job(db, kind, params, admin.id)
+        except ValueError as exc:
+            db.close()
+            flash(str(exc), "danger")
+            return redirect(url_for("admin_jobs"))
+        db.close()
+        flash(f"Puna #{job_id} u nis.", "success")
+        return redirect(url_for("admin_jobs"))
+
+    jobs = (
+        db.query(
+            Job.id, Job.kind, Job.status, Job.progress, Job.message,
+            Job.created_at, Job.finished_at, Job.result_name,
         )
+        .order_by(Job.id.desc())
+        .limit(50)
+        .all()
+    )
+    db.close()
+
+    job_rows = [
+        dict(
+            id=j.id,
+            title=JOB_KINDS.get(j.kind, (j.kind,))[0],
+            status=j.status,
+            progress=j.progress or 0,
+            message=j.message,
+            created_at=j.created_at,
+            finished_at=j.finished_at,
+            has_result=bool(j.result_name),
+        )
+        for j in jobs
+    ]
+
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Punët në sfond{% endblock %}
+{% block header_title %}Punët në sfond{% endblock %}
+{% block content %}
+  <div class="grid-2">
+    <div class="card">
+      <h3>Nis një punë</h3>
+      <form method="post" class="form-inline">
+        <input type="hidden" name="kind" value="export_vacations">
+        <span>Eksport CSV, viti</span>
+        <input type="number" name="year" value="{{ year }}">
+        <button type="submit">Nis</button>
+      </form>
+      <form method="post" class="form-inline">
+        <input type="hidden" name="kind" value="report_trend">
+        <span>Raport shumëvjeçar, vite</span>
+        <input type="number" name="years" min="1" max="30" value="10">
+        <button type="submit">Nis</button>
+      </form>
+      <form method="post" class="form-inline">
+        <input type="hidden" name="kind" value="accrual_backfill">
+        <span>Plotëso akumulimet që nga</span>
+        <input type="month" name="since" class="wide" value="{{ year }}-01">
+        <button type="submit">Nis</button>
+      </form>
+      <form method="post" class="form-inline">
+        <input type="hidden" name="kind" value="recompute_days">
+        <span>Rillogarit ditët e punës për të gjitha kërkesat</span>
+        <button type="submit">Nis</button>
+      </form>
+      <form method="post" class="form-inline">
+        <input type="hidden" name="kind" value="year_end_rollover">
+        <span>Mbyll vitin (carryover)</span>
+        <input type="number" name="year" value="{{ year - 1 }}">
+        <button type="submit">Nis</button>
+      </form>
+      <form method="post" class="form-inline">
+        <input type="hidden" name="kind" value="audit_archive">
+        <span>Arkivo auditin më të vjetër se {{ audit_days }} ditë</span>
+        <button type="submit">Nis</button>
+      </form>
+      <form method="post" class="form-inline" enctype="multipart/form-data">
+        <input type="hidden" name="kind" value="import_users">
+        <span>Import përdoruesish (name;email;pin;days;role)</span>
+        <input type="file" name="file" accept=".csv,text/csv" class="wide" required>
+        <button type="submit">Nis</button>
+      </form>
+    </div>
+
+    <div class="card">
+      <h3>Punët e fundit</h3>
+      <table>
+        <tr>
+          <th>#</th>
+          <th>Puna</th>
+          <th>Statusi</th>
+          <th>Rezultati</th>
+        </tr>
+        {% for j in job_rows %}
+        <tr data-job="{{ j.id }}" data-status="{{ j.status }}">
+          <td>{{ j.id }}</td>
+          <td>{{ j.title }}<div class="muted">{{ j.created_at.strftime('%Y-%m-%d %H:%M') }}</div></td>
+          <td class="job-status">
+            {% if j.status == 'done' %}
+              <span class="status-badge status-approved">✔ Gati</span>
+            {% elif j.status == 'failed' %}
+              <span class="status-badge status-denied">✖ Dështoi</span>
+            {% else %}
+              <span class="status-badge status-pending">⏳ {{ j.progress }}%</span>
+            {% endif %}
+          </td>
+          <td class="job-result">
+            {% if j.has_result %}
+              <a href="{{ url_for('admin_job_download', job_id=j.id) }}" class="link">⬇ Shkarko</a>
+            {% endif %}
+            {% if j.message %}<div class="muted">{{ j.message }}</div>{% endif %}
+          </td>
+        </tr>
+        {% endfor %}
+      </table>
+    </div>
+  </div>
+{% endblock %}
+{% block scripts %}
+<script>
+  // rifresko faqen vetëm kur një punë aktive përfundon
+  const active = [...document.querySelectorAll('tr[data-job]')]
+    .filter(tr => ['queued', 'running'].includes(tr.dataset.status));
+  if (active.length) {
+    const timer = setInterval(async () => {
+      for (const tr of active) {
+        const r = await fetch('{{ url_for("admin_jobs") }}/' + tr.dataset.job + '.json');
+        const job = await r.json();
+        if (job.status === 'done' || job.status === 'failed') {
+          clearInterval(timer);
+          location.reload();
+          return;
+        }
+        tr.querySelector('.job-status').innerHTML =
+          '<span class="status-badge status-pending">⏳ ' + job.progress + '%</span>';
+      }
+    }, 1500);
+  }
+</script>
+{% endblock %}
+        """,
+        job_rows=job_rows,
+        year=date.today().year,
+        audit_days=app.config["AUDIT_RETENTION_DAYS"],
+    )
+
+
+@app.route("/admin/jobs/<int:job_id>.json")
+def admin_job_status(job_id):
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return {"error": "unauthorized"}, 401
+
+    db = SessionLocal()
+    job = (
+        db.query(Job.id, Job.kind, Job.status, Job.progress, Job.message, Job.result_name)
+        .filter(Job.id == job_id)
+        .first()
+    )
+    db.close()
+    if not job:
+        return {"error": "not found"}, 404
+
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress or 0,
+        "message": job.message,
+        "download": url_for("admin_job_download", job_id=job.id) if job.result_name else None,
+    }
+
+
+@app.route("/admin/jobs/<int:job_id>/download")
+def admin_job_download(job_id):
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
+
+    db = SessionLocal()
+    job = db.get(Job, job_id)
+    if not job or job.result is None:
+        db.close()
+        flash("Rezultati nuk ekziston.", "danger")
+        return redirect(url_for("admin_jobs"))
+
+    resp = make_response(job.result)
+    resp.headers["Content-Type"] = job.result_type or "application/octet-stream"
+    resp.headers["Content-Disposition"] = f"attachment; filename={job.result_name}"
+    db.close()
+    return resp
+
+@app.route("/admin/user/<int:uid>/balance")
+def admin_user_balance(uid):
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
+
+    today = date.today()
+    try:
+        as_of = date.fromisoformat(request.args.get("as_of") or today.isoformat())
+    except ValueError:
+        as_of = today
+    year = request.args.get("year", type=int) or as_of.year
+    at = datetime.combine(as_of, datetime.max.time())
+
+    db = SessionLocal()
+    u = db.get(User, uid)
+    if not u:
+        db.close()
+        flash("Përdoruesi nuk u gjet.", "danger")
+        return redirect(url_for("admin_dashboard"))
+
+    state, _ = balance_as_of(db, uid, at)
+    y = state["years"].get(str(year), {"adjust": 0, "taken": 0})
+    events = (
+        db.query(BalanceEvent)
+        .filter(BalanceEvent.user_id == uid, BalanceEvent.ts <= at)
+        .order_by(BalanceEvent.id.desc())
+        .limit(50)
+        .all()
+    )
+    name = u.name
+    current = u.remaining(year)
+    db.close()
 
     return render_template_string(
         """
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Kalendar pushimesh</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: #f3f4f6;
-      color: #111827;
-    }
-    header {
-      background: #111827;
-      color: #fff;
-      padding: 12px 24px;
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-    }
-    header a {
-      color: #e5e7eb;
-      text-decoration: none;
-      font-size: 14px;
-    }
-    .container {
-      max-width: 800px;
-      margin: 20px auto 32px;
-      padding: 0 16px;
-    }
-    .card {
-      background: #fff;
-      border-radius: 14px;
-      padding: 18px 18px 14px;
-      box-shadow: 0 4px 14px rgba(15, 23, 42, .08);
-    }
-    h2 {
-      margin: 0 0 12px;
-      font-weight: 600;
-    }
-    form {
-      display: flex;
-      gap: 8px;
-      align-items: center;
-      margin-bottom: 14px;
-      flex-wrap: wrap;
-      font-size: 13px;
-    }
-    form input {
-      padding: 6px 8px;
-      border-radius: 10px;
-      border: 1px solid #d1d5db;
-      font-size: 13px;
-      width: 90px;
-    }
-    form button {
-      padding: 6px 12px;
-      border-radius: 999px;
-      border: none;
-      background: #111827;
-      color: #fff;
-      font-size: 13px;
-      cursor: pointer;
-    }
-    table {
-      width: 100%;
-      border-collapse: collapse;
-      font-size: 13px;
-    }
-    th, td {
-      padding: 8px 10px;
-      border-bottom: 1px solid #e5e7eb;
-      text-align: left;
-      vertical-align: top;
-    }
-    th {
-      background: #f9fafb;
-      font-weight: 600;
-      color: #374151;
-    }
-    .pill {
-      display: inline-block;
-      min-width: 24px;
-      text-align: center;
-      padding: 2px 8px;
-      border-radius: 999px;
-      font-size: 12px;
-      font-weight: 500;
-    }
-    .pill-ok { background: #dcfce7; color: #166534; }
-    .pill-warn { background: #fef3c7; color: #92400e; }
-    .pill-hot { background: #fee2e2; color: #b91c1c; }
-    .people-list div {
-      font-size: 12px;
-      color: #374151;
-    }
-  </style>
-</head>
-<body>
-<header>
-  <div>Kalendar pushimesh</div>
-  <a href="{{ url_for('admin_dashboard') }}">⬅ Kthehu te admin</a>
-</header>
-
-<div class="container">
+{% extends "base.html" %}
+{% block title %}Bilanci – {{ name }}{% endblock %}
+{% block header_title %}Vacation Planner – Admin{% endblock %}
+{% block container_class %}container-mid{% endblock %}
+{% block content %}
   <div class="card">
-    <h2>{{ month }}/{{ year }}</h2>
-
-    <form method="get">
-      <span>Muaji</span>
-      <input type="number" name="month" min="1" max="12" value="{{ month }}">
-      <span>Viti</span>
-      <input type="number" name="year" value="{{ year }}">
+    <h2>Bilanci i {{ name }}</h2>
+    <form method="get" class="form-inline">
+      Më datë <input type="date" name="as_of" value="{{ as_of }}" class="wide">
+      për vitin <input type="number" name="year" value="{{ year }}">
       <button type="submit">Shfaq</button>
     </form>
-
+    <div class="grid-4">
+      <div class="stat"><div class="stat-label">Leje + carryover</div><div class="stat-value">{{ state.allowance + state.carryover }}</div></div>
+      <div class="stat"><div class="stat-label">Akumulime/korrigjime</div><div class="stat-value">{{ '%.2f'|format(y.adjust) }}</div></div>
+      <div class="stat"><div class="stat-label">Të marra</div><div class="stat-value">{{ y.taken }}</div></div>
+      <div class="stat"><div class="stat-label">Mbetur më {{ as_of }}</div><div class="stat-value">{{ '%.2f'|format(remaining) }}</div></div>
+    </div>
+    <div class="muted">Sot: {{ '%.2f'|format(current) }} ditë të mbetura për {{ year }}.</div>
+  </div>
+  <div class="card card-scroll">
+    <h3>Lëvizjet deri më {{ as_of }}</h3>
     <table>
-      <tr>
-        <th>Dita</th>
-        <th>Dita e javës</th>
-        <th>Me pushim (approved)</th>
-        <th>Në pritje</th>
-        <th>Emrat</th>
-      </tr>
-      {% for r in rows %}
-        {% set total = r.approved %}
-        {% if total == 0 %}
-          {% set cls = 'pill-ok' %}
-        {% elif total <= 2 %}
-          {% set cls = 'pill-warn' %}
-        {% else %}
-          {% set cls = 'pill-hot' %}
-        {% endif %}
-      <tr>
-        <td>{{ r.day }}</td>
-        <td>{{ r.weekday }}</td>
-        <td><span class="pill {{ cls }}">{{ r.approved }}</span></td>
-        <td>{{ r.pending }}</td>
-        <td class="people-list">
-          {% if r.people %}
-            {% for p in r.people %}
-              <div>{{ p }}</div>
-            {% endfor %}
-          {% else %}
-            -
-          {% endif %}
-        </td>
-      </tr>
+      <tr><th>Koha (UTC)</th><th>Lloji</th><th>Viti</th><th>Sasia</th></tr>
+      {% for e in events %}
+        <tr>
+          <td>{{ e.ts.strftime('%Y-%m-%d %H:%M') }}</td>
+          <td><span class="tag">{{ e.kind }}</span></td>
+          <td>{{ e.year or '' }}</td>
+          <td>{{ e.amount }}</td>
+        </tr>
+      {% else %}
+        <tr><td colspan="4" class="muted">Asnjë lëvizje.</td></tr>
       {% endfor %}
     </table>
   </div>
-</div>
-</body>
-</html>
-    """,
+{% endblock %}
+""",
+        name=name,
+        as_of=as_of.isoformat(),
         year=year,
-        month=month,
-        rows=rows,
+        state=state,
+        y=y,
+        remaining=balance_remaining(state, year),
+        current=current,
+        events=events,
     )
-@app.route("/toggle-theme")
-def toggle_theme():
-    current = session.get("theme", "light")
-    session["theme"] = "dark" if current == "light" else "light"
-    # kthehu te faqja e mëparshme
-    ref = request.headers.get("Referer") or url_for("me")
-    return redirect(ref)
 
-@app.route("/admin/report")
-def admin_report():
+
+@app.route("/api/out")
+def api_out():
+    """Kush mungon më ?date=D ose në ?from=A&to=B (opsionale ?status= dhe ?type=)."""
+    token = app.config["API_TOKEN"]
+    if not (token and hmac.compare_digest(request.headers.get("X-API-Token", ""), token)):
+        admin = get_current_user()
+        if not admin or admin.role != "admin":
+            return {"error": "unauthorized"}, 401
+
+    try:
+        first = date.fromisoformat(request.args.get("date") or request.args["from"])
+        last = date.fromisoformat(request.args.get("date") or request.args.get("to") or first.isoformat())
+    except (KeyError, ValueError):
+        return {"error": "Përdor ?date=YYYY-MM-DD ose ?from=YYYY-MM-DD&to=YYYY-MM-DD"}, 400
+    if last < first:
+        first, last = last, first
+    status = request.args.get("status")
+    leave_type = request.args.get("type")
+
+    idx = out_index()
+    out = [
+        {
+            "vacation_id": vid,
+            "user_id": uid,
+            "name": idx.names.get(uid),
+            "start": date.fromordinal(s).isoformat(),
+            "end": date.fromordinal(e).isoformat(),
+            "status": st,
+            "type": lt,
+            "portion": portion or "full",
+            "days_per_day": units_to_days(day_units(portion, units)),
+        }
+        for vid, s, e, uid, st, lt, portion, units in idx.overlapping(first.toordinal(), last.toordinal())
+        if (not status or st == status) and (not leave_type or lt == leave_type)
+    ]
+    out.sort(key=lambda r: (r["start"], r["name"] or ""))
+    return {"from": first.isoformat(), "to": last.isoformat(), "count": len(out), "out": out}
+
+
+AUDIT_PAGE_SIZE = 50
+
+@app.route("/admin/teams", methods=["GET", "POST"])
+def admin_teams():
     admin = get_current_user()
     if not admin or admin.role != "admin":
         return redirect(url_for("login"))
 
     db = SessionLocal()
-    today = date.today()
-    year = int(request.args.get("year", today.year))
+    if request.method == "POST":
+        tid = request.form.get("tid", type=int)
+        name = (request.form.get("name") or "").strip()
+        manager_id = request.form.get("manager_id", type=int)
+        manager = db.get(User, manager_id) if manager_id else None
+        if not name:
+            db.close()
+            flash("Emri i ekipit është i detyrueshëm.", "danger")
+            return redirect(url_for("admin_teams"))
+        if db.query(Team.id).filter(Team.name == name, Team.id != (tid or 0)).first():
+            db.close()
+            flash("Ekziston një ekip me këtë emër.", "danger")
+            return redirect(url_for("admin_teams"))
+
+        team = db.get(Team, tid) if tid else None
+        if team:
+            diff = changes(team, name=name, manager_id=manager.id if manager else None)
+            if diff:
+                audit(db, "team", team.id, "edit", **diff)
+        else:
+            team = Team(name=name, manager_id=manager.id if manager else None)
+            db.add(team)
+            db.flush()
+            audit(db, "team", team.id, "create", name=name, manager_id=team.manager_id)
+        if manager and manager.role == "member":
+            audit(db, "user", manager.id, "edit", role=[manager.role, "manager"])
+            manager.role = "manager"
+        db.commit()
+        db.close()
+        flash("Ekipi u ruajt.", "success")
+        return redirect(url_for("admin_teams"))
+
+    members = (
+        select(User.team_id, func.count(User.id).label("members"))
+        .where(User.team_id.is_not(None))
+        .group_by(User.team_id)
+        .subquery()
+    )
+    teams = db.execute(
+        select(Team.id, Team.name, Team.manager_id, func.coalesce(members.c.members, 0).label("members"))
+        .outerjoin(members, members.c.team_id == Team.id)
+        .order_by(Team.name)
+    ).all()
+    people = db.execute(select(User.id, User.name).order_by(User.name)).all()
+    db.close()
 
-    vacations = (
-        db.query(Vacation)
-        .filter(
-            Vacation.status == "approved",
-            Vacation.start <= date(year, 12, 31),
-            Vacation.end >= date(year, 1, 1),
-        )
-        .all()
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Ekipet{% endblock %}
+{% block header_title %}Ekipet{% endblock %}
+{% block container_class %}container-mid{% endblock %}
+{% block content %}
+  <div class="card">
+    <h3>Ekipet</h3>
+    <div class="muted">Menaxheri sheh dhe aprovon vetëm kërkesat e ekipit. Anëtarët caktohen te "Edito përdoruesin".</div>
+    <table>
+      <tr><th>Emri</th><th>Menaxheri</th><th>Anëtarë</th><th></th></tr>
+      {% for t in teams %}
+      <tr>
+        <form method="post">
+          <td>
+            <input type="hidden" name="tid" value="{{ t.id }}">
+            <input type="text" name="name" value="{{ t.name }}">
+          </td>
+          <td>
+            <select name="manager_id">
+              <option value="">–</option>
+              {% for p in people %}
+                <option value="{{ p.id }}" {{ 'selected' if p.id == t.manager_id }}>{{ p.name }}</option>
+              {% endfor %}
+            </select>
+          </td>
+          <td><a class="link" href="{{ url_for('admin_dashboard', team=t.id) }}">{{ t.members }}</a></td>
+          <td><button class="btn btn-sm" type="submit">Ruaj</button></td>
+        </form>
+      </tr>
+      {% endfor %}
+    </table>
+  </div>
+
+  <div class="card">
+    <h3>Shto ekip</h3>
+    <form method="post" class="form-inline">
+      <input type="text" name="name" class="wide" placeholder="Emri i ekipit" required>
+      <select name="manager_id">
+        <option value="">Pa menaxher</option>
+        {% for p in people %}<option value="{{ p.id }}">{{ p.name }}</option>{% endfor %}
+      </select>
+      <button type="submit">Shto</button>
+    </form>
+  </div>
+{% endblock %}
+        """,
+        teams=teams,
+        people=people,
     )
 
-    month_days = [0] * 13  # 1-12
-    per_user = {}
 
-    # gjithçka llogaritet sa kohë db është hapur
-    for v in vacations:
-        d = max(v.start, date(year, 1, 1))
-        end_d = min(v.end, date(year, 12, 31))
-        while d <= end_d:
-            if d.year == year:
-                month_days[d.month] += 1
-                key = v.user.name
-                per_user[key] = per_user.get(key, 0) + 1
-            d += timedelta(days=1)
+@app.route("/admin/leave-types", methods=["GET", "POST"])
+def admin_leave_types():
+    admin = get_current_user()
+    if not admin or admin.role != "admin":
+        return redirect(url_for("login"))
 
-    db.close()
+    db = SessionLocal()
+    if request.method == "POST":
+        code = (request.form.get("code") or "").strip().lower()
+        name = (request.form.get("name") or "").strip()
+        raw = (request.form.get("allowance") or "").strip()
+        try:
+            allowance = float(raw) if raw else None
+        except ValueError:
+            db.close()
+            flash("Leja duhet të jetë numër.", "danger")
+            return redirect(url_for("admin_leave_types"))
+        if not code or not name:
+            db.close()
+            flash("Kodi dhe emri janë të detyrueshëm.", "danger")
+            return redirect(url_for("admin_leave_types"))
 
-    labels_months = [str(m) for m in range(1, 13)]
-    data_months = [month_days[m] for m in range(1, 13)]
+        lt = db.get(LeaveType, code)
+        if lt:
+            lt.name = name
+            lt.allowance = allowance
+        else:
+            sort = (db.query(func.max(LeaveType.sort)).scalar() or 0) + 1
+            db.add(LeaveType(code=code, name=name, allowance=allowance, sort=sort))
+        db.commit()
+        db.close()
+        flash("Lloji i lejes u ruajt.", "success")
+        return redirect(url_for("admin_leave_types"))
 
-    user_labels = list(per_user.keys())
-    user_data = [per_user[name] for name in user_labels]
+    types = leave_types(db)
+    db.close()
 
     return render_template_string(
         """
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Raport pushimesh</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-  <style>
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: #f3f4f6;
-      color: #111827;
-    }
-    header {
-      background: #111827;
-      color: #fff;
-      padding: 12px 24px;
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-    }
-    header a { color: #e5e7eb; text-decoration: none; font-size: 14px; }
-    .container {
-      max-width: 1000px;
-      margin: 20px auto 32px;
-      padding: 0 16px;
-    }
-    .card {
-      background: #fff;
-      border-radius: 14px;
-      padding: 18px 18px 14px;
-      box-shadow: 0 4px 14px rgba(15,23,42,.08);
-      margin-bottom: 16px;
-    }
-    h2 { margin: 0 0 12px; }
-    form { margin-bottom: 10px; font-size: 13px; }
-    input {
-      padding: 6px 8px;
-      border-radius: 10px;
-      border: 1px solid #d1d5db;
-      width: 90px;
-    }
-    button {
-      padding: 6px 12px;
-      border-radius: 999px;
-      border: none;
-      background: #111827;
-      color: #fff;
-      font-size: 13px;
-      cursor: pointer;
-    }
-  </style>
-</head>
-<body>
-<header>
-  <div>Raport pushimesh</div>
-  <a href="{{ url_for('admin_dashboard') }}">⬅ Kthehu te admin</a>
-</header>
-<div class="container">
-  <div class="card">
-    <h2>Viti {{ year }}</h2>
-    <form method="get">
-      <label>Viti</label>
-      <input type="number" name="year" value="{{ year }}">
-      <button type="submit">Shfaq</button>
-    </form>
-  </div>
-
+{% extends "base.html" %}
+{% block title %}Llojet e lejes{% endblock %}
+{% block header_title %}Llojet e lejes{% endblock %}
+{% block container_class %}container-mid{% endblock %}
+{% block content %}
   <div class="card">
-    <h3>Dite pushimi per muaj</h3>
-    <canvas id="byMonth"></canvas>
+    <h3>Llojet</h3>
+    <div class="muted">
+      "{{ annual }}" ndjek lejen vjetore të secilit përdorues; për llojet e tjera leja është e njëjtë për të gjithë.
+      Bosh = pa kufi.
+    </div>
+    <table>
+      <tr><th>Kodi</th><th>Emri</th><th>Ditë në vit</th><th></th></tr>
+      {% for t in types %}
+      <tr>
+        <form method="post">
+          <td><code>{{ t.code }}</code><input type="hidden" name="code" value="{{ t.code }}"></td>
+          <td><input type="text" name="name" value="{{ t.name }}"></td>
+          <td>
+            {% if t.code == annual %}–<input type="hidden" name="allowance" value="">
+            {% else %}<input type="number" step="0.5" name="allowance" value="{{ t.allowance if t.allowance is not none else '' }}">{% endif %}
+          </td>
+          <td><button class="btn btn-sm" type="submit">Ruaj</button></td>
+        </form>
+      </tr>
+      {% endfor %}
+    </table>
   </div>
 
   <div class="card">
-    <h3>Dite pushimi per person</h3>
-    <canvas id="byUser"></canvas>
+    <h3>Shto lloj</h3>
+    <form method="post" class="form-inline">
+      <input type="text" name="code" class="wide" placeholder="kodi (p.sh. parental)" required>
+      <input type="text" name="name" class="wide" placeholder="Emri" required>
+      <input type="number" step="0.5" name="allowance" placeholder="Ditë">
+      <button type="submit">Shto</button>
+    </form>
   </div>
-</div>
-
-<script>
-  const labelsMonths = {{ labels_months|tojson }};
-  const dataMonths = {{ data_months|tojson }};
-  const labelsUsers = {{ user_labels|tojson }};
-  const dataUsers = {{ data_users|tojson }};
-
-  new Chart(document.getElementById('byMonth'), {
-    type: 'bar',
-    data: {
-      labels: labelsMonths,
-      datasets: [{
-        label: 'Ditë pushimi',
-        data: dataMonths,
-      }]
-    }
-  });
-
-  new Chart(document.getElementById('byUser'), {
-    type: 'bar',
-    data: {
-      labels: labelsUsers,
-      datasets: [{
-        label: 'Ditë pushimi',
-        data: dataUsers,
-      }]
-    },
-    options: {
-      indexAxis: 'y'
-    }
-  });
-</script>
-</body>
-</html>
+{% endblock %}
         """,
-        year=year,
-        labels_months=labels_months,
-        data_months=data_months,
-        user_labels=user_labels,
-        data_users=user_data,
+        types=types,
+        annual=ANNUAL_LEAVE,
     )
 
 
-@app.route("/admin/export-vacations")
-def admin_export_vacations():
+@app.route("/admin/audit")
+def admin_audit():
     admin = get_current_user()
     if not admin or admin.role != "admin":
         return redirect(url_for("login"))
 
-    db = SessionLocal()
-    year = int(request.args.get("year", date.today().year))
-
-    vqs = (
-        db.query(Vacation)
-        .filter(
-            Vacation.start >= date(year, 1, 1),
-            Vacation.start <= date(year, 12, 31),
-        )
-        .order_by(Vacation.start)
-        .all()
-    )
-
-    # mbledhim të dhënat sa kohë sesioni është hapur
-    rows = []
-    for v in vqs:
-        rows.append(
-            dict(
-                name=v.user.name,
-                email=v.user.email,
-                start=v.start.isoformat(),
-                end=v.end.isoformat(),
-                days=v.days,
-                status=v.status,
-            )
-        )
+    entity = request.args.get("entity") or None
+    entity_id = request.args.get("entity_id", type=int)
+    before = request.args.get("before", type=int)
 
+    db = SessionLocal()
+    q = db.query(AuditEvent)
+    if entity:
+        q = q.filter(AuditEvent.entity == entity)
+        if entity_id is not None:
+            q = q.filter(AuditEvent.entity_id == entity_id)
+    # faqosje me çelës (id < before): çdo faqe kushton njësoj, sado thellë
+    if before:
+        q = q.filter(AuditEvent.id < before)
+    events = q.order_by(AuditEvent.id.desc()).limit(AUDIT_PAGE_SIZE + 1).all()
+    has_more = len(events) > AUDIT_PAGE_SIZE
+    events = events[:AUDIT_PAGE_SIZE]
+
+    actor_ids = {e.actor_id for e in events if e.actor_id}
+    names = dict(db.query(User.id, User.name).filter(User.id.in_(actor_ids))) if actor_ids else {}
+    rows = [
+        dict(id=e.id, ts=e.ts, actor=names.get(e.actor_id, e.actor_id or "sistemi"),
+             entity=e.entity, entity_id=e.entity_id, action=e.action,
+             data=json.loads(e.data) if e.data else {})
+        for e in events
+    ]
     db.close()
 
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=";")
-    writer.writerow(["User", "Email", "Start", "End", "Days", "Status"])
-    for r in rows:
-        writer.writerow([r["name"], r["email"], r["start"], r["end"], r["days"], r["status"]])
+    return render_template_string(
+        """
+{% extends "base.html" %}
+{% block title %}Auditi{% endblock %}
+{% block header_title %}Vacation Planner – Auditi{% endblock %}
+{% block container_class %}container-wide{% endblock %}
+{% block content %}
+  <div class="card card-scroll">
+    <h2>Historiku i ndryshimeve</h2>
+    <form method="get" class="form-inline">
+      <select name="entity">
+        <option value="">Të gjitha</option>
+        <option value="vacation" {{ 'selected' if entity == 'vacation' }}>Pushime</option>
+        <option value="user" {{ 'selected' if entity == 'user' }}>Përdorues</option>
+      </select>
+      <input type="number" name="entity_id" placeholder="ID" value="{{ entity_id or '' }}">
+      <button type="submit">Filtro</button>
+    </form>
+    <table>
+      <tr><th>Koha (UTC)</th><th>Kush</th><th>Objekti</th><th>Veprimi</th><th>Detaje</th></tr>
+      {% for r in rows %}
+        <tr>
+          <td>{{ r.ts.strftime('%Y-%m-%d %H:%M:%S') }}</td>
+          <td>{{ r.actor }}</td>
+          <td><a class="link" href="{{ url_for('admin_audit', entity=r.entity, entity_id=r.entity_id) }}">{{ r.entity }} #{{ r.entity_id }}</a></td>
+          <td><span class="tag">{{ r.action }}</span></td>
+          <td class="muted">
+            {% for k, val in r.data.items() %}
+              {{ k }}: {% if val is sequence and val is not string %}{{ val[0] }} → {{ val[1] }}{% else %}{{ val }}{% endif %}{% if not loop.last %}, {% endif %}
+            {% endfor %}
+          </td>
+        </tr>
+      {% else %}
+        <tr><td colspan="5" class="muted">Asnjë ngjarje.</td></tr>
+      {% endfor %}
+    </table>
+    {% if has_more %}
+      <p><a class="btn btn-sm" href="{{ url_for('admin_audit', entity=entity, entity_id=entity_id, before=rows[-1].id) }}">Më të vjetra →</a></p>
+    {% endif %}
+  </div>
+{% endblock %}
+""",
+        rows=rows,
+        entity=entity,
+        entity_id=entity_id,
+        has_more=has_more,
+    )
 
-    resp = make_response(output.getvalue().encode("utf-8-sig"))
-    resp.headers["Content-Type"] = "text/csv; charset=utf-8"
-    resp.headers["Content-Disposition"] = f"attachment; filename=vacations_{year}.csv"
-    return resp
 
 @app.route("/admin/user/<int:uid>/delete", methods=["POST"])
 def admin_delete_user(uid):
@@ -1838,9 +5526,16 @@ def admin_delete_user(uid):
         return redirect(url_for("admin_edit_user", uid=uid))
 
     # fshij të dhënat e lidhura (pushime + adjustments)
+    for v in db.query(Vacation).filter_by(user_id=uid):
+        vacation_changed(db, v, deleted=True, old_status=v.status)
     db.query(Vacation).filter_by(user_id=uid).delete()
     db.query(Adjustment).filter_by(user_id=uid).delete()
+    db.query(ReportAggregate).delete()
+    bump_version(db, "report")
+    db.query(CalendarEvent).filter_by(user_id=uid).delete()
+    db.query(Team).filter_by(manager_id=uid).update({"manager_id": None})
 
+    audit(db, "user", u.id, "delete", email=u.email)
     db.delete(u)
     db.commit()
     db.close()
@@ -1850,6 +5545,14 @@ def admin_delete_user(uid):
 
 @app.route("/force-change-pin", methods=["GET", "POST"])
 def force_change_pin():
+    if request.method == "POST":
+        limit_key = f"{session.get('uid')}:{client_ip()}"
+        if pin_change_limiter.blocked(limit_key):
+            resp = make_response("Shumë përpjekje. Provo përsëri pas pak minutash.", 429)
+            resp.headers["Retry-After"] = str(app.config["LOGIN_LIMIT_WINDOW"])
+            return resp
+        pin_change_limiter.hit(limit_key)
+
     u = get_current_user()
     if not u:
         return redirect(url_for("login"))
@@ -1862,8 +5565,9 @@ def force_change_pin():
         else:
             db = SessionLocal()
             user = db.get(User, u.id)
-            user.pin = new_pin
+            user.pin = hash_pin(new_pin)
             user.first_login = False
+            audit(db, "user", user.id, "pin_change")
             db.commit()
             db.close()
 
@@ -1872,87 +5576,12 @@ def force_change_pin():
 
     return render_template_string(
         """
-<!doctype html>
-<html lang="sq">
-<head>
-  <meta charset="utf-8">
-  <title>Ndrysho PIN-in</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      background: #f3f4f6;
-      color: #111827;
-    }
-    header {
-      background: #111827;
-      color: #fff;
-      padding: 12px 24px;
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-    }
-    header a { color: #e5e7eb; text-decoration: none; font-size: 14px; }
-    .container {
-      max-width: 480px;
-      margin: 32px auto 40px;
-      padding: 0 16px;
-    }
-    .card {
-      background: #fff;
-      border-radius: 14px;
-      padding: 22px 20px 18px;
-      box-shadow: 0 4px 14px rgba(15,23,42,.08);
-    }
-    h2 { margin: 0 0 8px; }
-    .subtitle {
-      font-size: 13px;
-      color: #6b7280;
-      margin-bottom: 18px;
-    }
-    label {
-      display: block;
-      font-size: 13px;
-      color: #4b5563;
-      margin-bottom: 4px;
-    }
-    input[type="password"] {
-      width: 100%;
-      padding: 9px 10px;
-      border-radius: 10px;
-      border: 1px solid #d1d5db;
-      font-size: 14px;
-      margin-bottom: 14px;
-    }
-    button {
-      border: none;
-      border-radius: 999px;
-      padding: 9px 18px;
-      font-size: 14px;
-      font-weight: 500;
-      background: #111827;
-      color: #fff;
-      cursor: pointer;
-    }
-    .flash {
-      font-size: 13px;
-      padding: 8px 10px;
-      border-radius: 10px;
-      margin-bottom: 10px;
-    }
-    .flash-danger { background:#fee2e2; color:#b91c1c; }
-    .flash-success { background:#dcfce7; color:#166534; }
-  </style>
-</head>
-<body>
-<header>
-  <div>Vacation Planner</div>
-  <div style="font-size:14px;">{{ name }}</div>
-</header>
-
-<div class="container">
+{% extends "base.html" %}
+{% block title %}Ndrysho PIN-in{% endblock %}
+{% block nav %}<span class="who">{{ name }}</span>{% endblock %}
+{% block container_class %}container-xs{% endblock %}
+{% block flashes %}{% endblock %}
+{% block content %}
   <div class="card">
     <h2>Ndrysho PIN-in</h2>
     <div class="subtitle">
@@ -1961,19 +5590,17 @@ def force_change_pin():
 
     {% with messages = get_flashed_messages(with_categories=true) %}
       {% for cat, msg in messages %}
-        <div class="flash {{ 'flash-' + cat }}">{{ msg }}</div>
+        <div class="flash {{ 'flash-ok' if cat == 'success' else 'flash-err' }}">{{ msg }}</div>
       {% endfor %}
     {% endwith %}
 
-    <form method="post">
+    <form method="post" class="form-stack">
       <label>PIN i ri (min. 4 shifra)</label>
       <input type="password" name="pin" required>
-      <button type="submit">Ruaj PIN-in</button>
+      <button class="btn" type="submit">Ruaj PIN-in</button>
     </form>
   </div>
-</div>
-</body>
-</html>
+{% endblock %}
         """,
         name=u.name,
     )
@@ -1994,8 +5621,9 @@ def admin_reset_pin(uid):
     import random
     new_pin = str(random.randint(1000, 9999))
 
-    u.pin = new_pin
+    u.pin = hash_pin(new_pin)
     u.first_login = True  # detyro ta ndryshojë me hyrjen tjetër
+    audit(db, "user", u.id, "pin_reset")
 
     db.commit()
     db.close()
@@ -2003,13 +5631,320 @@ def admin_reset_pin(uid):
     return f"PIN u rivendos. PIN i ri i perkohshem: {new_pin}"
 
 
+# -------------------- KOMANDA CLI --------------------
+@app.cli.command("recompute-days")
+@click.option("--batch-size", default=1000, show_default=True)
+def recompute_days_command(batch_size):
+    """Rillogarit Vacation.days si ditë pune për të gjitha kërkesat ekzistuese."""
+    db = SessionLocal()
+    seen, changed = recompute_vacation_days(db, batch_size)
+    db.close()
+    click.echo(f"{seen} kërkesa u kontrolluan, {changed} u përditësuan.")
+
+
+@app.cli.command("tenant-create")
+@click.argument("name")
+def tenant_create_command(name):
+    """Krijon bazën e një kompanie të re në TENANTS_DIR (me adminin fillestar)."""
+    name = name.strip().lower()
+    if not app.config["TENANTS_DIR"]:
+        raise click.ClickException("Vendos VACATION_TENANTS_DIR për modalitetin multi-tenant.")
+    if not TENANT_NAME.match(name):
+        raise click.ClickException("Emri lejon vetëm a-z, 0-9 dhe '-'.")
+    if tenant_exists(name):
+        raise click.ClickException(f"Kompania '{name}' ekziston.")
+    os.makedirs(app.config["TENANTS_DIR"], exist_ok=True)
+    tenant_engine(name)
+    click.echo(f"✔ {tenant_db_path(name)}")
+
+
+@app.cli.command("tenants")
+def tenants_command():
+    """Liston kompanitë në TENANTS_DIR me madhësinë e bazës."""
+    for name in list_tenants():
+        click.echo(f"{name}\t{os.path.getsize(tenant_db_path(name)) / 1024:.0f} KB")
+
+
+@app.cli.command("outbox-dispatch")
+def outbox_dispatch_command():
+    """Dërgon njoftimet e gatshme të outbox-it për të gjitha kompanitë (p.sh. nga cron)."""
+    counts = drain_outbox(due_outbox_tenants())
+    click.echo(f"Dërguar: {counts['sent']}, për ripërpjekje: {counts['retry']}, dështuar: {counts['failed']}")
+
+
+@app.cli.command("backup")
+@click.option("--pages", default=None, type=int, help="Faqe për hap (-1 = gjithë baza njëherësh).")
+@click.option("--keep", default=None, type=int, help="Sa backup-e mbahen.")
+def backup_command(pages, keep):
+    """Krijon një backup online të verifikuar dhe rrotullon të vjetrit."""
+    started = time.perf_counter()
+    path = create_backup(pages=pages, keep=keep)
+    size = os.path.getsize(path) / 1024
+    click.echo(f"✔ {path} ({size:.0f} KB) për {time.perf_counter() - started:.2f}s")
+
+
+@app.cli.command("verify-backup")
+@click.argument("path", required=False)
+def verify_backup_command(path):
+    """Kontrollon integritetin e një backup-i (parazgjedhur: i fundit)."""
+    path = path or latest_backup()
+    if not path:
+        raise click.ClickException("Nuk ka backup-e.")
+    result = verify_backup(path)
+    if result != "ok":
+        raise click.ClickException(f"{path}: {result}")
+    click.echo(f"✔ {path}: ok")
+
+
+@app.cli.command("snapshot-reports")
+def snapshot_reports_command():
+    """Rifreskon kopjen vetëm-lexim të raporteve (p.sh. nga cron)."""
+    if not app.config["REPORT_DB"]:
+        raise click.ClickException("REPORT_DB nuk është vendosur.")
+    started = time.perf_counter()
+    refresh_report_snapshot()
+    click.echo(f"✔ {app.config['REPORT_DB']} u rifreskua për {time.perf_counter() - started:.2f}s")
+
+
+@app.cli.command("archive-audit")
+@click.option("--older-than", "older_than", default=None, type=int, help="Ditë (parazgjedhur AUDIT_RETENTION_DAYS).")
+def archive_audit_command(older_than):
+    """Zhvendos ngjarjet e vjetra të auditit në skedarë vjetorë të kompresuar."""
+    db = SessionLocal()
+    try:
+        moved = archive_audit_events(db, older_than)
+    finally:
+        db.close()
+    click.echo(f"✔ {moved} ngjarje u arkivuan në {tenant_folder(app.config['AUDIT_ARCHIVE_DIR'])}")
+
+
+@app.cli.command("ledger-bootstrap")
+def ledger_bootstrap_command():
+    """Hap librin për përdoruesit që s'e kanë ende (bëhet edhe vetë në nisje)."""
+    db = SessionLocal()
+    try:
+        started = bootstrap_ledger(db)
+    finally:
+        db.close()
+    click.echo(f"✔ Libri u hap për {started} përdorues.")
+
+
+@app.cli.command("ledger-checkpoint")
+def ledger_checkpoint_command():
+    """Shkruan një pikë kontrolli të bilancit për çdo përdorues."""
+    db = SessionLocal()
+    try:
+        n = write_balance_checkpoints(db)
+        db.commit()
+    finally:
+        db.close()
+    click.echo(f"✔ {n} pika kontrolli u shkruan.")
+
+
+@app.cli.command("year-end-rollover")
+@click.option("--year", default=None, type=int, help="Viti që mbyllet (parazgjedhur: viti i kaluar).")
+@click.option("--cap", default=None, type=float, help="Kufiri i carryover-it (parazgjedhur CARRYOVER_CAP).")
+@click.option("--batch-size", default=5000, show_default=True)
+def year_end_rollover_command(year, cap, batch_size):
+    """Kalon mbetjen e vitit në carryover; mund të rinisë pa rrezik pas një ndërprerjeje."""
+    year = year or date.today().year - 1
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        updated = year_end_rollover(db, year, cap=cap, batch_size=batch_size)
+    finally:
+        db.close()
+    if updated is None:
+        click.echo(f"Viti {year} është mbyllur më parë.")
+    else:
+        click.echo(f"✔ {updated} përdorues ({year} → {year + 1}) për {time.perf_counter() - started:.2f}s")
+
+
+@app.cli.command("expire-carryover")
+@click.option("--year", default=None, type=int, help="Viti ku skadon carryover-i (parazgjedhur: ky vit).")
+def expire_carryover_command(year):
+    """Heq carryover-in e papërdorur pas CARRYOVER_EXPIRY_MONTHS muajsh."""
+    db = SessionLocal()
+    try:
+        expired = expire_carryover(db, year or date.today().year)
+    finally:
+        db.close()
+    click.echo("Asgjë për të bërë (bërë më parë ose ende herët)." if expired is None else f"✔ {expired} përdorues.")
+
+
+@app.cli.command("rebuild-parts")
+@click.option("--batch-size", default=1000, show_default=True)
+def rebuild_parts_command(batch_size):
+    """Rindërton ndarjen e ditëve të çdo kërkese sipas muajve/viteve."""
+    db = SessionLocal()
+    try:
+        seen = rebuild_vacation_parts(db, batch_size)
+        db.query(ReportAggregate).delete()
+        bump_version(db, "report")
+        db.commit()
+    finally:
+        db.close()
+    click.echo(f"✔ {seen} kërkesa u ndanë.")
+
+
+@app.cli.command("rebuild-occupancy")
+def rebuild_occupancy_command():
+    """Rindërton tabelën daily_occupancy nga kërkesat."""
+    db = SessionLocal()
+    try:
+        n = rebuild_occupancy(db)
+    finally:
+        db.close()
+    click.echo(f"✔ daily_occupancy u rindërtua nga {n} kërkesa.")
+
+
+@app.cli.command("bench-rows")
+@click.option("--rows", "n_rows", default=10000, show_default=True)
+def bench_rows_command(n_rows):
+    """Krahason ORM-in e plotë me rreshtat Core për eksportin, në një bazë të përkohshme."""
+    # dosja dhe baza e benchmark-ut fshihen në fund, edhe kur matja dështon
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", future=True)
+        try:
+            Base.metadata.create_all(bench_engine)
+            with bench_engine.begin() as conn:
+                conn.execute(insert(User), [
+                    dict(id=i, name=f"User {i}", email=f"user{i}@example.com", pin="-", role="member")
+                    for i in range(1, 201)
+                ])
+                first = date(date.today().year, 1, 1)
+                conn.execute(insert(Vacation), [
+                    dict(user_id=i % 200 + 1, start=first + timedelta(days=i % 360),
+                         end=first + timedelta(days=i % 360 + 2), days=3, status="approved")
+                    for i in range(n_rows)
+                ])
+            year = date.today().year
+            Bench = sessionmaker(bind=bench_engine)
+
+            def orm_path():
+                db = Bench()
+                vqs = db.query(Vacation).filter(Vacation.start >= date(year, 1, 1)).order_by(Vacation.start).all()
+                out = [
+                    dict(user=v.user.name, email=v.user.email, start=v.start, end=v.end, days=v.days, status=v.status)
+                    for v in vqs
+                ]
+                db.close()
+                return len(out)
+
+            def core_path():
+                db = Bench()
+                out = db.execute(vacation_export_select(year)).all()
+                db.close()
+                return len(out)
+
+            def measure(fn):
+                fn()  # ngroh cache-t e SQLAlchemy
+                tracemalloc.start()
+                started = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                return elapsed, peak
+
+            per = 10000 / n_rows
+            results = {}
+            for label, fn in (("ORM + dict", orm_path), ("Core rows", core_path)):
+                elapsed, peak = measure(fn)
+                results[label] = (elapsed, peak)
+                click.echo(f"{label:<11} {elapsed * per * 1000:8.1f} ms / 10k   {peak * per / 1024 / 1024:7.2f} MB / 10k")
+            (t_orm, m_orm), (t_core, m_core) = results.values()
+            click.echo(f"Core: {t_orm / t_core:.1f}x më shpejt, {m_orm / m_core:.1f}x më pak memorie")
+        finally:
+            bench_engine.dispose()
+
+
+@app.cli.command("bench-pin")
+@click.option("--seconds", default=3.0, show_default=True)
+@click.option("--threads", default=None, type=int, help="Parazgjedhur: PIN_HASH_WORKERS")
+def bench_pin_command(seconds, threads):
+    """Mat sa hyrje në sekondë përballon verifikimi i PIN-it me koston e konfiguruar."""
+    threads = threads or app.config["PIN_HASH_WORKERS"]
+    stored = generate_password_hash("4821", method=app.config["PIN_HASH_METHOD"])
+
+    def run(n_threads):
+        count = 0
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker():
+            nonlocal count
+            while time.perf_counter() < deadline:
+                check_password_hash(stored, "4821")
+                with lock:
+                    count += 1
+
+        workers = [threading.Thread(target=worker) for _ in range(n_threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return count / seconds
+
+    single = run(1)
+    pooled = run(threads)
+    click.echo(f"Metoda: {stored.split('$', 1)[0]}")
+    click.echo(f"1 thread: {single:.1f} hyrje/s ({1000 / single:.1f} ms për verifikim)")
+    click.echo(f"{threads} thread-e: {pooled:.1f} hyrje/s ({pooled / threads:.1f} për thread, {pooled / single:.1f}× 1 thread)")
+
+
+@app.cli.command("bench-reads")
+@click.option("--requests", "n_requests", default=200, show_default=True)
+@click.option("--concurrency", default=8, show_default=True)
+def bench_reads_command(n_requests, concurrency):
+    """Krahason /admin me view-in sinkron dhe atë asinkron (aiosqlite) me të njëjtën ngarkesë."""
+    if get_async_engine() is None:
+        raise click.ClickException("Rruga asinkrone kërkon aiosqlite dhe flask[async].")
+    db = SessionLocal()
+    admin = db.query(User).filter(User.role == "admin").first()
+    db.close()
+    if not admin:
+        raise click.ClickException("Duhet të paktën një admin.")
+
+    def run(view):
+        app.view_functions["admin_dashboard"] = view
+        per_thread = max(n_requests // concurrency, 1)
+        latencies = []
+
+        def worker():
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess["uid"] = admin.id
+            for _ in range(per_thread):
+                started = time.perf_counter()
+                client.get("/admin")
+                latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        latencies.sort()
+        return per_thread * concurrency / (time.perf_counter() - started), latencies[len(latencies) // 2]
+
+    original = app.view_functions["admin_dashboard"]
+    try:
+        for label, view in (("sinkron:", admin_dashboard), ("asinkron:", admin_dashboard_async)):
+            rate, median = run(view)
+            click.echo(f"{label:<10} {rate:7.1f} kërkesa/s   mediana {median * 1000:6.1f} ms")
+    finally:
+        app.view_functions["admin_dashboard"] = original
+
+
 if __name__ == "__main__":
     db = SessionLocal()
     if not db.query(User).first():
         admin = User(
             name="Admin",
             email="admin@example.com",
-            pin="9999",
+            pin=hash_pin("9999"),
             role="admin",
             annual_allowance=0,
             carryover=0,
@@ -2017,7 +5952,7 @@ if __name__ == "__main__":
         member = User(
             name="Test User",
             email="test@example.com",
-            pin="1234",
+            pin=hash_pin("1234"),
             annual_allowance=0,
             carryover=0,
         )
@@ -0,0 +1,169 @@
+/* Vacation Planner – përditësime live (SSE) për dashboard-in dhe kalendarin.
+   Serveri dërgon ngjarje "vacation" për çdo krijim / ndryshim statusi / fshirje;
+   "stale" do të thotë që faqja ka humbur diçka dhe rifreskohet një herë e plotë. */
+(function () {
+  'use strict';
+
+  var STATUS = {
+    approved: ['status-approved', '✔ Aprovuar'],
+    pending: ['status-pending', '⏳ Në pritje'],
+    denied: ['status-denied', '✖ Refuzuar']
+  };
+
+  function listen(url, onVacation) {
+    if (!window.EventSource) return;
+    var source = new EventSource(url);
+    source.addEventListener('vacation', function (e) { onVacation(JSON.parse(e.data)); });
+    source.addEventListener('stale', function () {
+      source.close();
+      location.reload();
+    });
+  }
+
+  function node(tag, className, children) {
+    var el = document.createElement(tag);
+    if (className) el.className = className;
+    (children || []).forEach(function (c) {
+      el.appendChild(typeof c === 'string' ? document.createTextNode(c) : c);
+    });
+    return el;
+  }
+
+  function daysText(ev) {
+    return ev.days + (ev.part ? ' ' + ev.part : '');
+  }
+
+  // rreshtat mbahen të renditur sipas datës së fillimit, si në query-t e serverit
+  function insertSorted(table, row, start, descending) {
+    var rows = table.querySelectorAll('tr[data-vid]');
+    for (var i = 0; i < rows.length; i++) {
+      var other = rows[i].dataset.start;
+      if (descending ? other < start : other > start) {
+        rows[i].parentNode.insertBefore(row, rows[i]);
+        return;
+      }
+    }
+    (table.tBodies[0] || table).appendChild(row);
+  }
+
+  window.liveDashboard = function (opts) {
+    var vacTable = document.getElementById('vac-table');
+    var queueTable = document.getElementById('queue-table');
+    var queueEmpty = document.getElementById('queue-empty');
+    var pending = document.getElementById('pending-count');
+    var balances = document.getElementById('balances-stale');
+
+    function link(id, action, cls, text) {
+      var a = node('a', 'action-btn ' + cls, [text]);
+      a.href = opts.actionUrl.replace('/0/ACTION', '/' + id + '/' + action);
+      return a;
+    }
+
+    function badge(status) {
+      var s = STATUS[status] || STATUS.denied;
+      return node('span', 'status-badge ' + s[0], [s[1]]);
+    }
+
+    function dateCell(ev) {
+      var type = opts.typeNames[ev.leave_type] || ev.leave_type;
+      return node('td', '', [ev.start + ' → ' + ev.end + ' ', node('span', 'tag', [type])]);
+    }
+
+    function vacationRow(ev) {
+      var actions = [link(ev.id, 'approve', 'approve-btn', 'Aprovo'), link(ev.id, 'deny', 'deny-btn', 'Refuzo')];
+      if (opts.canDelete) actions.push(link(ev.id, 'delete', 'delete-btn', 'Fshi'));
+      var tr = node('tr', '', [
+        node('td', '', [ev.name + ' ', node('span', 'tag', [ev.email])]),
+        dateCell(ev),
+        node('td', '', [daysText(ev)]),
+        node('td', '', [badge(ev.status)]),
+        node('td', '', actions)
+      ]);
+      tr.dataset.vid = ev.id;
+      tr.dataset.start = ev.start;
+      return tr;
+    }
+
+    function queueRow(ev) {
+      var tr = node('tr', '', [
+        node('td', '', [ev.name]),
+        dateCell(ev),
+        node('td', '', [daysText(ev)]),
+        node('td', '', [link(ev.id, 'approve', 'approve-btn', 'Aprovo'), link(ev.id, 'deny', 'deny-btn', 'Refuzo')])
+      ]);
+      tr.dataset.vid = ev.id;
+      tr.dataset.start = ev.start;
+      return tr;
+    }
+
+    listen(opts.events, function (ev) {
+      var selector = 'tr[data-vid="' + ev.id + '"]';
+      var row = vacTable.querySelector(selector);
+      if (ev.status === null) {
+        if (row) row.remove();
+      } else if (row) {
+        row.cells[3].replaceChildren(badge(ev.status));
+      } else {
+        insertSorted(vacTable, vacationRow(ev), ev.start, true);
+      }
+
+      var queued = queueTable.querySelector(selector);
+      if (ev.status === 'pending' && !queued) {
+        insertSorted(queueTable, queueRow(ev), ev.start, false);
+      } else if (ev.status !== 'pending' && queued) {
+        queued.remove();
+      }
+      queueTable.hidden = !queueTable.querySelector('tr[data-vid]');
+      queueEmpty.hidden = !queueTable.hidden;
+
+      var count = +pending.dataset.count + (ev.status === 'pending') - (ev.old_status === 'pending');
+      pending.dataset.count = count;
+      pending.textContent = '⏳ ' + count + ' në pritje';
+      // bilancet llogariten në server: vetëm sinjalizohet që kanë ndryshuar
+      balances.hidden = false;
+    });
+  };
+
+  window.liveCalendar = function (opts) {
+    var first = Date.UTC(opts.year, opts.month - 1, 1);
+    var lastDay = new Date(Date.UTC(opts.year, opts.month, 0)).getUTCDate();
+
+    function dayOf(iso) {
+      return Math.round((Date.parse(iso) - first) / 86400000) + 1;
+    }
+
+    function shift(tr, status, delta) {
+      if (status === 'approved') {
+        var pill = tr.querySelector('[data-approved]');
+        var n = +pill.dataset.approved + delta;
+        pill.dataset.approved = n;
+        pill.textContent = n;
+        pill.className = 'pill ' + (n === 0 ? 'pill-ok' : n <= 2 ? 'pill-warn' : 'pill-hot');
+      } else if (status === 'pending') {
+        var cell = tr.querySelector('[data-pending]');
+        cell.dataset.pending = +cell.dataset.pending + delta;
+        cell.textContent = cell.dataset.pending;
+      }
+    }
+
+    listen(opts.events, function (ev) {
+      if (opts.leaveType && ev.leave_type !== opts.leaveType) return;
+      document.querySelectorAll('.people-list [data-vid="' + ev.id + '"]').forEach(function (el) { el.remove(); });
+
+      var visible = ev.status === 'approved' || ev.status === 'pending';
+      var label = ev.name + (ev.part ? ' (' + ev.part + ')' : '') + (ev.status === 'approved' ? '' : ' (pending)');
+      for (var day = Math.max(dayOf(ev.start), 1); day <= Math.min(dayOf(ev.end), lastDay); day++) {
+        var tr = document.querySelector('tr[data-day="' + day + '"]');
+        shift(tr, ev.old_status, -1);
+        shift(tr, ev.status, 1);
+        var people = tr.querySelector('.people-list');
+        if (visible) {
+          var div = node('div', '', [label]);
+          div.dataset.vid = ev.id;
+          people.insertBefore(div, people.querySelector('.muted'));
+        }
+        people.querySelector('.muted').hidden = !!people.querySelector('[data-vid]');
+      }
+    });
+  };
+})();
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# baza dhe dosjet e testeve në një dosje të përkohshme, para importit të app-it
+_tmp = tempfile.mkdtemp(prefix="vacation-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'vacation.db')}"
+os.environ["VACATION_BACKUP_DIR"] = os.path.join(_tmp, "backups")
+os.environ["AUDIT_ARCHIVE_DIR"] = os.path.join(_tmp, "audit-archive")
+os.environ["OUTBOX_INTERVAL"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as vacation_app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    vacation_app.app.config["TESTING"] = True
+    return vacation_app
+
+
+def login(client, email, pin):
+    client.post("/login", data={"email": email, "pin": pin})
+    client.post("/force-change-pin", data={"pin": pin})
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app.app.test_client(), "admin@example.com", "1234")
+
+
+@pytest.fixture
+def make_user(app, admin_client):
+    """Krijon një punonjës përmes faqes së adminit; kthen (id, klienti i kyçur)."""
+    def make(name):
+        email = f"{name.lower()}-{os.urandom(3).hex()}@example.com"
+        admin_client.post("/admin/users/new", data={
+            "name": name, "email": email, "pin": "5555", "days": "20", "role": "member",
+        })
+        db = app.SessionLocal()
+        uid = db.query(app.User.id).filter_by(email=email).scalar()
+        db.close()
+        return uid, login(app.app.test_client(), email, "5555")
+    return make
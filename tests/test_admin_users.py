@@ -0,0 +1,51 @@
+from datetime import date
+
+
+def test_manager_cannot_decide_own_request(app, make_user):
+    uid, manager = make_user("Besa")
+    db = app.SessionLocal()
+    team = app.Team(name=f"Ekipi {uid}", manager_id=uid)
+    db.add(team)
+    db.flush()
+    team_id = team.id
+    db.query(app.User).filter_by(id=uid).update({"role": "manager", "team_id": team_id})
+    db.commit()
+    db.close()
+
+    manager.post("/me", data={"start": "2026-05-04", "end": "2026-05-05"})
+    db = app.SessionLocal()
+    vid = db.query(app.Vacation.id).filter_by(user_id=uid).scalar()
+    v = db.get(app.Vacation, vid)
+    assert v.team_id == team_id
+    db.close()
+
+    manager.get(f"/admin/vacation/{vid}/approve")
+    db = app.SessionLocal()
+    assert db.get(app.Vacation, vid).status == "pending"
+    db.close()
+
+
+def test_country_change_rebuilds_days_and_reports(app, admin_client, make_user):
+    # "ZZ" pushon vetëm të dielën: e hënë–e shtunë janë 6 ditë pune
+    admin_client.post("/admin/holidays", data={"action": "mask", "country": "ZZ", "year": "2026", "weekend": "6"})
+    uid, member = make_user("Arta")
+    member.post("/me", data={"start": "2026-06-01", "end": "2026-06-06"})
+
+    db = app.SessionLocal()
+    vid = db.query(app.Vacation.id).filter_by(user_id=uid).scalar()
+    v = db.get(app.Vacation, vid)
+    assert v.days == 5
+    db.merge(app.ReportAggregate(year=2026, data="{}"))
+    db.commit()
+    version = app.read_version(db, "report")
+    db.close()
+
+    admin_client.post(f"/admin/user/{uid}", data={"days": "20", "role": "member", "country": "ZZ"})
+
+    db = app.SessionLocal()
+    assert db.get(app.Vacation, vid).days == 6
+    parts = app.days_by_year(db.query(app.VacationPart.year, app.VacationPart.days).filter_by(vacation_id=vid))
+    assert parts == {2026: 6}
+    assert db.get(app.ReportAggregate, 2026) is None
+    assert app.read_version(db, "report") != version
+    db.close()
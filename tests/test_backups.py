@@ -0,0 +1,52 @@
+import os
+import threading
+
+
+def test_scheduler_is_not_started_at_import(app):
+    assert app._backup_thread_pid is None
+    assert not [t for t in threading.enumerate() if t.name == "backup"]
+
+
+def test_report_session_falls_back_when_backup_was_rotated(app, monkeypatch, tmp_path):
+    gone = str(tmp_path / "vacation-20000101-000000.db")
+    monkeypatch.setitem(app.app.config, "REPORT_FROM_BACKUPS", True)
+    monkeypatch.setattr(app, "latest_backup", lambda: gone)
+    assert not os.path.exists(gone)
+
+    db = app.ReportSession()
+    try:
+        assert not db.info.get("readonly")
+        assert db.get(app.User, 1) is not None
+    finally:
+        db.close()
+
+
+def test_open_report_session_survives_snapshot_refresh(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.app.config, "REPORT_DB", str(tmp_path / "report.db"))
+    monkeypatch.setitem(app.app.config, "REPORT_SNAPSHOT_MAX_AGE", 0)
+    app.refresh_report_snapshot()
+
+    db = app.ReportSession()
+    try:
+        assert db.info.get("readonly")
+        assert db.get(app.User, 1) is not None
+        db.commit()  # lidhja lirohet; sesioni rilidhet te e njëjta kopje
+
+        stat = os.stat(app.app.config["REPORT_DB"])
+        app.refresh_report_snapshot()
+        os.utime(app.app.config["REPORT_DB"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        def other_thread():
+            other = app.ReportSession()
+            try:
+                other.get(app.User, 1)
+            finally:
+                other.close()
+
+        t = threading.Thread(target=other_thread)
+        t.start()
+        t.join()
+
+        assert db.query(app.User).count() >= 1
+    finally:
+        db.close()
@@ -0,0 +1,60 @@
+def feed(app, client, uid):
+    db = app.SessionLocal()
+    token = app.calendar_token_for(db, db.get(app.User, uid))
+    db.close()
+    return client.get(f"/calendar/{token}.ics").get_data(as_text=True)
+
+
+def request_vacation(app, member, uid):
+    member.post("/me", data={"start": "2026-03-02", "end": "2026-03-04"})
+    db = app.SessionLocal()
+    vid = db.query(app.Vacation.id).filter_by(user_id=uid).order_by(app.Vacation.id.desc()).scalar()
+    db.close()
+    return vid
+
+
+def test_approval_writes_event_without_feed_sync(app, admin_client, make_user):
+    uid, member = make_user("Dea")
+    vid = request_vacation(app, member, uid)
+    assert f"vacation-{vid}@" not in feed(app, member, uid)
+
+    admin_client.get(f"/admin/vacation/{vid}/approve")
+    db = app.SessionLocal()
+    assert db.get(app.CalendarEvent, vid) is not None
+    db.close()
+    assert f"vacation-{vid}@" in feed(app, member, uid)
+
+    admin_client.get(f"/admin/vacation/{vid}/deny")
+    assert f"vacation-{vid}@" not in feed(app, member, uid)
+
+
+def test_feed_get_does_not_write(app, admin_client, make_user):
+    uid, member = make_user("Elda")
+    vid = request_vacation(app, member, uid)
+    admin_client.get(f"/admin/vacation/{vid}/approve")
+    feed(app, member, uid)
+
+    commits = []
+
+    def on_commit(db):
+        commits.append(db)
+
+    app.event.listen(app.SessionLocal, "before_commit", on_commit)
+    try:
+        feed(app, member, uid)
+    finally:
+        app.event.remove(app.SessionLocal, "before_commit", on_commit)
+    assert commits == []
+
+
+def test_rename_regenerates_summary(app, admin_client, make_user):
+    uid, member = make_user("Flora")
+    vid = request_vacation(app, member, uid)
+    admin_client.get(f"/admin/vacation/{vid}/approve")
+
+    db = app.SessionLocal()
+    db.get(app.User, uid).name = "Flora Hoxha"
+    db.commit()
+    db.close()
+
+    assert "SUMMARY:Flora Hoxha – pushim" in feed(app, member, uid)
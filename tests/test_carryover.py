@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def restore_carryover(app):
+    """Pas testit: rollover/skadimi i vitit dhe carryover-i i çdo përdoruesi si para tij."""
+    year = date.today().year
+    keys = [f"carryover_expiry_{year}", f"rollover_{year - 1}"]
+    db = app.SessionLocal()
+    settings = {key: db.get(app.Setting, key) for key in keys}
+    settings = {key: row.value if row else None for key, row in settings.items()}
+    carryovers = dict(db.query(app.User.id, app.User.carryover))
+    db.close()
+    yield
+    db = app.SessionLocal()
+    try:
+        for key, value in settings.items():
+            db.query(app.Setting).filter_by(key=key).delete()
+            if value is not None:
+                db.add(app.Setting(key=key, value=value))
+        for uid, carryover in db.query(app.User.id, app.User.carryover).all():
+            if uid in carryovers and carryover != carryovers[uid]:
+                db.query(app.User).filter_by(id=uid).update({"carryover": carryovers[uid]})
+                app.record_balance(db, uid, "carryover_set", carryovers[uid] or 0)
+        db.commit()
+    finally:
+        db.close()
+    app.tenant_cache("accrual").pop("for", None)
+
+
+@pytest.mark.skipif(date.today().month == 1, reason="me CARRYOVER_EXPIRY_MONTHS=1 afati është 1 shkurt")
+def test_monthly_accrual_expires_carryover_after_rollover(app, make_user, monkeypatch, restore_carryover):
+    monkeypatch.setitem(app.app.config, "CARRYOVER_EXPIRY_MONTHS", 1)
+    year = date.today().year
+    uid, _ = make_user("Hana")
+
+    db = app.SessionLocal()
+    db.get(app.User, uid).carryover = 2.5
+    db.query(app.Setting).filter(app.Setting.key.in_([f"carryover_expiry_{year}", f"rollover_{year - 1}"])).delete()
+    db.commit()
+    assert db.get(app.User, uid).carryover == 2.5
+
+    app.tenant_cache("accrual").pop("for", None)
+    app.maybe_run_monthly_accrual(db)
+    db.expire_all()
+    assert db.get(app.User, uid).carryover == 2.5  # pa rollover, asgjë nuk skadon
+
+    db.add(app.Setting(key=f"rollover_{year - 1}", value=str(date.today())))
+    db.commit()
+    app.tenant_cache("accrual").pop("for", None)
+    app.maybe_run_monthly_accrual(db)
+    db.expire_all()
+    carryover = db.get(app.User, uid).carryover
+    done = db.get(app.Setting, f"carryover_expiry_{year}")
+    db.close()
+
+    assert carryover == 0
+    assert done is not None
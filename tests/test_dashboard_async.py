@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def async_view(app):
+    original = app.app.view_functions["admin_dashboard"]
+    app.app.view_functions["admin_dashboard"] = app.admin_dashboard_async
+    yield
+    app.app.view_functions["admin_dashboard"] = original
+
+
+def test_async_dashboard_matches_sync(app, admin_client, make_user):
+    _, member = make_user("Mira")
+    member.post("/me", data={"start": "2026-03-02", "end": "2026-03-04"})
+
+    admin_client.get("/admin")  # mesazhet flash të hyrjes
+    sync_html = admin_client.get("/admin").get_data(as_text=True)
+    app.app.view_functions["admin_dashboard"] = app.admin_dashboard_async
+    try:
+        async_html = admin_client.get("/admin").get_data(as_text=True)
+    finally:
+        app.app.view_functions["admin_dashboard"] = app.admin_dashboard
+    assert "Mira" in async_html
+    assert async_html == sync_html
+
+
+def test_async_dashboard_runs_queries_concurrently(app, admin_client, async_view, monkeypatch):
+    running, peak = [0], [0]
+    fetch = app._fetch_all
+
+    async def counting_fetch(stmt):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        try:
+            return await fetch(stmt)
+        finally:
+            running[0] -= 1
+
+    monkeypatch.setattr(app, "_fetch_all", counting_fetch)
+    assert admin_client.get("/admin").status_code == 200
+    assert peak[0] == 5
+
+
+def test_async_reads_without_dependencies_fails_at_startup(tmp_path):
+    env = dict(os.environ, ASYNC_READS="1", DATABASE_URL=f"sqlite:///{tmp_path / 'v.db'}")
+    code = "import sys; sys.modules['aiosqlite'] = None; import app"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)) or ".",
+        env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode != 0
+    assert "ASYNC_READS=1 kërkon aiosqlite" in result.stderr
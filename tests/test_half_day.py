@@ -0,0 +1,48 @@
+from datetime import date
+
+
+def test_portion_units(app):
+    assert app.portion_units("am") == app.portion_units("pm") == app.UNITS_PER_DAY // 2
+    assert app.portion_units("hours", 3) == 3 * app.UNITS_PER_DAY // app.WORKDAY_HOURS
+    assert app.portion_units("hours", 0) is None
+    assert app.portion_units("hours", app.WORKDAY_HOURS) is None  # ditë e plotë, jo pjesë
+    assert app.portion_units("hours", None) is None
+    assert app.portion_units("full") is None
+
+
+def _occupancy(app, day):
+    db = app.SessionLocal()
+    row = db.get(app.DailyOccupancy, day)
+    db.close()
+    return (row.approved, row.approved_units, row.pending, row.pending_units) if row else (0, 0, 0, 0)
+
+
+def test_half_day_counts_half_a_day_and_half_the_units(app, admin_client, make_user):
+    uid, member = make_user("Nora")
+    day = date(2027, 1, 11)  # e hënë
+    before = _occupancy(app, day)
+    # për pjesë dite data e fundit injorohet
+    member.post("/me", data={"start": day.isoformat(), "end": "2027-01-15", "portion": "am"})
+
+    db = app.SessionLocal()
+    v = db.query(app.Vacation).filter_by(user_id=uid).one()
+    vid, days, units, end = v.id, v.days, v.units, v.end
+    parts = [(p.year, p.days) for p in v.parts]
+    db.close()
+    assert (days, units, end) == (0.5, app.UNITS_PER_DAY // 2, day)
+    assert parts == [(2027, 0.5)]
+    assert _occupancy(app, day) == (before[0], before[1], before[2] + 1, before[3] + units)
+
+    admin_client.get(f"/admin/vacation/{vid}/approve")
+    assert _occupancy(app, day) == (before[0] + 1, before[1] + units, before[2], before[3])
+
+
+def test_half_day_on_a_non_working_day_is_rejected(app, make_user):
+    uid, member = make_user("Ilir")
+    # e shtuna, me një interval që përmban ditë pune: pjesa vlen vetëm për datën e fillimit
+    member.post("/me", data={"start": "2027-01-16", "end": "2027-01-18", "portion": "pm"})
+    member.post("/me", data={"start": "2027-01-17", "end": "2027-01-17", "portion": "hours", "hours": "3"})
+
+    db = app.SessionLocal()
+    assert db.query(app.Vacation).filter_by(user_id=uid).count() == 0
+    db.close()
@@ -0,0 +1,25 @@
+import os
+
+
+def test_import_reports_invalid_rows_and_keeps_valid_ones(app):
+    tag = os.urandom(3).hex()
+    csv_text = "\n".join([
+        "name;email;pin;days;role",
+        f"Ilir;ilir-{tag}@example.com;1111;21;member",
+        f"Jeta;jeta-{tag}@example.com;1111;njëzet;member",
+        f"Kujtim;kujtim-{tag}@example.com;1111;nan;manager",
+        f"Lule;lule-{tag}@example.com;1111;20,5;",
+    ])
+    db = app.SessionLocal()
+    message = app._job_import_users(db, {"csv": csv_text}, lambda pct: None)
+    created = dict(db.query(app.User.name, app.User.annual_allowance).filter(app.User.email.like(f"%-{tag}@%")))
+    db.close()
+
+    assert created == {"Ilir": 21, "Lule": 20.5}
+    assert message.startswith("2 përdorues u krijuan, 0 u anashkaluan. 2 me gabime:")
+    assert "rreshti 3" in message and "rreshti 4" in message
+
+
+def test_worker_id_follows_the_process(app, monkeypatch):
+    monkeypatch.setattr(app.os, "getpid", lambda: 4242)
+    assert app.worker_id().endswith(":4242")
@@ -0,0 +1,86 @@
+import time
+from datetime import date, datetime
+
+
+def _remaining(app, uid, year):
+    db = app.SessionLocal()
+    try:
+        return db.get(app.User, uid).remaining(year)
+    finally:
+        db.close()
+
+
+def _as_of(app, uid, at, year):
+    db = app.SessionLocal()
+    try:
+        state, _ = app.balance_as_of(db, uid, at)
+        return app.balance_remaining(state, year)
+    finally:
+        db.close()
+
+
+def _tick():
+    # ngjarjet dhe pikat e kontrollit kanë kohë utcnow(); pa barazime në kufij
+    time.sleep(0.01)
+    at = datetime.utcnow()
+    time.sleep(0.01)
+    return at
+
+
+def test_balance_as_of_matches_remaining_around_a_checkpoint(app, admin_client, make_user):
+    uid, member = make_user("Vesa")
+    seen = [(_tick(), _remaining(app, uid, 2026))]
+
+    member.post("/me", data={"start": "2026-11-02", "end": "2026-11-06"})
+    db = app.SessionLocal()
+    vid = db.query(app.Vacation.id).filter_by(user_id=uid).scalar()
+    db.close()
+    admin_client.get(f"/admin/vacation/{vid}/approve")
+    seen.append((_tick(), _remaining(app, uid, 2026)))
+
+    db = app.SessionLocal()
+    assert app.write_balance_checkpoints(db, [uid]) == 1
+    db.commit()
+    db.close()
+    seen.append((_tick(), _remaining(app, uid, 2026)))
+
+    admin_client.post(f"/admin/user/{uid}", data={"days": "25", "role": "member", "country": ""})
+    seen.append((_tick(), _remaining(app, uid, 2026)))
+    admin_client.get(f"/admin/vacation/{vid}/deny")
+    seen.append((_tick(), _remaining(app, uid, 2026)))
+
+    # akumulimi mujor mund të ekzekutohet me kërkesën e parë: vlerat krahasohen me atë pas aprovimit
+    after = seen[1][1]
+    assert [r - after for _, r in seen[1:]] == [0, 0, 5, 10]
+    for at, expected in seen:
+        assert _as_of(app, uid, at, 2026) == expected
+
+
+def test_balance_as_of_after_bootstrap_matches_remaining(app, admin_client):
+    db = app.SessionLocal()
+    # një përdorues "para librit": histori në tabela, asnjë ngjarje në balance_events
+    u = app.User(name="Para Librit", email=f"legacy-{time.time_ns()}@example.com", pin="-",
+                 role="member", annual_allowance=22, carryover=3)
+    db.add(u)
+    db.flush()
+    uid = u.id
+    db.add(app.Adjustment(user_id=uid, amount=2, reason="Korrigjim", when=date(2026, 2, 1)))
+    v = app.Vacation(user_id=uid, start=date(2026, 3, 2), end=date(2026, 3, 4), days=3, status="approved")
+    db.add(v)
+    db.flush()
+    vid = v.id
+    app.write_vacation_parts(db, vid, v.start, v.end, None, v.days)
+    db.query(app.BalanceEvent).filter_by(user_id=uid).delete()
+    db.commit()
+    db.close()
+
+    db = app.SessionLocal()
+    assert app.bootstrap_ledger(db) >= 1
+    db.close()
+    assert _remaining(app, uid, 2026) == 22 + 3 + 2 - 3
+    assert _as_of(app, uid, datetime.utcnow(), 2026) == 24
+
+    # lëvizjet pas bootstrap-it vazhdojnë mbi të njëjtin libër
+    admin_client.get(f"/admin/vacation/{vid}/deny")
+    assert _remaining(app, uid, 2026) == 27
+    assert _as_of(app, uid, datetime.utcnow(), 2026) == 27
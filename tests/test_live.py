@@ -0,0 +1,76 @@
+import json
+import os
+
+
+def _events(body):
+    """Ngjarjet "vacation" të një përgjigjeje text/event-stream."""
+    out = []
+    for block in body.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if lines.get("event") == "vacation":
+            out.append(json.loads(lines["data"]))
+    return out
+
+
+def _version(app):
+    db = app.SessionLocal()
+    try:
+        return int(app.read_version(db, "report"))
+    finally:
+        db.close()
+
+
+def _in_team(app, make_user, name):
+    uid, client = make_user(name)
+    db = app.SessionLocal()
+    team = app.Team(name=f"Ekipi {name} {os.urandom(3).hex()}")
+    db.add(team)
+    db.flush()
+    team_id = team.id
+    db.query(app.User).filter_by(id=uid).update({"team_id": team_id})
+    db.commit()
+    db.close()
+    return uid, team_id, client
+
+
+def test_events_are_published_only_after_commit(app, make_user):
+    uid, _ = make_user("Mira")
+    db = app.SessionLocal()
+    v = app.Vacation(user_id=uid, start=app.date(2026, 10, 5), end=app.date(2026, 10, 6), days=2, status="pending")
+    db.add(v)
+    db.flush()
+    before = _version(app)
+    app.vacation_changed(db, v)
+    db.rollback()
+    db.close()
+    assert _version(app) == before
+    assert app.live_bus.since(None, before, before + 1) is None  # rollback: asgjë
+
+    db = app.SessionLocal()
+    v = app.Vacation(user_id=uid, start=app.date(2026, 10, 5), end=app.date(2026, 10, 6), days=2, status="pending")
+    db.add(v)
+    db.flush()
+    app.vacation_changed(db, v)
+    assert app.live_bus.since(None, before, before + 1) is None  # ende pa commit
+    db.commit()
+    vid = v.id
+    db.close()
+
+    events = app.live_bus.since(None, before, _version(app))
+    assert [(ev["id"], ev["user_id"], ev["status"]) for ev in events] == [(vid, uid, "pending")]
+
+
+def test_event_stream_filters_by_team(app, admin_client, make_user):
+    first_uid, first_team, first = _in_team(app, make_user, "Dea")
+    second_uid, second_team, second = _in_team(app, make_user, "Eni")
+    since = _version(app)
+    first.post("/me", data={"start": "2026-10-12", "end": "2026-10-13"})
+    second.post("/me", data={"start": "2026-10-12", "end": "2026-10-13"})
+
+    everything = _events(admin_client.get(f"/admin/events?since={since}").get_data(as_text=True))
+    assert [ev["user_id"] for ev in everything] == [first_uid, second_uid]
+
+    body = admin_client.get(f"/admin/events?since={since}&team={second_team}").get_data(as_text=True)
+    assert [ev["user_id"] for ev in _events(body)] == [second_uid]
+    # ngjarja e ekipit tjetër kalon vetëm si kursor, pa të dhëna
+    assert f"id: {since + 1}\n\n" in body
@@ -0,0 +1,37 @@
+from datetime import date
+
+
+def _query_count(app, client, url):
+    app.app.config["QUERY_COUNT_HEADER"] = True
+    try:
+        resp = client.get(url)
+    finally:
+        app.app.config["QUERY_COUNT_HEADER"] = False
+    assert resp.status_code == 200
+    return int(resp.headers["X-Query-Count"])
+
+
+def test_me_is_one_query(app, make_user):
+    uid, client = make_user("Arta")
+    year = date.today().year
+    client.post("/me", data={"start": f"{year}-03-02", "end": f"{year}-03-04", "leave_type": "annual"})
+    client.get("/me")  # herën e parë: tokeni i kalendarit, akumulimi mujor
+
+    assert _query_count(app, client, "/me") == 1
+
+
+def test_me_shows_balances_per_type(app, make_user):
+    uid, client = make_user("Besa")
+    year = date.today().year
+    client.post("/me", data={"start": f"{year}-03-02", "end": f"{year}-03-04", "leave_type": "annual"})
+
+    db = app.SessionLocal()
+    types = app.leave_types(db)
+    expected = app.pivot_leave_balances(db.execute(app.leave_balances_select(year, user_id=uid)))[uid]
+    row = db.execute(app.me_select(uid, year)).first()
+    db.close()
+
+    got_types, got = app.me_leave_types(row.by_type)
+    assert [(t.code, t.name) for t in got_types] == [(t.code, t.name) for t in types]
+    assert got == expected
+    assert got["annual"]["pending"] > 0
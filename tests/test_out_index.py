@@ -0,0 +1,109 @@
+import random
+import threading
+
+
+def test_readers_see_consistent_index_while_writer_updates(app):
+    idx = app.IntervalIndex([(i, i, i + 5, 1, "approved", "annual", "full", 8) for i in range(0, 2000, 2)], {}, "1")
+    errors, done = [], threading.Event()
+
+    def reader():
+        rnd = random.Random()
+        while not done.is_set():
+            try:
+                first = rnd.randrange(0, 2100)
+                for item in idx.overlapping(first, first + 10):
+                    assert item[2] >= first and item[1] <= first + 10
+            except Exception as exc:  # noqa: BLE001 - çdo gabim i lexuesit e rrëzon testin
+                errors.append(exc)
+                return
+
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for t in readers:
+        t.start()
+    rnd = random.Random(7)
+    for n in range(3000):
+        vid = rnd.randrange(0, 2500)
+        if rnd.random() < 0.5:
+            idx.discard(vid)
+        else:
+            start = rnd.randrange(0, 2000)
+            idx.add((vid, start, start + rnd.randrange(0, 30), 1, "approved", "annual", "full", 8))
+    done.set()
+    for t in readers:
+        t.join()
+
+    assert errors == []
+
+
+def _item(vid, start, end):
+    return (vid, start, end, 1, "approved", "annual", "full", 8)
+
+
+def _naive(items, first, last):
+    return sorted(vid for vid, (s, e) in items.items() if s <= last and e >= first)
+
+
+def test_overlapping_matches_a_linear_scan(app):
+    rnd = random.Random(3)
+    items = {}
+    for vid in range(300):
+        start = rnd.randrange(0, 1000)
+        items[vid] = (start, start + rnd.choice((0, 1, 5, 200)))  # disa intervale të gjata
+    idx = app.IntervalIndex([_item(vid, s, e) for vid, (s, e) in items.items()], {}, "1")
+
+    for first in range(-5, 1210, 7):
+        for length in (0, 3, 40):
+            got = sorted(it[0] for it in idx.overlapping(first, first + length))
+            assert got == _naive(items, first, first + length)
+
+
+def test_add_and_discard_keep_max_end_consistent(app):
+    rnd = random.Random(11)
+    items = {}
+    idx = app.IntervalIndex([], {}, "1")
+    assert idx.overlapping(0, 10) == []
+
+    for _ in range(500):
+        vid = rnd.randrange(0, 60)
+        if vid in items and rnd.random() < 0.5:
+            del items[vid]
+            idx.discard(vid)
+        else:
+            start = rnd.randrange(0, 300)
+            items[vid] = (start, start + rnd.choice((0, 2, 150)))
+            idx.add(_item(vid, *items[vid]))  # për id ekzistuese: zëvendësim
+
+        _, starts, ends, ids, max_end = idx._data
+        assert starts == sorted(starts)
+        assert sorted(ids) == sorted(items)
+        assert max_end == list(app.accumulate(ends, max))
+        first = rnd.randrange(0, 450)
+        assert sorted(it[0] for it in idx.overlapping(first, first + 5)) == _naive(items, first, first + 5)
+
+    idx.discard(10**6)  # id e panjohur: asgjë
+
+
+def _out_ids(client, day, uid):
+    rows = client.get(f"/api/out?date={day}").get_json()["out"]
+    return {row["vacation_id"]: row["status"] for row in rows if row["user_id"] == uid}
+
+
+def test_api_out_follows_approve_deny_and_delete(app, admin_client, make_user):
+    uid, member = make_user("Lira")
+    member.post("/me", data={"start": "2026-09-07", "end": "2026-09-09"})
+    member.post("/me", data={"start": "2026-09-08", "end": "2026-09-08"})
+    db = app.SessionLocal()
+    first_id, second_id = [vid for (vid,) in db.query(app.Vacation.id).filter_by(user_id=uid).order_by(app.Vacation.id)]
+    db.close()
+
+    assert _out_ids(admin_client, "2026-09-08", uid) == {first_id: "pending", second_id: "pending"}
+
+    admin_client.get(f"/admin/vacation/{first_id}/approve")
+    assert _out_ids(admin_client, "2026-09-08", uid) == {first_id: "approved", second_id: "pending"}
+
+    admin_client.get(f"/admin/vacation/{second_id}/deny")
+    assert _out_ids(admin_client, "2026-09-08", uid) == {first_id: "approved"}
+
+    admin_client.get(f"/admin/vacation/{first_id}/delete")
+    assert _out_ids(admin_client, "2026-09-08", uid) == {}
+    assert _out_ids(admin_client, "2026-09-10", uid) == {}
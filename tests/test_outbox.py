@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clean_outbox(app, monkeypatch):
+    monkeypatch.setitem(app.app.config, "NOTIFY_EMAIL", True)
+    monkeypatch.setitem(app.app.config, "WEBHOOK_URL", "")
+    monkeypatch.setitem(app.app.config, "NOTIFY_DIGEST_KINDS", set())
+    db = app.SessionLocal()
+    db.query(app.OutboxMessage).delete()
+    db.commit()
+    db.close()
+
+
+def outbox(app):
+    db = app.SessionLocal()
+    rows = db.query(app.OutboxMessage).order_by(app.OutboxMessage.id).all()
+    db.close()
+    return rows
+
+
+def add_message(app, sink="email", recipient="a@example.com"):
+    db = app.SessionLocal()
+    app.notify(db, "vacation_approved", "Subjekt", "Trupi", [recipient], {})
+    db.commit()
+    db.close()
+    return outbox(app)[-1].id
+
+
+def test_request_writes_notification_in_same_transaction(app, make_user):
+    _, member = make_user("Ben")
+    member.post("/me", data={"start": "2026-03-02", "end": "2026-03-04"})
+
+    rows = outbox(app)
+    assert [(m.kind, m.sink, m.recipient, m.status) for m in rows] == [
+        ("vacation_requested", "email", "admin@example.com", "pending"),
+    ]
+
+
+def test_rollback_drops_notification(app):
+    db = app.SessionLocal()
+    app.notify(db, "vacation_approved", "Subjekt", "Trupi", ["a@example.com"], {})
+    db.rollback()
+    db.commit()
+    db.close()
+
+    assert outbox(app) == []
+
+
+def test_claimed_batch_is_not_sent_twice(app, monkeypatch):
+    add_message(app)
+    sent, nested = [], []
+
+    def sink(messages):
+        # një worker tjetër provon ndërkohë: rreshtat janë të zënë deri në skadimin e afatit
+        other = app.SessionLocal()
+        nested.append(app.dispatch_outbox(other))
+        other.close()
+        sent.extend(m.id for m in messages)
+        return {}
+
+    monkeypatch.setitem(app.OUTBOX_SINKS, "email", sink)
+    db = app.SessionLocal()
+    counts = app.dispatch_outbox(db)
+    db.close()
+
+    assert counts == {"sent": 1, "retry": 0, "failed": 0}
+    assert nested == [{"sent": 0, "retry": 0, "failed": 0}]
+    assert len(sent) == 1
+    assert outbox(app)[0].status == "sent"
+
+
+def test_failures_back_off_then_give_up(app, monkeypatch):
+    mid = add_message(app)
+    monkeypatch.setitem(app.OUTBOX_SINKS, "email", lambda messages: {m.id: "550 refuzuar" for m in messages})
+    monkeypatch.setitem(app.app.config, "OUTBOX_MAX_ATTEMPTS", 3)
+    base = app.app.config["OUTBOX_BACKOFF"]
+
+    delays = []
+    for _ in range(3):
+        db = app.SessionLocal()
+        before = datetime.utcnow()
+        app.dispatch_outbox(db)
+        m = db.get(app.OutboxMessage, mid)
+        delays.append(round((m.next_attempt_at - before).total_seconds() / base))
+        m.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)  # bëje gati menjëherë
+        db.commit()
+        db.close()
+
+    m = outbox(app)[0]
+    assert delays[:2] == [1, 2]
+    assert (m.status, m.attempts, m.last_error) == ("failed", 3, "550 refuzuar")
+
+
+def test_sink_exception_retries_whole_batch(app, monkeypatch):
+    add_message(app, recipient="a@example.com")
+    add_message(app, recipient="b@example.com")
+
+    def down(messages):
+        raise ConnectionRefusedError("[Errno 111] Connection refused")
+
+    monkeypatch.setitem(app.OUTBOX_SINKS, "email", down)
+    db = app.SessionLocal()
+    counts = app.dispatch_outbox(db)
+    db.close()
+
+    assert counts == {"sent": 0, "retry": 2, "failed": 0}
+    assert all(m.status == "pending" and m.claim is None for m in outbox(app))
+
+
+def test_digest_waits_for_digest_hour_and_groups_by_recipient(app, monkeypatch):
+    monkeypatch.setitem(app.app.config, "NOTIFY_DIGEST_KINDS", {"vacation_approved"})
+    add_message(app)
+    add_message(app)
+    digests = []
+    monkeypatch.setitem(app.OUTBOX_SINKS, "digest", lambda messages: digests.append(len(messages)) or {})
+
+    db = app.SessionLocal()
+    assert app.dispatch_outbox(db)["sent"] == 0
+    db.query(app.OutboxMessage).update({"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    assert app.dispatch_outbox(db)["sent"] == 2
+    db.close()
+    assert digests == [2]
+
+
+def test_periodic_scan_only_opens_databases_with_due_messages(app, monkeypatch):
+    monkeypatch.setitem(app.OUTBOX_SINKS, "email", lambda messages: {})
+    app.drain_outbox([None])
+    assert app.due_outbox_tenants() == []
+
+    add_message(app)
+    assert app.due_outbox_tenants() == [None]
+    assert app.drain_outbox(app.due_outbox_tenants())["sent"] == 1
+    assert app.due_outbox_tenants() == []
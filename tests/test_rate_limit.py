@@ -0,0 +1,80 @@
+import os
+import threading
+
+
+def _login(client, email, ip):
+    return client.post("/login", data={"email": email, "pin": "0000"}, environ_base={"REMOTE_ADDR": ip})
+
+
+def _ip():
+    return "10.%d.%d.%d" % tuple(os.urandom(3))
+
+
+def test_sliding_window_counts_part_of_the_previous_window(app, monkeypatch):
+    limiter = app.SlidingWindowLimiter(app.MemoryWindowStore(), "test", limit=4, window=100)
+    now = [1000.0]
+    monkeypatch.setattr(app.time, "time", lambda: now[0])
+
+    for _ in range(4):
+        assert not limiter.blocked("k")
+        limiter.hit("k")
+    assert limiter.blocked("k")
+    assert not limiter.blocked("tjetër")
+
+    now[0] = 1150.0  # gjysma e dritares pasardhëse: 4 * 0.5 = 2 < 4
+    assert not limiter.blocked("k")
+    limiter.hit("k")
+    limiter.hit("k")
+    assert limiter.blocked("k")  # 2 + 2
+
+    now[0] = 1300.0  # dy dritare më vonë: asgjë nuk mbetet
+    assert not limiter.blocked("k")
+
+
+def test_login_rejects_attempt_after_limit_per_email_without_db_queries(app, monkeypatch):
+    monkeypatch.setitem(app.app.config, "QUERY_COUNT_HEADER", True)
+    client = app.app.test_client()
+    email = f"nobody-{os.urandom(3).hex()}@example.com"
+    limit = app.email_limiter.limit
+
+    for _ in range(limit):
+        resp = _login(client, email, _ip())
+        assert resp.status_code == 200
+        assert int(resp.headers["X-Query-Count"]) > 0
+
+    resp = _login(client, email, _ip())
+    assert resp.status_code == 429
+    assert resp.headers["X-Query-Count"] == "0"
+
+
+def test_login_rejects_attempt_after_limit_per_ip(app, monkeypatch):
+    monkeypatch.setattr(app.ip_limiter, "limit", 3)
+    client = app.app.test_client()
+    ip = _ip()
+
+    for n in range(3):
+        assert _login(client, f"ip-{n}-{os.urandom(3).hex()}@example.com", ip).status_code == 200
+    assert _login(client, f"ip-x-{os.urandom(3).hex()}@example.com", ip).status_code == 429
+    # një IP tjetër nuk preket
+    assert _login(client, f"ip-y-{os.urandom(3).hex()}@example.com", _ip()).status_code == 200
+
+
+def test_sqlite_store_is_shared_between_workers(app, tmp_path):
+    path = str(tmp_path / "ratelimit.db")
+    # dy "workers": secili me store-in dhe lidhjet e veta mbi të njëjtin skedar
+    first = app.SlidingWindowLimiter(app.SqliteWindowStore(path), "login-email", limit=20, window=900)
+    second = app.SlidingWindowLimiter(app.SqliteWindowStore(path), "login-email", limit=20, window=900)
+
+    def hammer(limiter):
+        for _ in range(10):
+            limiter.hit("a@example.com")
+
+    threads = [threading.Thread(target=hammer, args=(lim,)) for lim in (first, second)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert first.blocked("a@example.com") and second.blocked("a@example.com")
+    first.reset("a@example.com")
+    assert not second.blocked("a@example.com")
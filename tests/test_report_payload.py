@@ -0,0 +1,17 @@
+def test_payload_cache_is_bounded_and_dropped_on_version_change(app, monkeypatch):
+    monkeypatch.setattr(app, "REPORT_PAYLOAD_CACHE_SIZE", 3)
+    db = app.SessionLocal()
+    for top in range(1, 6):
+        app.report_payload(db, 2026, top=top)
+    payloads = app.tenant_cache("report_payloads")
+    assert [key[1] for key in payloads["items"]] == [3, 4, 5]
+
+    body, etag = app.report_payload(db, 2026, top=3)
+    assert (body, etag) == payloads["items"][(2026, 3, True, None, None)]
+    assert list(payloads["items"])[-1][1] == 3
+
+    app.bump_version(db, "report")
+    db.commit()
+    app.report_payload(db, 2026, top=1)
+    db.close()
+    assert [key[1] for key in payloads["items"]] == [1]
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def tenants(app, monkeypatch, tmp_path):
+    """Dy kompani të reja në një TENANTS_DIR të përkohshme; kthen emrat e tyre."""
+    monkeypatch.setitem(app.app.config, "TENANTS_DIR", str(tmp_path))
+    monkeypatch.setitem(app.app.config, "TENANT_DOMAIN", "")
+    # emra unikë: motorët dhe cache-t e procesit mbahen sipas emrit
+    names = [f"{prefix}-{os.urandom(3).hex()}" for prefix in ("acme", "beta")]
+    for name in names:
+        app.tenant_engine(name)
+    # resolve_tenant e vendos tenant-in në kontekstin e thread-it të testit; testet e tjera presin None
+    token = app._current_tenant.set(None)
+    yield names
+    app._current_tenant.reset(token)
+
+
+def _in_tenant(app, tenant):
+    return app._current_tenant.set(tenant)
+
+
+def test_session_binds_to_tenant_active_when_created(app, tenants):
+    acme, beta = tenants
+    token = _in_tenant(app, acme)
+    try:
+        db = app.SessionLocal()
+    finally:
+        app._current_tenant.reset(token)
+
+    token = _in_tenant(app, beta)
+    try:
+        assert db.get_bind() is app.tenant_engine(acme)
+        assert app.SessionLocal().get_bind() is app.tenant_engine(beta)
+    finally:
+        app._current_tenant.reset(token)
+        db.close()
+    assert app.SessionLocal().get_bind() is app.engine
+
+
+def _resolved(app, path, base_url="http://localhost"):
+    with app.app.test_request_context(path, base_url=base_url):
+        result = app.resolve_tenant()
+        return app.current_tenant(), result
+
+
+def test_tenant_from_query_or_subdomain(app, tenants, monkeypatch):
+    acme, beta = tenants
+    assert _resolved(app, f"/calendar.ics?tenant={beta}") == (beta, None)
+    assert _resolved(app, "/calendar.ics") == (None, None)
+    tenant, resp = _resolved(app, "/calendar.ics?tenant=mungon")
+    assert tenant is None and resp[1] == 404
+
+    monkeypatch.setitem(app.app.config, "TENANT_DOMAIN", "vacation.test")
+    assert _resolved(app, "/calendar.ics", f"http://{acme}.vacation.test") == (acme, None)
+    # me domene, ?tenant= nuk zgjedh kompaninë
+    assert _resolved(app, f"/calendar.ics?tenant={beta}", "http://vacation.test") == (None, None)
+
+
+def _admin(app, tenant):
+    client = app.app.test_client()
+    client.post("/login", data={"tenant": tenant, "email": "admin@example.com", "pin": "1234"})
+    client.post("/force-change-pin", data={"pin": "1234"})
+    return client
+
+
+def test_data_and_caches_stay_in_their_tenant(app, tenants):
+    acme, beta = tenants
+    acme_admin, beta_admin = _admin(app, acme), _admin(app, beta)
+
+    acme_admin.post("/admin/users/new", data={
+        "name": "Vetëm Acme", "email": "acme-only@example.com", "pin": "5555", "days": "20", "role": "member",
+    })
+    member = app.app.test_client()
+    member.post("/login", data={"tenant": acme, "email": "acme-only@example.com", "pin": "5555"})
+    member.post("/force-change-pin", data={"pin": "5555"})
+    member.post("/me", data={"start": "2026-07-06", "end": "2026-07-07"})
+
+    for tenant, expected in ((acme, 1), (beta, 0)):
+        token = _in_tenant(app, tenant)
+        try:
+            db = app.SessionLocal()
+            assert db.query(app.User).filter_by(email="acme-only@example.com").count() == expected
+            db.close()
+        finally:
+            app._current_tenant.reset(token)
+
+    # indeksi i /api/out dhe cache-t e tjera mbahen veç për çdo kompani
+    assert acme_admin.get("/api/out?date=2026-07-06").get_json()["count"] == 1
+    assert beta_admin.get("/api/out?date=2026-07-06").get_json()["count"] == 0
+    assert app.tenant_cache("out_index", tenant=acme) is not app.tenant_cache("out_index", tenant=beta)
+    assert app.tenant_cache("out_index", tenant=acme)["idx"] is not None
+    assert app.tenant_cache("out_index", tenant=beta)["idx"].overlapping(0, 10**7) == []
+
+    # pas login-it kompania vjen nga sesioni: ?tenant= nuk kalon te një kompani tjetër
+    assert acme_admin.get(f"/api/out?date=2026-07-06&tenant={beta}").get_json()["count"] == 1
@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+from datetime import date
+
+
+@contextmanager
+def count_queries(app):
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    app.event.listen(app.engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        app.event.remove(app.engine, "before_cursor_execute", on_execute)
+
+
+def test_split_interval_checks_version_once_per_transaction(app):
+    db = app.SessionLocal()
+    app.split_interval(db, date(2026, 1, 1), date(2026, 12, 31))  # tabela e vitit ndërtohet një herë
+
+    db.commit()
+    with count_queries(app) as statements:
+        pieces = app.split_interval(db, date(2026, 1, 1), date(2026, 12, 31))
+        app.split_interval(db, date(2026, 2, 1), date(2026, 3, 31), "AL")
+    db.close()
+
+    assert len(pieces) == 12
+    # versioni i tabelave dhe shteti i paracaktuar, pa asnjë query për muaj
+    assert len(statements) == 2
+
+
+def test_recompute_days_queries_do_not_grow_with_rows(app, make_user):
+    uid, member = make_user("Gent")
+    for day in (2, 9, 16, 23):
+        member.post("/me", data={"start": f"2026-03-{day:02d}", "end": f"2026-03-{day + 2:02d}"})
+
+    db = app.SessionLocal()
+    db.query(app.Vacation).filter_by(user_id=uid).update({"days": 1})
+    db.commit()
+    with count_queries(app) as statements:
+        seen, changed = app.recompute_vacation_days(db, batch_size=1000)
+    parts = app.days_by_year(
+        db.query(app.VacationPart.year, app.VacationPart.days)
+        .join(app.Vacation, app.Vacation.id == app.VacationPart.vacation_id)
+        .filter(app.Vacation.user_id == uid)
+    )
+    db.close()
+
+    assert changed >= 4
+    assert parts == {2026: 12}
+    assert len([s for s in statements if "vacation_parts" in s]) == 3
+
+
+def test_working_days_for_explicit_country_sees_new_holiday(app, admin_client):
+    db = app.SessionLocal()
+    before = app.working_days(db, date(2031, 1, 1), date(2031, 12, 31), "XK")
+    db.commit()
+
+    admin_client.post("/admin/holidays", data={
+        "action": "add", "country": "XK", "year": "2031", "day": "2031-06-11", "name": "Test",
+    })
+    after = app.working_days(db, date(2031, 1, 1), date(2031, 12, 31), "XK")
+    db.close()
+
+    assert after == before - 1  # 11 qershor 2031 është e mërkurë
+
+
+def test_recompute_days_invalidates_reports(app, make_user):
+    uid, member = make_user("Drita")
+    member.post("/me", data={"start": "2026-04-06", "end": "2026-04-08"})
+
+    db = app.SessionLocal()
+    db.query(app.Vacation).filter_by(user_id=uid).update({"days": 1})
+    db.merge(app.ReportAggregate(year=2026, data="{}"))
+    db.commit()
+    version = app.read_version(db, "report")
+
+    seen, changed = app.recompute_vacation_days(db)
+    assert changed >= 1
+    assert db.get(app.ReportAggregate, 2026) is None
+    assert app.read_version(db, "report") != version
+    db.close()